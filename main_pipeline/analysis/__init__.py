@@ -4,5 +4,9 @@ Analysis модуль для анализа графа знаний и гене
 """
 
 from .research_analyst import ResearchAnalyst
+from .embeddings import EmbeddingStore
+from .semantic_dedup import SemanticDeduplicator, VectorIndex
+from .triage import TriageGate
+from .prioritizer import TopKPrioritizer
 
-__all__ = ['ResearchAnalyst'] 
\ No newline at end of file
+__all__ = ['ResearchAnalyst', 'EmbeddingStore', 'SemanticDeduplicator', 'VectorIndex', 'TriageGate', 'TopKPrioritizer']
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Тематическая кластеризация направлений для иерархического отчета
+Нормированные эмбеддинги описаний группируются MiniBatchKMeans; размер кластера
+ограничен, чтобы промпт синтеза программы не рос вместе с числом направлений.
+"""
+
+import math
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+# Средний размер кластера (число кластеров = n / CLUSTER_SIZE)
+DEFAULT_CLUSTER_SIZE = 12
+# Предел направлений в одном промпте синтеза программы (2-4 подгруппы по 2-8 идей)
+DEFAULT_MAX_CLUSTER_SIZE = 24
+# Кластеры меньше этого размера не становятся программами
+MIN_CLUSTER_SIZE = 2
+
+
+def cluster_vectors(vectors: np.ndarray, cluster_size: int = DEFAULT_CLUSTER_SIZE,
+                    max_cluster_size: int = DEFAULT_MAX_CLUSTER_SIZE, random_state: int = 0) -> list:
+    """
+    Разбивает векторы на тематические кластеры
+
+    Кластеры больше max_cluster_size разбиваются повторно (тем же k-means),
+    пока не уложатся в предел.
+
+    Returns:
+        список кластеров - списков номеров строк vectors, в исходном порядке строк
+    """
+    n = len(vectors)
+    if n == 0:
+        return []
+    indices = np.arange(n)
+    if n <= max_cluster_size and n <= cluster_size:
+        return [indices.tolist()]
+    return _split(vectors, indices, max(2, math.ceil(n / cluster_size)), max_cluster_size, random_state)
+
+
+def _split(vectors: np.ndarray, indices: np.ndarray, n_clusters: int, max_cluster_size: int, random_state: int) -> list:
+    n_clusters = min(n_clusters, len(indices))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3,
+                             batch_size=max(256, 4 * n_clusters))
+    labels = kmeans.fit_predict(vectors[indices])
+
+    clusters = []
+    for label in np.unique(labels):
+        members = indices[labels == label]
+        if len(members) > max_cluster_size:
+            if len(np.unique(labels)) == 1:
+                # k-means не разделил точки (например, одинаковые векторы) - режем по порядку
+                clusters.extend(members[i:i + max_cluster_size].tolist() for i in range(0, len(members), max_cluster_size))
+            else:
+                clusters.extend(_split(vectors, members, math.ceil(len(members) / max_cluster_size) + 1,
+                                       max_cluster_size, random_state))
+        else:
+            clusters.append(members.tolist())
+    return clusters
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Эмбеддинги текстов через Gemini с постоянным кэшем
+Ключ кэша - хэш (модель, тип задачи, текст); хранилище - SQLite (WAL).
+Повторный запуск анализа не пересчитывает эмбеддинги уже виденных описаний.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.rate_limiter import get_rate_limiter
+from core.async_runtime import run_sync
+
+try:
+    from google import genai
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+EMBEDDING_MODEL = "gemini-embedding-001"
+# Gemini принимает до 100 текстов в одном запросе embed_content
+EMBED_BATCH_SIZE = 100
+
+
+class EmbeddingStore:
+    """
+    Нормированные эмбеддинги текстов (float32) с кэшем по хэшу текста
+
+    - embed(texts) / embed_async(texts): пачка текстов, промахи кэша запрашиваются пачками
+    - embed_one_async(text): для потоковых этапов - одиночные запросы корутин
+      собираются в общую пачку (до batch_size текстов или batch_delay секунд)
+    """
+
+    def __init__(self, db_path: str = "cache/embeddings.sqlite", model: str = EMBEDDING_MODEL,
+                 task_type: str = "SEMANTIC_SIMILARITY", batch_size: int = EMBED_BATCH_SIZE,
+                 batch_delay: float = 0.05, client=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.task_type = task_type
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._client = client
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()  # Запущенные пачки: ссылка не дает сборщику мусора удалить задачу
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not GENAI_AVAILABLE:
+                raise RuntimeError("google-genai не установлен - эмбеддинги недоступны")
+            self._client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+        return self._client
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{self.task_type}\n{text}".encode('utf-8')).hexdigest()
+
+    def _load(self, keys: list) -> dict:
+        """{key: вектор} для ключей, которые есть в кэше"""
+        conn = self._connect()
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), 500):
+            part = unique_keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _save(self, items: dict):
+        conn = self._connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(key, self.model, len(vector), vector.astype(np.float32).tobytes(), now) for key, vector in items.items()]
+        )
+        conn.commit()
+
+    async def _request(self, texts: list) -> np.ndarray:
+        """Один запрос embed_content; векторы нормируются для косинусной близости"""
+        result = await get_rate_limiter(self.model).acall(
+            self.client.aio.models.embed_content,
+            model=self.model,
+            contents=texts,
+            config={'task_type': self.task_type}
+        )
+        with self._lock:
+            self.requests += 1
+        vectors = np.array([embedding.values for embedding in result.embeddings], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    async def embed_async(self, texts: list) -> np.ndarray:
+        """Эмбеддинги текстов (n, dim); при ошибке API - исключение, а не случайные векторы"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        keys = [self.key(text) for text in texts]
+        vectors = self._load(keys)
+        cached = sum(1 for key in keys if key in vectors)
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in vectors))
+        with self._lock:
+            self.hits += cached
+            self.misses += len(texts) - cached
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        for batch, batch_vectors in zip(batches, await asyncio.gather(*(self._request(b) for b in batches))):
+            fresh = {self.key(text): vector for text, vector in zip(batch, batch_vectors)}
+            self._save(fresh)
+            vectors.update(fresh)
+        return np.stack([vectors[key] for key in keys])
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Синхронный фасад над embed_async"""
+        return run_sync(self.embed_async(texts))
+
+    async def embed_one_async(self, text: str) -> np.ndarray:
+        """Эмбеддинг одного текста; одновременные вызовы объединяются в один запрос"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._embed_pending(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_pending(self, batch: list):
+        """Считает пачку и раздает результат (или ошибку) всем ожидающим ее вызовам"""
+        try:
+            vectors = await self.embed_async([text for text, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'requests': self.requests,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
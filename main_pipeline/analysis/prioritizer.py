@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковая приоритизация: ограниченная куча лучших K направлений
+Направления попадают в кучу по мере готовности критики. Когда куча полна и
+ошибка предварительного отбора оценена, кандидат, чья оценка отбора заведомо
+не превзойдет минимум кучи, к критику уже не отправляется.
+"""
+
+import heapq
+import itertools
+import math
+
+import numpy as np
+
+from .scoring import final_scores, score_matrix
+
+# Сколько пар (оценка отбора, итоговая оценка) нужно, чтобы оценить ошибку отбора
+MIN_RESIDUAL_SAMPLES = 20
+
+
+class TopKPrioritizer:
+    """
+    Лучшие K направлений по итоговой оценке (k=None - все направления)
+
+    Корень min-кучи - худшее из лучших: минимальная оценка, при равенстве - более
+    позднее направление (как при устойчивой сортировке по убыванию).
+
+    Ошибка отбора - квантиль confidence разностей (итоговая оценка - оценка отбора)
+    по уже откритикованным направлениям. Кандидат отсекается (prune), если даже с
+    этой поправкой его оценка отбора не выше минимума полной кучи.
+    """
+
+    def __init__(self, k: int = None, weights: dict = None, confidence: float = 0.95,
+                 min_samples: int = MIN_RESIDUAL_SAMPLES):
+        self.k = k
+        self.weights = weights
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self._heap = []
+        self._sequence = itertools.count()
+        self._residuals = []
+        self.pushed = 0
+        self.evicted = 0
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self) -> bool:
+        return self.k is not None and len(self._heap) >= self.k
+
+    @property
+    def minimum(self) -> float:
+        """Оценка, которую нужно превзойти, чтобы попасть в кучу"""
+        return self._heap[0][0] if self.full else -math.inf
+
+    def margin(self):
+        """Верхняя граница ошибки отбора или None, пока данных мало"""
+        if len(self._residuals) < self.min_samples:
+            return None
+        return float(np.quantile(self._residuals, self.confidence))
+
+    @property
+    def confident(self) -> bool:
+        """Куча полна и ошибка отбора оценена - можно отсекать кандидатов"""
+        return self.full and self.margin() is not None
+
+    def push(self, direction: dict):
+        """Добавляет откритикованное направление (поле 'critique' - сырые оценки критика)"""
+        score = float(final_scores(score_matrix([direction['critique']]), self.weights)[0])
+        self.pushed += 1
+        if direction.get('triage_score') is not None:
+            self._residuals.append(score - direction['triage_score'])
+        entry = (score, -next(self._sequence), direction)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            self.evicted += 1
+        else:
+            self.evicted += 1
+
+    def can_beat(self, direction: dict) -> bool:
+        """Может ли кандидат попасть в кучу (без оценки отбора - всегда может)"""
+        return bool(self.prune([direction], count=False))
+
+    def prune(self, directions: list, count: bool = True) -> list:
+        """
+        Кандидаты, которые еще могут попасть в кучу; остальные учитываются как пропущенные
+        
+        Калибровочные направления отбора не отсекаются - их вердикты нужны TriageGate.
+        """
+        margin = self.margin() if self.full else None
+        if margin is None:
+            return list(directions)
+        bound = self.minimum - margin
+        kept = [d for d in directions
+                if d.get('triage_score') is None or d.get('triage_calibration') or d['triage_score'] > bound]
+        if count:
+            self.skipped += len(directions) - len(kept)
+        return kept
+
+    def directions(self) -> list:
+        """Направления в куче в порядке добавления"""
+        return [direction for _, _, direction in sorted(self._heap, key=lambda entry: -entry[1])]
+
+    def summary(self) -> str:
+        if self.k is None:
+            return f"в рейтинге все {self.pushed} направлений"
+        margin = self.margin()
+        margin_note = f"{margin:+.2f}" if margin is not None else "не оценена"
+        minimum_note = f"{self.minimum:.2f}" if self.full else "куча не заполнена"
+        return (f"топ-{self.k} из {self.pushed} прошедших критику, минимум {minimum_note}, "
+                f"ошибка отбора {margin_note}; не отправлено критику (не попали бы в топ): {self.skipped}")
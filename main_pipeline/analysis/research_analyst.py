@@ -4,34 +4,153 @@
 Простой аналитик для поиска перспективных направлений
 """
 
+import asyncio
+import itertools
 import json
-from collections import defaultdict
+import math
+import random
 from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm
 import concurrent.futures
 import numpy as np
 
-from core.models import Critique, PrioritizedDirection, SynthesizedBridgeIdea, ThematicProgram, HierarchicalReport, DirectionSubgroup, DirectionType
-from config import llm_critic_client
+from core.models import Critique, CritiqueScores, CritiqueBatch, TriageBatch, PrioritizedDirection, SynthesizedBridgeIdea, ThematicProgram, HierarchicalReport, DirectionSubgroup, DirectionType
+from config import CRITIC_MODEL, EXTRACTOR_MODEL, get_llm_response_cache, llm_critic_aclient, llm_extractor_aclient
+from core.rate_limiter import throughput_summary, track_throughput
+from core.async_runtime import get_runtime, run_sync, submit
+from processing.chunking import CHARS_PER_TOKEN
+from .embeddings import EmbeddingStore
+from .semantic_dedup import DEFAULT_DEDUP_THRESHOLD, SemanticDeduplicator
+from .triage import TRIAGE_BATCH_SIZE, TriageGate
+from .scoring import DEFAULT_SCORE_WEIGHTS, score_critiques
+from .prioritizer import TopKPrioritizer
+from .clustering import DEFAULT_CLUSTER_SIZE, DEFAULT_MAX_CLUSTER_SIZE, MIN_CLUSTER_SIZE, cluster_vectors
+
+# В общей очереди этапа 2 критика идет раньше синтеза: готовые направления не копятся
+CRITIQUE_PRIORITY = 0
+SYNTHESIS_PRIORITY = 1
+
+# Минимальный размер волны критики в пакетном режиме с top_k
+TOPK_MIN_WAVE = 100
+
+# Ожидаемый размер ответа критика на одно направление (токенов) - для подбора размера пачки
+CRITIQUE_OUTPUT_TOKENS = 300
+
+# Рубрика критика общая для одиночных и пакетных запросов; итоговый скор и рекомендация
+# считаются локально (analysis/scoring.py), модель их не вычисляет
+CRITIC_RUBRIC = """
+# ROLE
+You are a cynical but fair, world-renowned scientific reviewer for the journal 'Nature'. Your task is to ruthlessly but objectively evaluate the proposed scientific direction. You are looking for true breakthroughs, not incremental improvements.
+
+# TASK
+Evaluate the proposed research direction. Your verdict must be structured and based on three pillars: Novelty, Potential Impact, and Feasibility. Don't fall for fancy words, look at the essence.
+
+# EVALUATION INSTRUCTIONS:
+1.  **Interest check (is_interesting):** Does this even make sense? If the idea is absurd or trivial, immediately set `false`.
+2.  **Novelty (novelty_score):** Is this really something new, or just repackaging old ideas? (10 = new paradigm, 1 = another BERT paper).
+3.  **Impact (impact_score):** If this works, will it change the world or just add +0.1% to some benchmark? (10 = Nobel Prize, 1 = nobody will notice).
+4.  **Feasibility (feasibility_score):** Can this be tested today or is it science fiction 50 years ahead? (10 = can be done in a year in grad school, 1 = requires building a time machine).
+5.  **Strengths:** 1-2 points what can be praised.
+6.  **Weaknesses:** 1-2 points where the main risks and problems are.
+"""
+
+PROMPT_CRITIC = """{rubric}
+# PROPOSED DIRECTION:
+"{description}"
+
+CRITICAL: Your response MUST be ONLY a JSON object that corresponds to the Pydantic CritiqueScores schema. 
+CRITICAL: All text fields (strengths, weaknesses) MUST be in English only.
+"""
+
+PROMPT_CRITIC_BATCH = """{rubric}
+Evaluate EACH of the following {count} proposed directions independently - never compare them with each other or let one verdict influence another.
+
+# PROPOSED DIRECTIONS:
+{directions}
+
+CRITICAL: Return exactly one entry per direction in "critiques", with direction_id copied exactly as given.
+CRITICAL: Your response MUST be ONLY a JSON object that corresponds to the Pydantic CritiqueBatch schema.
+CRITICAL: All text fields (strengths, weaknesses) MUST be in English only.
+"""
+
+# Быстрый предварительный отбор (дешевая модель): только ожидаемый скор, без текста
+PROMPT_TRIAGE = """
+You are screening candidate research directions before a full expert review. For EACH direction, predict the final score a demanding 'Nature' reviewer would give it, where final score = {formula} (each 0-10). Trivial, absurd or repackaged ideas score below 3.
+
+# DIRECTIONS:
+{directions}
+
+CRITICAL: Return exactly one entry per direction in "scores", with direction_id copied exactly as given.
+CRITICAL: Your response MUST be ONLY a JSON object that corresponds to the Pydantic TriageBatch schema.
+"""
 
 class ResearchAnalyst:
     """Аналитик для исследования графа знаний"""
     
-    def __init__(self, knowledge_graph):
+    def __init__(self, knowledge_graph, semantic_dedup: bool = True, dedup_threshold: float = DEFAULT_DEDUP_THRESHOLD,
+                 batched_critique: bool = True, critique_batch_tokens: int = 8000, max_critique_batch: int = 20,
+                 triage: bool = True, triage_recall: float = 0.95, triage_calibration: int = 60,
+                 score_weights: dict = None, top_k: int = None, stream_critique: bool = True,
+                 cluster_size: int = DEFAULT_CLUSTER_SIZE, max_cluster_size: int = DEFAULT_MAX_CLUSTER_SIZE):
+        """
+        Args:
+            semantic_dedup: схлопывать почти одинаковые направления по эмбеддингам описаний до критики
+            dedup_threshold: косинусная близость, начиная с которой направления считаются дубликатами
+            batched_critique: критиковать несколько направлений одним запросом (рубрика - один раз на пачку)
+            critique_batch_tokens: бюджет токенов пачки критики (описания + ожидаемые ответы)
+            max_critique_batch: максимум направлений в одной пачке критики
+            triage: предварительный отбор дешевой моделью перед полным критиком
+            triage_recall: какую долю интересных (по вердикту критика) направлений должен сохранять отбор
+            triage_calibration: сколько направлений проходит к критику без отбора для калибровки порога
+            score_weights: веса итоговой оценки {'impact', 'novelty', 'feasibility'} (по умолчанию 0.5/0.3/0.2)
+            top_k: сколько лучших направлений держать в рейтинге (None - все); кандидаты, которые
+                по оценке отбора не попадут в топ, критику не отправляются
+            stream_critique: generate_research_directions сразу критикует направления потоковым
+                конвейером, а analyze_and_synthesize_report берет готовую критику
+            cluster_size: средний размер тематического кластера в иерархическом отчете
+            max_cluster_size: предел направлений в одном промпте синтеза программы
+        """
+        self.knowledge_graph = knowledge_graph
         self.graph = knowledge_graph.graph
+        self.semantic_dedup = semantic_dedup
+        self.dedup_threshold = dedup_threshold
+        self.batched_critique = batched_critique
+        self.critique_batch_tokens = critique_batch_tokens
+        self.max_critique_batch = max_critique_batch
+        self.critique_stats = {'batch_requests': 0, 'batched': 0, 'single_requests': 0, 'retried': 0, 'cached': 0}
+        # Вердикты пачек кэшируются по одному на направление (см. _verdict_keys)
+        self.verdict_cache = get_llm_response_cache()
+        self.triage = triage
+        self.triage_recall = triage_recall
+        self.triage_calibration = triage_calibration
+        self.triage_gate = None
+        self.score_weights = {**DEFAULT_SCORE_WEIGHTS, **(score_weights or {})}
+        self.top_k = top_k
+        self.prioritizer = None
+        self.stream_critique = stream_critique
+        # (направления, критика) последнего потокового запуска generate_research_directions
+        self._streamed_critique = None
+        self.cluster_size = cluster_size
+        self.max_cluster_size = max_cluster_size
+        self.embeddings = EmbeddingStore()
+        # Для кластеризации Gemini советует отдельный тип задачи; кэш общий (тип входит в ключ)
+        self.cluster_embeddings = EmbeddingStore(task_type="CLUSTERING")
 
-    def _generate_directions_from_white_spots(self, max_workers=4) -> list:
-        """Поиск 'белых пятен' с помощью Агента-Синтезатора качественных описаний"""
-        print("  🔬 Запускаю Агента-Синтезатора для анализа белых пятен...")
-        directions = []
-        
-        # Находим все гипотезы
-        all_hypotheses = [(node_id, data) for node_id, data in self.graph.nodes(data=True) 
-                         if data.get('type') == 'Hypothesis']
+    def _embedding_note(self, store: EmbeddingStore = None) -> str:
+        s = (store or self.embeddings).stats()
+        return f"из кэша {s['hits']}, новых {s['misses']}, запросов {s['requests']}"
+
+    @staticmethod
+    def _concurrency_note() -> str:
+        """Подпись для логов: задачи - корутины, их параллелизм ограничен глобально"""
+        return f"асинхронно, в полете до {get_runtime().max_in_flight} запросов"
+
+    def _prepare_whitespot_tasks(self) -> list:
+        """Готовит задачи для белых пятен: гипотезы, у которых нет результатов"""
+        all_hypotheses = self.knowledge_graph.nodes_of_type('Hypothesis')
         print(f"     🔍 Найдено гипотез для анализа: {len(all_hypotheses)}")
         
-        # Собираем задачи для параллельного выполнения
         whitespot_tasks = []
         for node_id, data in all_hypotheses:
             successors = list(self.graph.successors(node_id))
@@ -49,175 +168,291 @@ class ResearchAnalyst:
                     'paper_id': paper_id,
                     'paper_context': paper_context
                 })
-        
-        print(f"     📋 Подготовлено {len(whitespot_tasks)} задач для параллельного синтеза ({max_workers} потоков)")
-        
-        # Параллельное выполнение синтеза белых пятен
-        def process_whitespot(task):
-            idea = self._synthesize_whitespot_idea(
-                task['hypothesis_text'], 
-                task['paper_id'], 
-                task['paper_context']
-            )
-            if idea:
-                return {
-                    "type": "White Spot",
-                    "title": idea.title,
-                    "description": f"{idea.scientific_premise} {idea.proposed_direction}",
-                    "supporting_papers": [task['paper_id']]
-                }
-            return None
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {
-                executor.submit(process_whitespot, task): task 
-                for task in whitespot_tasks
-            }
-            
-            for future in tqdm(concurrent.futures.as_completed(future_to_task), 
-                             total=len(whitespot_tasks), desc="Анализ белых пятен",
-                             position=0, leave=True):
-                try:
-                    result = future.result()
-                    if result:
-                        directions.append(result)
-                except Exception as e:
-                    print(f"⚠️ Ошибка обработки белого пятна: {e}")
-        
-        print(f"     ✅ Синтезировано {len(directions)} качественных описаний белых пятен")
-        return directions
+        return whitespot_tasks
 
-    def _generate_directions_from_bridges(self, max_workers=4) -> list:
-        """Поиск 'междисциплинарных мостов' с помощью Агента-Синтезатора."""
-        print("  🧠 Запускаю Агента-Синтезатора для поиска междисциплинарных мостов...")
-        directions = []
-        entity_papers = defaultdict(set)
-        
-        # 1. Сначала собираем все статьи для каждой сущности, как и раньше
-        for u, v, data in self.graph.edges(data=True):
-            if data.get('type') == 'MENTIONS':
-                concept_node = self.graph.nodes[u]
-                entity_node = self.graph.nodes[v]
-                paper_id = concept_node.get('paper_id')
-                entity_name = entity_node.get('name')
-                if paper_id and entity_name:
-                    entity_papers[entity_name].add(paper_id)
-
-        # Собираем задачи для параллельного синтеза мостов
+    def _prepare_bridge_tasks(self) -> list:
+        """Готовит задачи для синтеза мостов: сущности, упомянутые в нескольких статьях"""
+        # Один проход по рёбрам вместо повторного обхода всех рёбер для каждой сущности
+        entity_mentions = self.knowledge_graph.entity_mentions()
+        
         bridge_tasks = []
-        for entity, papers in entity_papers.items():
-            if len(papers) > 1:
-                # Извлекаем контекст для этой сущности из всех связей
-                contexts = defaultdict(list)
-                for u, v, data in self.graph.edges(data=True):
-                    if data.get('type') == 'MENTIONS' and self.graph.nodes[v].get('name') == entity:
-                        paper_id = self.graph.nodes[u].get('paper_id')
-                        if paper_id in papers and data.get('context'):
-                            contexts[paper_id].append(data['context'])
-                
+        for entity, paper_contexts in entity_mentions.items():
+            if len(paper_contexts) > 1:
+                contexts = {paper_id: context_list 
+                            for paper_id, context_list in paper_contexts.items() if context_list}
                 if contexts:
                     bridge_tasks.append({
                         'entity': entity,
-                        'contexts': dict(contexts),
-                        'papers': list(papers)
+                        'contexts': contexts,
+                        'papers': list(paper_contexts)
                     })
+        return bridge_tasks
+
+    def _prepare_new_method_tasks(self) -> list:
+        """Готовит задачи 'новый инструмент для старой проблемы': пары метод-сущность из свежих статей"""
+        # Находим самый свежий год в наборе данных  
+        papers = self.knowledge_graph.nodes_of_type('Paper')
+        latest_year = max((data.get('year', 0) for _, data in papers), default=2024)
         
-        print(f"     📋 Подготовлено {len(bridge_tasks)} задач для параллельного синтеза мостов ({max_workers} потоков)")
-        
-        # Параллельное выполнение синтеза идей-мостов
-        def process_bridge(task):
-            idea = self._synthesize_bridge_idea(task['entity'], task['contexts'])
-            if idea:
-                return {
-                    "type": "Bridge",
-                    "title": idea.title,
-                    "description": f"{idea.scientific_premise} {idea.proposed_direction}",
-                    "supporting_papers": task['papers']
-                }
-            return None
+        print(f"     📅 Анализирую методы из свежих статей ({latest_year} год)")
+        
+        # Берем только методы статей последнего года через индекс концептов по статьям
+        latest_methods = [
+            (node_id, data)
+            for paper_id, paper_data in papers if paper_data.get('year') == latest_year
+            for node_id, data in self.knowledge_graph.concepts_of_paper(paper_id)
+            if data.get('type') == 'Method'
+        ]
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {
-                executor.submit(process_bridge, task): task 
-                for task in bridge_tasks
+        method_entity_pairs = []
+        for node_id, data in latest_methods:
+            for successor in self.graph.successors(node_id):
+                if self.graph.nodes[successor].get('type') == 'Entity':
+                    entity_name = self.graph.nodes[successor].get('name')
+                    method_entity_pairs.append({
+                        'method_text': data.get('statement', data.get('content', 'N/A')),
+                        'entity_name': entity_name,
+                        'paper_id': data.get('paper_id'),
+                        'paper_year': latest_year
+                    })
+        return method_entity_pairs
+
+    async def _whitespot_direction(self, task) -> dict:
+        """Синтезирует направление 'White Spot' для одной непроверенной гипотезы"""
+        idea = await self._synthesize_whitespot_idea(
+            task['hypothesis_text'], 
+            task['paper_id'], 
+            task['paper_context']
+        )
+        if idea:
+            return {
+                "type": "White Spot",
+                "title": idea.title,
+                "description": f"{idea.scientific_premise} {idea.proposed_direction}",
+                "supporting_papers": [task['paper_id']]
             }
-            
-            for future in tqdm(concurrent.futures.as_completed(future_to_task), 
-                             total=len(bridge_tasks), desc="Синтез идей-мостов",
-                             position=0, leave=True):
-                try:
-                    result = future.result()
-                    if result:
-                        directions.append(result)
-                except Exception as e:
-                    print(f"⚠️ Ошибка обработки моста: {e}")
-        return directions
+        return None
+
+    async def _bridge_direction(self, task) -> dict:
+        """Синтезирует направление 'Bridge' для одной сущности-моста"""
+        idea = await self._synthesize_bridge_idea(task['entity'], task['contexts'])
+        if idea:
+            return {
+                "type": "Bridge",
+                "title": idea.title,
+                "description": f"{idea.scientific_premise} {idea.proposed_direction}",
+                "supporting_papers": task['papers']
+            }
+        return None
+
+    async def _new_method_direction(self, pair) -> dict:
+        """Синтезирует направление 'New Tool, Old Problem' для одной пары метод-сущность"""
+        idea = await self._synthesize_new_method_idea(
+            pair['method_text'], 
+            pair['entity_name'], 
+            pair['paper_id'], 
+            pair['paper_year']
+        )
+        if idea:
+            return {
+                "type": "New Tool, Old Problem",
+                "title": idea.title,
+                "description": f"{idea.scientific_premise} {idea.proposed_direction}",
+                "supporting_papers": [pair['paper_id']]
+            }
+        return None
 
-    def _generate_directions_from_new_methods(self, max_workers=4) -> list:
-        """Поиск 'новых инструментов для старых проблем' с помощью Агента-Синтезатора"""
-        print("  🧪 Запускаю Агента-Синтезатора для анализа новых методов...")
+    def _direction_sources(self) -> list:
+        """Три генератора направлений: [(название, задачи, корутина синтеза одной задачи)]"""
+        print("  🔬 Белые пятна: гипотезы без результатов...")
+        whitespot_tasks = self._prepare_whitespot_tasks()
+        print("  🧠 Междисциплинарные мосты: сущности из нескольких статей...")
+        bridge_tasks = self._prepare_bridge_tasks()
+        print("  🧪 Новые методы для старых проблем...")
+        method_tasks = self._prepare_new_method_tasks()
+        print(f"     📋 Задач синтеза: белых пятен {len(whitespot_tasks)}, мостов {len(bridge_tasks)}, "
+              f"пар метод-сущность {len(method_tasks)}")
+        return [
+            ("White Spot", whitespot_tasks, self._whitespot_direction),
+            ("Bridge", bridge_tasks, self._bridge_direction),
+            ("New Tool, Old Problem", method_tasks, self._new_method_direction),
+        ]
+
+    async def _run_pipeline(self, critique: bool = True, worker_budget: int = None):
+        """
+        Потоковый DAG этапа 2: синтез (три генератора) -> дедупликация по названию -> критика
+        
+        Все задачи - в одной очереди с общим бюджетом воркеров. Генераторы чередуются,
+        новые уникальные направления ставятся на критику, как только набирается пачка
+        (см. _pack_critique_batches), остаток - после окончания синтеза; задачи критики
+        идут вперед синтеза, поэтому фазы перекрываются, а не ждут друг друга.
+        При semantic_dedup почти одинаковые по смыслу направления сливаются с уже
+        принятыми (объединяются supporting_papers) и повторно не критикуются.
+        При triage между дедупликацией и критикой стоит предварительный отбор
+        (см. TriageGate): к критику идут только направления не ниже порога.
+        
+        Готовая критика сразу попадает в кучу топ-K (TopKPrioritizer); пачки критики
+        перед отправкой очищаются от кандидатов, которые уже не попадут в топ.
+        
+        Returns:
+            (уникальные направления, критикованные направления из топ-K с полем 'critique')
+        """
+        worker_budget = worker_budget or get_runtime().max_in_flight
+        sources = self._direction_sources()
+        
+        queue = asyncio.PriorityQueue()
+        sequence = itertools.count()
+        total_synthesis = sum(len(tasks) for _, tasks, _ in sources)
+        synthesis_bar = tqdm(total=total_synthesis, desc="Синтез направлений", position=0, leave=True)
+        critique_bar = tqdm(total=0, desc="Критика направлений", position=1, leave=True) if critique else None
+        
         directions = []
+        prioritizer = self._new_prioritizer()
+        seen_titles = set()
+        duplicates = 0
+        deduplicator = SemanticDeduplicator(self.embeddings, self.dedup_threshold) if self.semantic_dedup else None
+        gate = self._new_triage_gate() if critique else None
+        # Принятые направления ждут, пока наберется полная пачка отбора/критики; остатки уходят,
+        # когда предыдущий этап закончился
+        pending_triage, pending_critique = [], []
+        # Направления, ждущие окончания калибровки отбора
+        deferred = []
+        synthesis_left = total_synthesis
+        triage_in_flight = 0
         
-        # Находим самый свежий год в наборе данных  
-        latest_year = max((data.get('year', 0) for n, data in self.graph.nodes(data=True) 
-                          if data.get('type') == 'Paper'), default=2024)
+        def advance():
+            nonlocal triage_in_flight
+            synthesis_done = synthesis_left == 0
+            if gate is not None:
+                batches = [pending_triage[i:i + TRIAGE_BATCH_SIZE] for i in range(0, len(pending_triage), TRIAGE_BATCH_SIZE)]
+                if not synthesis_done and batches and len(batches[-1]) < TRIAGE_BATCH_SIZE:
+                    batches.pop()
+                for batch in batches:
+                    del pending_triage[:len(batch)]
+                    triage_in_flight += 1
+                    queue.put_nowait((CRITIQUE_PRIORITY, next(sequence), (run_triage, batch)))
+            batches = self._pack_critique_batches(pending_critique)
+            inputs_done = synthesis_done and triage_in_flight == 0 and not pending_triage
+            # Калибровочная выборка не ждет полной пачки - от ее вердиктов зависят отложенные направления
+            if not (inputs_done or (gate is not None and gate.awaiting_verdicts)) and batches:
+                # Последняя пачка может быть неполной - она ждет следующих направлений
+                batches.pop()
+            for batch in batches:
+                del pending_critique[:len(batch)]
+                queue.put_nowait((CRITIQUE_PRIORITY, next(sequence), (run_critique, batch)))
         
-        print(f"     📅 Анализирую методы из свежих статей ({latest_year} год)")
+        async def run_synthesis(item):
+            nonlocal synthesis_left
+            synthesize, task = item
+            try:
+                await accept_direction(await synthesize(task))
+            finally:
+                synthesis_bar.update()
+                synthesis_bar.set_postfix_str(throughput_summary(), refresh=False)
+                synthesis_left -= 1
+                if critique:
+                    advance()
         
-        method_entity_pairs = []
-        for node_id, data in self.graph.nodes(data=True):
-            if (data.get('type') == 'Method' and 
-                self.graph.nodes.get(data.get('paper_id', ''), {}).get('year') == latest_year):
-                
-                for successor in self.graph.successors(node_id):
-                    if self.graph.nodes[successor].get('type') == 'Entity':
-                        entity_name = self.graph.nodes[successor].get('name')
-                        method_entity_pairs.append({
-                            'method_text': data.get('statement', data.get('content', 'N/A')),
-                            'entity_name': entity_name,
-                            'paper_id': data.get('paper_id'),
-                            'paper_year': latest_year
-                        })
-        
-        print(f"     🔍 Найдено {len(method_entity_pairs)} пар метод-сущность для анализа ({max_workers} потоков)")
-        
-        # Параллельное выполнение синтеза новых методов
-        def process_new_method(pair):
-            idea = self._synthesize_new_method_idea(
-                pair['method_text'], 
-                pair['entity_name'], 
-                pair['paper_id'], 
-                pair['paper_year']
-            )
-            if idea:
-                return {
-                    "type": "New Tool, Old Problem",
-                    "title": idea.title,
-                    "description": f"{idea.scientific_premise} {idea.proposed_direction}",
-                    "supporting_papers": [pair['paper_id']]
-                }
-            return None
+        async def accept_direction(direction):
+            nonlocal duplicates
+            if not direction:
+                return
+            # Дедупликация на лету: повторное название не синтезируется в отчет и не критикуется
+            if direction['title'] in seen_titles:
+                duplicates += 1
+                return
+            seen_titles.add(direction['title'])
+            if deduplicator is not None and await deduplicator.add_async(direction) is not None:
+                return
+            directions.append(direction)
+            if gate is not None:
+                pending_triage.append(direction)
+            elif critique:
+                admit_to_critique(direction)
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {
-                executor.submit(process_new_method, task): task 
-                for task in method_entity_pairs
-            }
-            
-            for future in tqdm(concurrent.futures.as_completed(future_to_task), 
-                             total=len(method_entity_pairs), desc="Анализ новых методов",
-                             position=0, leave=True):
+        def admit_to_critique(direction):
+            critique_bar.total += 1
+            critique_bar.refresh()
+            pending_critique.append(direction)
+        
+        async def run_triage(batch):
+            nonlocal triage_in_flight
+            try:
+                await self._triage_batch(batch)
+            finally:
+                for direction in batch:
+                    if gate.awaiting_verdicts:
+                        deferred.append(direction)
+                    elif gate.admit(direction):
+                        admit_to_critique(direction)
+                triage_in_flight -= 1
+                advance()
+        
+        async def run_critique(batch):
+            results, candidates = [], batch
+            try:
+                # Куча топ-K могла подняться, пока пачка ждала в очереди
+                candidates = prioritizer.prune(batch)
+                results = await self._critique_batch(candidates) if candidates else []
+                for result in results:
+                    prioritizer.push(result)
+            finally:
+                critique_bar.update(len(batch))
+                critique_bar.set_postfix_str(throughput_summary(), refresh=False)
+                if gate is not None:
+                    self._observe_triage(candidates, results)
+                    if deferred and gate.calibrated:
+                        for direction in deferred:
+                            if gate.admit(direction):
+                                admit_to_critique(direction)
+                        deferred.clear()
+                        advance()
+        
+        # Чередуем задачи генераторов, чтобы все три источника продвигались одновременно
+        interleaved = itertools.zip_longest(*[[(synthesize, task) for task in tasks] for _, tasks, synthesize in sources])
+        for group in interleaved:
+            for item in group:
+                if item is not None:
+                    queue.put_nowait((SYNTHESIS_PRIORITY, next(sequence), (run_synthesis, item)))
+        
+        async def worker():
+            while True:
+                _, _, (handler, payload) = await queue.get()
                 try:
-                    result = future.result()
-                    if result:
-                        directions.append(result)
+                    await handler(payload)
                 except Exception as e:
-                    print(f"⚠️ Ошибка обработки нового метода: {e}")
+                    print(f"⚠️ Ошибка задачи этапа 2: {e}")
+                finally:
+                    queue.task_done()
         
-        print(f"     ✅ Синтезировано {len(directions)} идей применения новых методов")
-        return directions
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(worker_budget, total_synthesis)))]
+        try:
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            synthesis_bar.close()
+            if critique_bar is not None:
+                critique_bar.close()
+        
+        print(f"     ✅ Синтезировано {len(directions)} уникальных направлений "
+              f"(дубликатов по названию: {duplicates})" +
+              (f", прошли критику: {prioritizer.pushed}" if critique else ""))
+        if critique:
+            print(f"     📦 Критика: {self._critique_note()}")
+            print(f"     🏆 Рейтинг: {prioritizer.summary()}")
+        if gate is not None:
+            print(f"     🧹 Предварительный отбор: {gate.summary()}; "
+                  f"сэкономлено направлений у критика: {gate.skipped}")
+        if deduplicator is not None:
+            saved = f", сэкономлено вызовов критики: {deduplicator.merged}" if critique else ""
+            print(f"     🧬 Семантических дубликатов слито: {deduplicator.merged} "
+                  f"(порог {self.dedup_threshold}){saved}; эмбеддинги: {self._embedding_note()}")
+
+        return directions, prioritizer.directions()
 
-    def _synthesize_bridge_idea(self, entity_name: str, contexts: dict) -> SynthesizedBridgeIdea:
+    async def _synthesize_bridge_idea(self, entity_name: str, contexts: dict) -> SynthesizedBridgeIdea:
         """Вызывает LLM для синтеза идеи на основе контекстов."""
         prompt = f"""# ROLE
 You are a perceptive scientific strategist, adept at seeing non-obvious connections between different fields of research.
@@ -237,8 +472,7 @@ Generate a title, a scientific premise, and a concrete research proposal. Be con
 """
         try:
             # Используем тот же мощный клиент, что и для критики
-            from config import llm_critic_client 
-            synthesized_idea = llm_critic_client.chat.completions.create(
+            synthesized_idea = await llm_critic_aclient.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
                 response_model=SynthesizedBridgeIdea
             )
@@ -247,7 +481,7 @@ Generate a title, a scientific premise, and a concrete research proposal. Be con
             print(f"⚠️ Ошибка синтеза идеи для '{entity_name}': {e}")
             return None
 
-    def _synthesize_whitespot_idea(self, hypothesis_text: str, paper_id: str, paper_context: str = "") -> SynthesizedBridgeIdea:
+    async def _synthesize_whitespot_idea(self, hypothesis_text: str, paper_id: str, paper_context: str = "") -> SynthesizedBridgeIdea:
         """Синтезирует качественное описание белого пятна на основе гипотезы"""
         prompt = f"""# ROLE
 You are a strategic research advisor specializing in identifying high-impact validation opportunities in biomedical research.
@@ -269,7 +503,7 @@ Analyze the hypothesis and generate:
 Focus on the scientific significance, not just the mechanics. Your response MUST be a JSON object matching the SynthesizedBridgeIdea schema.
 """
         try:
-            synthesized_idea = llm_critic_client.chat.completions.create(
+            synthesized_idea = await llm_critic_aclient.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
                 response_model=SynthesizedBridgeIdea
             )
@@ -278,7 +512,7 @@ Focus on the scientific significance, not just the mechanics. Your response MUST
             print(f"⚠️ Ошибка синтеза белого пятна для {paper_id}: {e}")
             return None
 
-    def _synthesize_new_method_idea(self, method_text: str, entity_name: str, paper_id: str, paper_year: int) -> SynthesizedBridgeIdea:
+    async def _synthesize_new_method_idea(self, method_text: str, entity_name: str, paper_id: str, paper_year: int) -> SynthesizedBridgeIdea:
         """Синтезирует идею применения нового метода к старым проблемам"""
         prompt = f"""# ROLE
 You are a translational research strategist, expert at identifying how cutting-edge methodologies can solve longstanding problems in different fields.
@@ -305,7 +539,7 @@ Generate:
 Be specific about the problem being solved, not just the method being applied. Your response MUST be a JSON object matching the SynthesizedBridgeIdea schema.
 """
         try:
-            synthesized_idea = llm_critic_client.chat.completions.create(
+            synthesized_idea = await llm_critic_aclient.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
                 response_model=SynthesizedBridgeIdea
             )
@@ -315,95 +549,337 @@ Be specific about the problem being solved, not just the method being applied. Y
             return None
 
     def generate_research_directions(self, max_workers=4) -> list:
-        """Генерирует исследовательские направления (фаза расхождения)"""
-        all_directions = []
-        all_directions.extend(self._generate_directions_from_white_spots(max_workers))
-        all_directions.extend(self._generate_directions_from_bridges(max_workers))
-        all_directions.extend(self._generate_directions_from_new_methods(max_workers))
-        
-        # Удаляем дубликаты по названию
-        unique_directions = {d['title']: d for d in all_directions}.values()
-        return list(unique_directions)
-
-    def _critique_single_direction(self, direction: dict) -> dict:
-        """Критикует одно направление (для параллелизации)"""
-        PROMPT_CRITIC = """
-# ROLE
-You are a cynical but fair, world-renowned scientific reviewer for the journal 'Nature'. Your task is to ruthlessly but objectively evaluate the proposed scientific direction. You are looking for true breakthroughs, not incremental improvements.
+        """
+        Генерирует исследовательские направления (фаза расхождения)
+        
+        Три генератора работают одновременно с общим бюджетом воркеров, дубликаты
+        по названию отбрасываются на лету. max_workers оставлен для совместимости -
+        параллелизм задают MAX_IN_FLIGHT и лимитеры моделей.
+        
+        При stream_critique критика идет в том же конвейере (см. generate_and_critique),
+        и analyze_and_synthesize_report для этого же списка направлений ее не повторяет.
+        """
+        if not self.stream_critique:
+            directions, _ = run_sync(self._run_pipeline(critique=False))
+            return directions
+        directions, prioritized = self.generate_and_critique()
+        self._streamed_critique = (directions, prioritized)
+        return directions
 
-# TASK
-Evaluate the proposed research direction. Your verdict must be structured and based on three pillars: Novelty, Potential Impact, and Feasibility. Don't fall for fancy words, look at the essence.
+    def generate_and_critique(self, worker_budget: int = None) -> tuple:
+        """
+        Синтез и критика одним потоковым конвейером (см. _run_pipeline)
+        
+        Критика начинается, как только синтезирована первая пачка направлений, а не
+        после завершения всех генераторов.
+        
+        Returns:
+            (уникальные сырые направления, список PrioritizedDirection по убыванию оценки)
+        """
+        directions, critiqued = run_sync(self._run_pipeline(critique=True, worker_budget=worker_budget))
+        return directions, self._rank_directions(critiqued)
 
-# PROPOSED DIRECTION:
-"{description}"
+    def _new_prioritizer(self) -> TopKPrioritizer:
+        """Новая куча топ-K на запуск критики; ошибка отбора оценивается с уровнем triage_recall"""
+        self.prioritizer = TopKPrioritizer(self.top_k, self.score_weights, confidence=self.triage_recall)
+        return self.prioritizer
 
-# EVALUATION INSTRUCTIONS:
-1.  **Interest check (is_interesting):** Does this even make sense? If the idea is absurd or trivial, immediately set `false`.
-2.  **Novelty (novelty_score):** Is this really something new, or just repackaging old ideas? (10 = new paradigm, 1 = another BERT paper).
-3.  **Impact (impact_score):** If this works, will it change the world or just add +0.1% to some benchmark? (10 = Nobel Prize, 1 = nobody will notice).
-4.  **Feasibility (feasibility_score):** Can this be tested today or is it science fiction 50 years ahead? (10 = can be done in a year in grad school, 1 = requires building a time machine).
-5.  **Final Score (final_score):** Calculate as `0.5*impact + 0.3*novelty + 0.2*feasibility`.
-6.  **Strengths:** 1-2 points what can be praised.
-7.  **Weaknesses:** 1-2 points where the main risks and problems are.
-8.  **Recommendation:** 'Strongly Recommend' (if final_score > 7.5), 'Consider' (if final_score > 5.0), 'Reject' (in all other cases).
+    def _new_triage_gate(self):
+        """Новый TriageGate на запуск критики (None, если отбор выключен)"""
+        self.triage_gate = TriageGate(self.triage_recall, self.triage_calibration) if self.triage else None
+        return self.triage_gate
 
-CRITICAL: Your response MUST be ONLY a JSON object that corresponds to the Pydantic Critique schema. 
-CRITICAL: All text fields (strengths, weaknesses) MUST be in English only.
-"""
+    def _triage_prompt(self, directions_text: str) -> str:
+        """Промпт отбора с формулой итоговой оценки из score_weights аналитика"""
+        formula = " + ".join(f"{self.score_weights[name]:g}*{name}" for name in ('impact', 'novelty', 'feasibility'))
+        return PROMPT_TRIAGE.format(formula=formula, directions=directions_text)
+
+    async def _triage_batch(self, directions: list):
+        """
+        Быстрая оценка пачки направлений дешевой моделью (поле 'triage_score')
+        
+        Оценки кэшируются по одному на направление (см. _verdict_keys), в запрос идут
+        только направления без оценки в кэше. Направления без оценки (нет в ответе,
+        ошибка запроса) получают None и проходят к критику без отбора.
+        """
+        keys = self._verdict_keys(EXTRACTOR_MODEL, float, self._triage_prompt(""), directions)
+        scores = self._cached_verdicts(keys, float)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            ids = [f"D{n + 1}" for n in range(len(missing))]
+            directions_text = "\n".join(f'- {direction_id}: "{directions[i]["description"]}"'
+                                         for direction_id, i in zip(ids, missing))
+            received = {}
+            try:
+                batch = await llm_extractor_aclient.chat.completions.create(
+                    messages=[{"role": "user", "content": self._triage_prompt(directions_text)}],
+                    response_model=TriageBatch
+                )
+                received = {item.direction_id: item.promise_score for item in batch.scores
+                            if 0.0 <= item.promise_score <= 10.0}
+            except Exception as e:
+                print(f"⚠️ Ошибка предварительного отбора ({len(missing)} направлений): {e}")
+            for direction_id, i in zip(ids, missing):
+                scores[i] = received.get(direction_id)
+                self._store_verdict(keys[i], EXTRACTOR_MODEL, float, scores[i])
+        for direction, score in zip(directions, scores):
+            direction['triage_score'] = score
+
+    def _pack_critique_batches(self, directions: list) -> list:
+        """
+        Жадно упаковывает направления в пачки для критики
         
+        Размер пачки K подстраивается под бюджет: каждое направление стоит токенов
+        описания плюс ожидаемого ответа (CRITIQUE_OUTPUT_TOKENS), пачка не больше
+        max_critique_batch. Без batched_critique каждое направление - своя пачка.
+        """
+        max_batch = self.max_critique_batch if self.batched_critique else 1
+        batches, current, current_tokens = [], [], 0
+        for direction in directions:
+            tokens = len(direction['description']) // CHARS_PER_TOKEN + CRITIQUE_OUTPUT_TOKENS
+            if current and (current_tokens + tokens > self.critique_batch_tokens or len(current) >= max_batch):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(direction)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _is_valid_critique(critique: CritiqueScores) -> bool:
+        """Оценки модели должны лежать в шкале 0-10"""
+        scores = (critique.novelty_score, critique.impact_score, critique.feasibility_score)
+        return all(0.0 <= score <= 10.0 for score in scores)
+
+    @staticmethod
+    def _accept_critique(direction: dict, critique: CritiqueScores):
+        """Направление с сырыми оценками критика или None, если критик счел его неинтересным"""
+        if not critique.is_interesting:
+            return None
+        direction['critique'] = critique
+        return direction
+
+    def _verdict_keys(self, model: str, response_model, template: str, directions: list) -> list:
+        """
+        Ключи кэша вердиктов - по одному на направление (None, если кэш выключен)
+        
+        Ключ зависит от модели, шаблона промпта и описания направления, но не от соседей
+        по пачке и их позиционных ID: состав пачек задается порядком завершения воркеров,
+        и при повторном запуске запросы пачек целиком не совпадают с закэшированными.
+        """
+        if self.verdict_cache is None:
+            return [None] * len(directions)
+        return [self.verdict_cache.make_key(model, response_model,
+                                            {'template': template, 'description': direction['description']})
+                for direction in directions]
+
+    def _cached_verdicts(self, keys: list, response_model) -> list:
+        """Вердикты из кэша в порядке ключей (None - промах)"""
+        return [self.verdict_cache.get(key, response_model) if key is not None else None for key in keys]
+
+    def _store_verdict(self, key: str, model: str, response_model, verdict):
+        if key is not None and verdict is not None:
+            self.verdict_cache.put(key, model, response_model, verdict)
+
+    async def _request_single_critique(self, direction: dict) -> CritiqueScores:
+        """Критикует одно направление (корутина общего цикла событий); None при ошибке"""
         try:
-            critique = llm_critic_client.chat.completions.create(
-                messages=[{"role": "user", "content": PROMPT_CRITIC.format(description=direction['description'])}],
-                response_model=Critique
+            self.critique_stats['single_requests'] += 1
+            critique = await llm_critic_aclient.chat.completions.create(
+                messages=[{"role": "user", "content": PROMPT_CRITIC.format(rubric=CRITIC_RUBRIC, description=direction['description'])}],
+                response_model=CritiqueScores
             )
-            
-            if critique.is_interesting:
-                direction['critique'] = critique
-                return direction
-            else:
-                return None
+            return critique
         except Exception as e:
             print(f"⚠️ Ошибка при обработке направления '{direction['title']}': {e}")
             return None
 
+    async def _request_critique_batch(self, directions: list) -> list:
+        """Один запрос критики на пачку; оценки в порядке направлений (None - нет в ответе или вне шкалы)"""
+        ids = [f"D{i + 1}" for i in range(len(directions))]
+        directions_text = "\n\n".join(f'### DIRECTION ID: {direction_id}\n"{direction["description"]}"'
+                                       for direction_id, direction in zip(ids, directions))
+        received = {}
+        try:
+            self.critique_stats['batch_requests'] += 1
+            batch = await llm_critic_aclient.chat.completions.create(
+                messages=[{"role": "user", "content": PROMPT_CRITIC_BATCH.format(
+                    rubric=CRITIC_RUBRIC, count=len(directions), directions=directions_text)}],
+                response_model=CritiqueBatch
+            )
+            for item in batch.critiques:
+                critique = CritiqueScores(**item.model_dump(exclude={'direction_id'}))
+                if item.direction_id in ids and item.direction_id not in received and self._is_valid_critique(critique):
+                    received[item.direction_id] = critique
+        except Exception as e:
+            print(f"⚠️ Ошибка пакетной критики ({len(directions)} направлений): {e}")
+        self.critique_stats['batched'] += len(received)
+        return [received.get(direction_id) for direction_id in ids]
+
+    async def _critique_batch(self, directions: list) -> list:
+        """
+        Критикует пачку направлений одним запросом (рубрика передается один раз)
+        
+        Направления с вердиктом в кэше в запрос не попадают. Направления, которых нет
+        в ответе, с оценками вне шкалы 0-10, или вся пачка при ошибке запроса
+        критикуются повторно по одному.
+        
+        Returns:
+            направления с полем 'critique' (CritiqueScores), прошедшие проверку интереса
+        """
+        keys = self._verdict_keys(CRITIC_MODEL, CritiqueScores, CRITIC_RUBRIC + PROMPT_CRITIC_BATCH, directions)
+        critiques = self._cached_verdicts(keys, CritiqueScores)
+        missing = [i for i, critique in enumerate(critiques) if critique is None]
+        self.critique_stats['cached'] += len(directions) - len(missing)
+        
+        if len(missing) > 1:
+            received = await self._request_critique_batch([directions[i] for i in missing])
+            for i, critique in zip(missing, received):
+                critiques[i] = critique
+            retries = [i for i in missing if critiques[i] is None]
+            self.critique_stats['retried'] += len(retries)
+        else:
+            retries = missing
+        if retries:
+            singles = await asyncio.gather(*(self._request_single_critique(directions[i]) for i in retries))
+            for i, critique in zip(retries, singles):
+                critiques[i] = critique
+        
+        for i in missing:
+            self._store_verdict(keys[i], CRITIC_MODEL, CritiqueScores, critiques[i])
+        results = []
+        for direction, critique in zip(directions, critiques):
+            accepted = self._accept_critique(direction, critique) if critique is not None else None
+            if accepted is not None:
+                results.append(accepted)
+        return results
+
+    def _observe_triage(self, directions: list, accepted: list):
+        """Передает вердикты критика в калибровку предварительного отбора"""
+        if self.triage_gate is not None:
+            accepted_ids = {id(direction) for direction in accepted}
+            for direction in directions:
+                self.triage_gate.observe(direction, id(direction) in accepted_ids)
+
+    def _critique_note(self) -> str:
+        s = self.critique_stats
+        return (f"пачками {s['batched']} направлений за {s['batch_requests']} запросов, "
+                f"по одному {s['single_requests']} (из них повторов после пачки {s['retried']}), "
+                f"из кэша {s['cached']}")
+
     def critique_and_prioritize(self, directions: list, max_workers=4) -> list:
-        """Критикует и приоритизирует направления (фаза схождения)"""
-        print(f"     🚀 Запускаем параллельную критику {len(directions)} направлений ({max_workers} потоков)")
+        """
+        Критикует и приоритизирует направления (фаза схождения)
+        
+        При triage сначала все направления оцениваются дешевой моделью, затем
+        случайная калибровочная выборка критикуется целиком, и по ее вердиктам
+        к критику пропускаются только направления не ниже порога. С top_k прошедшие
+        отбор критикуются волнами по убыванию оценки отбора; как только следующая
+        волна не может попасть в топ, критика останавливается.
+        """
+        gate = self._new_triage_gate()
+        prioritizer = self._new_prioritizer()
+        if gate is None:
+            for direction in self._critique_directions(directions, "Критика направлений"):
+                prioritizer.push(direction)
+        else:
+            batches = [directions[i:i + TRIAGE_BATCH_SIZE] for i in range(0, len(directions), TRIAGE_BATCH_SIZE)]
+            print(f"     🧹 Предварительный отбор {len(directions)} направлений в {len(batches)} запросах")
+            for future in concurrent.futures.as_completed([submit(self._triage_batch(batch)) for batch in batches]):
+                future.result()
+            
+            calibration_ids = {id(d) for d in random.Random(0).sample(directions, min(self.triage_calibration, len(directions)))}
+            calibration = [d for d in directions if id(d) in calibration_ids]
+            for direction in calibration:
+                gate.admit(direction)
+            for direction in self._critique_directions(calibration, "Критика (калибровка)"):
+                prioritizer.push(direction)
+            gate.close_calibration()
+            admitted = [d for d in directions if id(d) not in calibration_ids and gate.admit(d)]
+            
+            # Без оценки отбора - первыми: их нельзя отсечь по границе
+            admitted.sort(key=lambda d: -d['triage_score'] if d.get('triage_score') is not None else -math.inf)
+            wave_size = max(self.top_k or len(admitted), TOPK_MIN_WAVE)
+            for start in range(0, len(admitted), wave_size):
+                wave = admitted[start:start + wave_size]
+                candidates = prioritizer.prune(wave)
+                if not candidates:
+                    # Волны идут по убыванию оценки отбора - дальше кандидаты только хуже
+                    prioritizer.prune(admitted[start + wave_size:])
+                    break
+                for direction in self._critique_directions(candidates, "Критика направлений"):
+                    prioritizer.push(direction)
+            print(f"     🧹 Предварительный отбор: {gate.summary()}; "
+                  f"сэкономлено направлений у критика: {gate.skipped}")
+        
+        print(f"     📦 Критика: {self._critique_note()}")
+        print(f"     🏆 Рейтинг: {prioritizer.summary()}")
+        return self._rank_directions(prioritizer.directions())
+
+    def _critique_directions(self, directions: list, desc: str) -> list:
+        """Параллельная критика пачками; возвращает направления, прошедшие критику"""
+        batches = self._pack_critique_batches(directions)
+        print(f"     🚀 Запускаем параллельную критику {len(directions)} направлений "
+              f"в {len(batches)} запросах ({self._concurrency_note()})")
         
         critiqued_directions = []
         
-        # Параллельная обработка направлений
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_direction = {
-                executor.submit(self._critique_single_direction, direction): direction 
-                for direction in directions
-            }
-            
-            for future in tqdm(concurrent.futures.as_completed(future_to_direction), 
-                             total=len(directions), desc="Критика направлений",
-                             position=0, leave=True):
+        # Параллельная обработка пачек направлений
+        future_to_batch = {
+            submit(self._critique_batch(batch)): batch
+            for batch in batches
+        }
+        
+        with tqdm(total=len(directions), desc=desc, position=0, leave=True) as progress:
+            for future in concurrent.futures.as_completed(future_to_batch):
+                results = []
                 try:
-                    result = future.result()
-                    if result is not None:
-                        critiqued_directions.append(result)
+                    results = future.result()
+                    critiqued_directions.extend(results)
                 except Exception as e:
-                    print(f"❌ Ошибка обработки направления: {e}")
-        
-        sorted_directions = sorted(critiqued_directions, key=lambda x: x['critique'].final_score, reverse=True)
+                    print(f"❌ Ошибка обработки пачки направлений: {e}")
+                self._observe_triage(future_to_batch[future], results)
+                progress.update(len(future_to_batch[future]))
+                progress.set_postfix_str(throughput_summary(), refresh=False)
+        return critiqued_directions
+
+    @staticmethod
+    def _ranking_order(critiques: list, weights: dict) -> tuple:
+        """Итоговые оценки (векторно) и порядок по их убыванию; при равенстве сохраняется исходный порядок"""
+        scored = score_critiques(critiques, weights)
+        order = np.argsort(-np.array([c.final_score for c in scored]), kind='stable')
+        return scored, order
+
+    def _rank_directions(self, critiqued_directions: list) -> list:
+        """Считает итоговые оценки по сырым оценкам критика, сортирует по ним и присваивает ранги"""
+        scored, order = self._ranking_order([d['critique'] for d in critiqued_directions], self.score_weights)
         
         final_ranking = [
             PrioritizedDirection(
-                rank=i + 1,
-                title=direction['title'],
-                description=direction['description'],
-                critique=direction['critique'],
-                supporting_papers=direction['supporting_papers'],
-                research_type=direction.get('type', 'Unknown')
+                rank=rank + 1,
+                title=critiqued_directions[i]['title'],
+                description=critiqued_directions[i]['description'],
+                critique=scored[i],
+                supporting_papers=critiqued_directions[i]['supporting_papers'],
+                research_type=critiqued_directions[i].get('type', 'Unknown')
             )
-            for i, direction in enumerate(sorted_directions)
+            for rank, i in enumerate(order)
         ]
         return final_ranking
 
+    def rerank(self, prioritized_list: list, weights: dict = None) -> list:
+        """
+        Пересчитывает итоговые оценки, рекомендации и ранги с другими весами
+        
+        Локальная операция над уже полученными оценками критика - без запросов к модели.
+        weights дополняют веса аналитика (score_weights), например {'feasibility': 0.5}.
+        """
+        weights = {**self.score_weights, **(weights or {})}
+        scored, order = self._ranking_order([d.critique for d in prioritized_list], weights)
+        return [prioritized_list[i].model_copy(update={'rank': rank + 1, 'critique': scored[i]})
+                for rank, i in enumerate(order)]
+
     def save_report(self, prioritized_list: list, filepath: str = "research_report.json"):
         """Сохраняет финальный отчет в JSON файл"""
         try:
@@ -445,7 +921,7 @@ CRITICAL: All text fields (strengths, weaknesses) MUST be in English only.
             print(f"❌ Ошибка сохранения отчета: {e}")
             return False
 
-    def _synthesize_cluster_report(self, cluster_directions: list) -> ThematicProgram:
+    async def _synthesize_cluster_report(self, cluster_directions: list) -> ThematicProgram:
         """Вызывает Главного Аналитика v2.1 для синтеза структурированной программы с подгруппами."""
         
         # Готовим детальный список для промпта
@@ -512,7 +988,7 @@ CRITICAL: Only use the exact subgroup_type names provided. Include direction_ran
                 program_summary: str
                 subgroups: List[SubgroupStructure]
 
-            response = llm_critic_client.chat.completions.create(
+            response = await llm_critic_aclient.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
                 response_model=StructuredProgram
             )
@@ -547,82 +1023,92 @@ CRITICAL: Only use the exact subgroup_type names provided. Include direction_ran
             return None
 
     def _get_gemini_embeddings(self, texts: list) -> np.ndarray:
-        """Получает эмбеддинги текстов через Gemini API"""
+        """
+        Эмбеддинги описаний для кластеризации (нормированные, из кэша или пачками через Gemini)
+        
+        При ошибке API - исключение: случайные векторы дали бы бессмысленные программы.
+        """
+        print(f"      🔢 Получаю эмбеддинги для {len(texts)} описаний через Gemini...")
+        embeddings_array = self.cluster_embeddings.embed(texts)
+        print(f"      ✅ Получены эмбеддинги размерности {embeddings_array.shape} "
+              f"({self._embedding_note(self.cluster_embeddings)})")
+        return embeddings_array
+
+    def _cluster_directions(self, critiqued_list: list) -> tuple:
+        """
+        Делит направления на тематические кластеры не больше max_cluster_size
+        
+        Если эмбеддинги получить не удалось, направления режутся на группы по рангу -
+        отчет строится, но без тематической группировки.
+        
+        Returns:
+            (кластеры - списки направлений, направления из слишком маленьких кластеров)
+        """
         try:
-            from google import genai
-            import os
-            import numpy as np
-            
-            # Создаем клиент Gemini для эмбеддингов согласно документации
-            client = genai.Client()
-            
-            print(f"      🔢 Получаю эмбеддинги для {len(texts)} описаний через Gemini...")
-            
-            # Получаем эмбеддинги согласно официальной документации
-            result = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents=texts  # contents, не content!
-            )
-            
-            # Конвертируем в numpy array для sklearn
-            embeddings_list = []
-            for embedding in result.embeddings:  # result.embeddings, не result['embedding']
-                embeddings_list.append(embedding.values)  # embedding.values для получения чисел
-            
-            embeddings_array = np.array(embeddings_list)
-            print(f"      ✅ Получены эмбеддинги размерности {embeddings_array.shape}")
-            
-            return embeddings_array
-            
+            embeddings = self._get_gemini_embeddings([d.description for d in critiqued_list])
+            groups = cluster_vectors(embeddings, self.cluster_size, self.max_cluster_size)
         except Exception as e:
-            print(f"⚠️ Ошибка получения эмбеддингов Gemini: {e}")
-            # Fallback: возвращаем случайные эмбеддинги для тестирования
-            print("   🔄 Используем случайные эмбеддинги для тестирования...")
-            return np.random.rand(len(texts), 768)
+            print(f"⚠️ Ошибка получения эмбеддингов Gemini, группировка по рангу: {e}")
+            groups = [list(range(i, min(i + self.max_cluster_size, len(critiqued_list))))
+                      for i in range(0, len(critiqued_list), self.max_cluster_size)]
+        
+        clusters, unclustered = [], []
+        for group in groups:
+            members = [critiqued_list[i] for i in group]
+            if len(members) >= MIN_CLUSTER_SIZE:
+                clusters.append(members)
+            else:
+                unclustered.extend(members)
+        return clusters, unclustered
 
     def analyze_and_synthesize_report(self, directions: list, max_workers=4) -> HierarchicalReport:
         """Новый главный метод, включающий критику, кластеризацию и синтез."""
         
-        # 1. Критикуем все направления, как и раньше
-        print("   🎯 -> Phase 2.1: Critiquing and prioritizing directions...")
-        critiqued_list = self.critique_and_prioritize(directions, max_workers)
+        # 1. Критикуем все направления, как и раньше (если их еще не раскритиковал потоковый конвейер)
+        streamed = self._streamed_critique
+        if streamed is not None and streamed[0] is directions:
+            print("   🎯 -> Phase 2.1: critique already done by the streaming pipeline")
+            critiqued_list = streamed[1]
+        else:
+            print("   🎯 -> Phase 2.1: Critiquing and prioritizing directions...")
+            critiqued_list = self.critique_and_prioritize(directions, max_workers)
+        return self.synthesize_report(critiqued_list)
 
+    def synthesize_report(self, critiqued_list: list) -> HierarchicalReport:
+        """
+        Кластеризация и синтез программ по уже критикованным направлениям (PrioritizedDirection)
+        
+        Программы кластеров синтезируются параллельно; направления, которые модель не
+        разложила по подгруппам (или чья программа не синтезировалась), попадают
+        в unclustered_directions, а не теряются.
+        """
         if not critiqued_list:
             return HierarchicalReport(timestamp=datetime.now().isoformat(), total_programs=0, programs=[], unclustered_directions=[])
         
-        # 2. Векторизация и Кластеризация - ОТКЛЮЧЕНО
-        print("   🧠 -> Phase 2.2: Clustering directions thematically... (DISABLED - using single cluster)")
-        # from sklearn.cluster import DBSCAN
-        # import numpy as np
-        
-        # # Используем Gemini embeddings для получения векторов
-        # embeddings = self._get_gemini_embeddings([d.description for d in critiqued_list])
-
-        # # Используем DBSCAN для кластеризации (строгие параметры для фокусированных кластеров)
-        # dbscan = DBSCAN(eps=0.35, min_samples=2, metric='cosine')
-        # clusters = dbscan.fit_predict(embeddings)
-
-        # Все направления помещаем в один кластер (кластер 0)
-        clustered_directions = defaultdict(list)
-        unclustered_directions = []
-        
-        # Все направления идут в один кластер
-        for direction in critiqued_list:
-            clustered_directions[0].append(direction)
-        
-        print(f"      ✅ Используется единый кластер с {len(clustered_directions[0])} направлениями.")
+        # 2. Векторизация и кластеризация
+        print("   🧠 -> Phase 2.2: Clustering directions thematically...")
+        clustered_directions, unclustered_directions = self._cluster_directions(critiqued_list)
+        print(f"      ✅ Кластеров: {len(clustered_directions)} "
+              f"(до {self.max_cluster_size} направлений в каждом), вне кластеров: {len(unclustered_directions)}.")
 
-        # 3. Синтез отчета Главным Аналитиком
+        # 3. Синтез отчета Главным Аналитиком - по кластеру на запрос, все кластеры параллельно
         print("   🏆 -> Phase 2.3: Synthesizing the final strategic report...")
         final_programs = []
-        for cluster_id, directions_in_cluster in tqdm(clustered_directions.items(), 
-                                                     desc="Синтез программ",
-                                                     position=0, leave=True):
-            # Сортируем идеи внутри кластера по рангу
-            sorted_directions = sorted(directions_in_cluster, key=lambda d: d.rank)
-            program = self._synthesize_cluster_report(sorted_directions)
-            if program:
+        # Сортируем идеи внутри кластера по рангу
+        future_to_cluster = {
+            submit(self._synthesize_cluster_report(sorted(directions_in_cluster, key=lambda d: d.rank))): directions_in_cluster
+            for directions_in_cluster in clustered_directions
+        }
+        for future in track_throughput(tqdm(concurrent.futures.as_completed(future_to_cluster),
+                                            total=len(future_to_cluster), desc="Синтез программ",
+                                            position=0, leave=True)):
+            directions_in_cluster = future_to_cluster[future]
+            program = future.result()
+            placed = set()
+            if program and program.component_directions:
                 final_programs.append(program)
+                placed = {d.rank for d in program.component_directions}
+            unclustered_directions.extend(d for d in directions_in_cluster if d.rank not in placed)
 
         # Сортируем сами программы по важности (например, по лучшему скору внутри)
         final_programs.sort(key=lambda p: max(d.critique.final_score for d in p.component_directions), reverse=True)
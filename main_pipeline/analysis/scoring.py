@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Итоговая оценка и рекомендация по сырым оценкам критика
+Критик возвращает только новизну, влияние и выполнимость; взвешенная сумма и
+рекомендация считаются локально и векторно, поэтому пересчет рейтинга с другими
+весами не требует повторных запросов к модели.
+"""
+
+import numpy as np
+
+from core.models import Critique, CritiqueScores
+
+# Веса итоговой оценки: 0.5*impact + 0.3*novelty + 0.2*feasibility
+DEFAULT_SCORE_WEIGHTS = {'impact': 0.5, 'novelty': 0.3, 'feasibility': 0.2}
+# Строго выше первого порога - 'Strongly Recommend', выше второго - 'Consider'
+STRONG_RECOMMEND_THRESHOLD = 7.5
+CONSIDER_THRESHOLD = 5.0
+
+_SCORE_FIELDS = ('impact_score', 'novelty_score', 'feasibility_score')
+_RAW_FIELDS = tuple(CritiqueScores.model_fields)
+
+
+def score_matrix(critiques: list) -> np.ndarray:
+    """Матрица (n, 3) сырых оценок: влияние, новизна, выполнимость"""
+    if not critiques:
+        return np.zeros((0, len(_SCORE_FIELDS)))
+    return np.array([[getattr(c, field) for field in _SCORE_FIELDS] for c in critiques], dtype=float)
+
+
+def weight_vector(weights: dict = None) -> np.ndarray:
+    weights = {**DEFAULT_SCORE_WEIGHTS, **(weights or {})}
+    return np.array([weights['impact'], weights['novelty'], weights['feasibility']], dtype=float)
+
+
+def final_scores(scores: np.ndarray, weights: dict = None) -> np.ndarray:
+    """Итоговые оценки для матрицы сырых оценок (см. score_matrix)"""
+    return scores @ weight_vector(weights)
+
+
+def recommendations(final: np.ndarray) -> np.ndarray:
+    """Рекомендации по итоговым оценкам"""
+    return np.select(
+        [final > STRONG_RECOMMEND_THRESHOLD, final > CONSIDER_THRESHOLD],
+        ["Strongly Recommend", "Consider"],
+        default="Reject"
+    )
+
+
+def score_critiques(critiques: list, weights: dict = None) -> list:
+    """
+    Полные Critique (с final_score и recommendation) по сырым оценкам критика
+
+    Принимает CritiqueScores или Critique - у уже оцененных пересчитываются только
+    итоговая оценка и рекомендация.
+    """
+    final = np.round(final_scores(score_matrix(critiques), weights), 4)
+    verdicts = recommendations(final)
+    # Оценки уже прошли валидацию в ответе критика - повторная проверка pydantic не нужна
+    return [
+        Critique.model_construct(**{field: getattr(critique, field) for field in _RAW_FIELDS},
+                                 final_score=float(score), recommendation=str(verdict))
+        for critique, score, verdict in zip(critiques, final, verdicts)
+    ]
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Семантическая дедупликация исследовательских направлений
+Почти одинаковые идеи (из разных мостов и белых пятен) схлопываются по косинусной
+близости эмбеддингов описаний до критики, а их supporting_papers объединяются.
+"""
+
+import numpy as np
+
+# hnswlib опционален: без него поиск соседей точный (векторизованный numpy)
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# Косинусная близость, начиная с которой два описания считаются одной идеей
+DEFAULT_DEDUP_THRESHOLD = 0.92
+
+
+class VectorIndex:
+    """
+    Поиск ближайшего соседа по косинусной близости для нормированных векторов
+
+    С hnswlib - приближенный поиск (HNSW), иначе - точный перебор матрицей numpy.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.capacity = initial_capacity
+        self.size = 0
+        self._hnsw = None
+        self._matrix = None
+
+    def _init(self, dim: int):
+        if HNSWLIB_AVAILABLE:
+            self._hnsw = hnswlib.Index(space='cosine', dim=dim)
+            self._hnsw.init_index(max_elements=self.capacity, ef_construction=200, M=16)
+            self._hnsw.set_ef(64)
+        else:
+            self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+
+    def nearest(self, vector: np.ndarray) -> tuple:
+        """(номер ближайшего вектора, косинусная близость) или (None, 0.0) для пустого индекса"""
+        if self.size == 0:
+            return None, 0.0
+        if self._hnsw is not None:
+            labels, distances = self._hnsw.knn_query(vector[np.newaxis, :], k=1)
+            return int(labels[0][0]), 1.0 - float(distances[0][0])
+        similarities = self._matrix[:self.size] @ vector
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+    def add(self, vector: np.ndarray) -> int:
+        """Добавляет вектор, возвращает его номер"""
+        if self._hnsw is None and self._matrix is None:
+            self._init(len(vector))
+        if self.size == self.capacity:
+            self.capacity *= 2
+            if self._hnsw is not None:
+                self._hnsw.resize_index(self.capacity)
+            else:
+                self._matrix = np.vstack([self._matrix, np.zeros_like(self._matrix)])
+        if self._hnsw is not None:
+            self._hnsw.add_items(vector[np.newaxis, :], [self.size])
+        else:
+            self._matrix[self.size] = vector
+        self.size += 1
+        return self.size - 1
+
+
+class SemanticDeduplicator:
+    """
+    Схлопывает направления с близкими описаниями
+
+    Первое направление группы остается представителем; у дубликатов забираются
+    supporting_papers, сами дубликаты на критику не идут.
+    """
+
+    def __init__(self, embedding_store, threshold: float = DEFAULT_DEDUP_THRESHOLD):
+        self.embeddings = embedding_store
+        self.threshold = threshold
+        self.index = VectorIndex()
+        self.representatives = []
+        self.merged = 0
+        self.failed = 0
+
+    def _insert(self, direction: dict, vector: np.ndarray):
+        """Ищет близкого представителя и сливает с ним направление; возвращает представителя или None"""
+        best, similarity = self.index.nearest(vector)
+        if best is not None and similarity >= self.threshold:
+            representative = self.representatives[best]
+            merge_supporting_papers(representative, direction)
+            self.merged += 1
+            return representative
+        self.index.add(vector)
+        self.representatives.append(direction)
+        return None
+
+    async def add_async(self, direction: dict):
+        """
+        Потоковый вариант для конвейера этапа 2
+
+        Returns:
+            представитель, с которым слито направление, или None, если направление новое.
+            Если эмбеддинг получить не удалось, направление считается новым.
+        """
+        try:
+            vector = await self.embeddings.embed_one_async(direction['description'])
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ Эмбеддинг для '{direction['title'][:60]}' не получен, дедупликация пропущена: {e}")
+            return None
+        # Между получением вектора и вставкой нет await - поиск и вставка атомарны в цикле событий
+        return self._insert(direction, vector)
+
+    def deduplicate(self, directions: list) -> list:
+        """Пакетный вариант: возвращает представителей (порядок сохраняется)"""
+        if not directions:
+            return []
+        try:
+            vectors = self.embeddings.embed([d['description'] for d in directions])
+        except Exception as e:
+            self.failed += len(directions)
+            print(f"⚠️ Эмбеддинги не получены, семантическая дедупликация пропущена: {e}")
+            return list(directions)
+        return [direction for direction, vector in zip(directions, vectors)
+                if self._insert(direction, vector) is None]
+
+
+def merge_supporting_papers(representative: dict, duplicate: dict):
+    """Добавляет к представителю статьи дубликата (без повторов, порядок сохраняется)"""
+    papers = representative['supporting_papers']
+    for paper_id in duplicate.get('supporting_papers', []):
+        if paper_id not in papers:
+            papers.append(paper_id)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Дешевый предварительный отбор направлений перед полным критиком
+Быстрая модель оценивает перспективность направления (ожидаемый итоговый скор 0-10),
+к дорогому критику идут только направления не ниже порога. Порог калибруется по
+вердиктам критика так, чтобы сохранялась заданная доля (recall) интересных направлений.
+"""
+
+import math
+
+import numpy as np
+
+# Сколько направлений оценивает один запрос предварительного отбора
+TRIAGE_BATCH_SIZE = 40
+# Порог по умолчанию, если калибровка не нашла ни одного интересного направления
+DEFAULT_TRIAGE_MIN_SCORE = 5.0
+
+
+class TriageGate:
+    """
+    Решает, какое направление пропустить к полному критику
+
+    Первые calibration_size направлений проходят без отбора: их вердикты критика
+    (observe) дают выборку оценок интересных направлений. Пока вердикты не получены
+    (awaiting_verdicts), решение по остальным откладывается. После калибровки порог -
+    такой квантиль этих оценок, что не меньше recall_target интересных направлений
+    выше порога. Направления без оценки (сбой отбора) всегда проходят.
+    """
+
+    def __init__(self, recall_target: float = 0.95, calibration_size: int = 60,
+                 min_score: float = DEFAULT_TRIAGE_MIN_SCORE):
+        self.recall_target = recall_target
+        self.calibration_size = calibration_size
+        self.min_score = min_score
+        self.positive_scores = []
+        self.observed = 0
+        self.screened = 0
+        self.passed = 0
+        self.calibration = 0
+        self.skipped = 0
+        self._calibration_closed = False
+
+    @property
+    def calibrated(self) -> bool:
+        return self._calibration_closed or self.observed >= self.calibration_size
+
+    @property
+    def awaiting_verdicts(self) -> bool:
+        """Калибровочная выборка набрана, но критик еще не вынес по ней все вердикты"""
+        return not self.calibrated and self.calibration >= self.calibration_size
+
+    def close_calibration(self):
+        """Завершает калибровку досрочно (пакетный режим: вся выборка уже откритикована)"""
+        self._calibration_closed = True
+
+    def threshold(self) -> float:
+        """Текущий порог оценки (-inf, пока калибровка не завершена)"""
+        if not self.calibrated:
+            return -math.inf
+        if not self.positive_scores:
+            return self.min_score
+        return float(np.quantile(self.positive_scores, 1.0 - self.recall_target, method='lower'))
+
+    def admit(self, direction: dict) -> bool:
+        """Пропустить ли направление к критику; калибровочные помечаются 'triage_calibration'"""
+        self.screened += 1
+        score = direction.get('triage_score')
+        if not self.calibrated:
+            direction['triage_calibration'] = True
+            self.calibration += 1
+            self.passed += 1
+            return True
+        if score is None or score >= self.threshold():
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def observe(self, direction: dict, interesting: bool):
+        """Учитывает вердикт критика для калибровочного направления"""
+        if not direction.get('triage_calibration'):
+            return
+        self.observed += 1
+        if interesting and direction.get('triage_score') is not None:
+            self.positive_scores.append(direction['triage_score'])
+
+    def estimated_recall(self) -> float:
+        """Доля интересных калибровочных направлений, которые прошли бы текущий порог"""
+        if not self.positive_scores:
+            return 1.0
+        scores = np.asarray(self.positive_scores)
+        return float(np.mean(scores >= self.threshold()))
+
+    def summary(self) -> str:
+        threshold = self.threshold()
+        threshold_note = f"{threshold:.2f}" if math.isfinite(threshold) else "калибровка не завершена"
+        return (f"оценено {self.screened}, к критику {self.passed} (калибровочных {self.calibration}), "
+                f"отсеяно {self.skipped}; порог {threshold_note}, "
+                f"оценка полноты {self.estimated_recall():.0%} (цель {self.recall_target:.0%})")
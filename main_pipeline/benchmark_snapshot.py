@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк сохранения и загрузки графа: бинарный снимок .lgs против GraphML
+Использует тот же синтетический граф, что и benchmark_bridges.py. LLM не вызывается.
+"""
+
+import os
+import tempfile
+import time
+
+import networkx as nx
+
+from benchmark_bridges import build_synthetic_graph
+from graph.graph_snapshot import SNAPSHOT_SUFFIX, save_graph_snapshot, load_graph_snapshot
+
+def _timed(func, *args, repeats=3):
+    """Лучшее время из repeats запусков и результат последнего"""
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def benchmark_snapshot(repeats=3):
+    """Запускает бенчмарк и проверяет, что снимок восстанавливает граф без потерь"""
+    print("🧪 Строю синтетический граф...")
+    graph = build_synthetic_graph().graph
+    print(f"   📊 Узлов: {graph.number_of_nodes()}, Рёбер: {graph.number_of_edges()}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graphml_path = os.path.join(tmp_dir, "graph.graphml")
+        snapshot_path = os.path.join(tmp_dir, "graph" + SNAPSHOT_SUFFIX)
+
+        graphml_save, _ = _timed(nx.write_graphml, graph, graphml_path, repeats=repeats)
+        snapshot_save, _ = _timed(save_graph_snapshot, graph, snapshot_path, repeats=repeats)
+        graphml_load, _ = _timed(nx.read_graphml, graphml_path, repeats=repeats)
+        snapshot_load, loaded = _timed(load_graph_snapshot, snapshot_path, repeats=repeats)
+
+        graphml_size = os.path.getsize(graphml_path) / 2 ** 20
+        snapshot_size = os.path.getsize(snapshot_path) / 2 ** 20
+
+    print(f"🐢 GraphML: запись {graphml_save:.2f} сек, чтение {graphml_load:.2f} сек, {graphml_size:.1f} МБ")
+    print(f"⚡ Снимок:  запись {snapshot_save:.2f} сек, чтение {snapshot_load:.2f} сек, {snapshot_size:.1f} МБ")
+
+    # Снимок должен восстанавливать граф целиком: узлы, рёбра и атрибуты
+    assert dict(loaded.nodes(data=True)) == dict(graph.nodes(data=True))
+    assert sorted(loaded.edges(data=True), key=repr) == sorted(graph.edges(data=True), key=repr)
+
+    print(f"\n✅ Графы совпадают, ускорение записи ~{graphml_save / snapshot_save:.1f}x, "
+          f"чтения ~{graphml_load / snapshot_load:.1f}x")
+
+if __name__ == "__main__":
+    benchmark_snapshot()
@@ -5,12 +5,52 @@
 """
 
 import os
+from pathlib import Path
+
 import instructor
 from dotenv import load_dotenv
 
+from core.rate_limiter import RateLimitedClient, AsyncRateLimitedClient, configure_rate_limits, get_rate_limiter
+from core.llm_cache import LLMResponseCache, CachedClient, AsyncCachedClient
+from core.async_runtime import configure_runtime
+
 # Загрузка переменных окружения
 load_dotenv()
 
+# Модели клиентов извлечения (быстрая, дешевая) и критики (мощная)
+EXTRACTOR_MODEL = "gemini-2.0-flash"
+CRITIC_MODEL = "gemini-2.5-flash"
+
+# Бюджеты Gemini API по моделям (запросов и токенов в минуту) - подставьте лимиты своего тарифа.
+# Фактический параллелизм подбирается AIMD-регулятором в пределах max_concurrency
+MODEL_RATE_LIMITS = {
+    "gemini-2.0-flash": {"rpm": 2000, "tpm": 4_000_000, "max_concurrency": 64},
+    "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000, "max_concurrency": 32},
+    "gemini-embedding-001": {"rpm": 3000, "tpm": 1_000_000, "max_concurrency": 32},
+}
+configure_rate_limits(MODEL_RATE_LIMITS)
+
+# Сколько запросов может одновременно ждать ответа в общем цикле событий
+# (корутина в ожидании стоит килобайты, а не поток со стеком)
+MAX_IN_FLIGHT = 256
+configure_runtime(MAX_IN_FLIGHT)
+
+# Постоянный кэш ответов LLM: повторный анализ неизменившегося графа не тратит вызовы API
+LLM_CACHE_ENABLED = True
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_MB = 512
+# Рядом с пакетом, а не в папке запуска (путь можно переопределить переменной окружения)
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', str(Path(__file__).resolve().parent / 'cache' / 'llm_responses.sqlite'))
+_llm_response_cache = None
+
+def get_llm_response_cache():
+    """Общий кэш ответов LLM (создается при первом обращении; None, если кэш выключен)"""
+    global _llm_response_cache
+    if _llm_response_cache is None and LLM_CACHE_ENABLED:
+        _llm_response_cache = LLMResponseCache(LLM_CACHE_PATH, ttl_days=LLM_CACHE_TTL_DAYS,
+                                               max_size_mb=LLM_CACHE_MAX_MB)
+    return _llm_response_cache
+
 # Проверяем наличие Google API ключа
 def check_api_key():
     """Проверяет наличие Google API ключа"""
@@ -23,25 +63,43 @@ def check_api_key():
     os.environ["GOOGLE_API_KEY"] = os.getenv('GOOGLE_API_KEY')
     os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-def init_gemini_clients():
-    """Инициализирует клиентов Gemini"""
-    print("🚀 Инициализация Gemini клиентов...")
+def init_gemini_clients(async_client: bool = False):
+    """
+    Инициализирует клиентов Gemini
+    
+    async_client=True - нативные асинхронные клиенты (await create) для общего цикла событий
+    """
+    print(f"🚀 Инициализация {'асинхронных ' if async_client else ''}Gemini клиентов...")
     
     try:
         # Клиент для извлечения (быстрый, дешевый)
         extractor_client = instructor.from_provider(
-            "google/gemini-2.0-flash",
-            mode=instructor.Mode.GENAI_TOOLS
+            f"google/{EXTRACTOR_MODEL}",
+            mode=instructor.Mode.GENAI_TOOLS,
+            async_client=async_client
         )
         
         # Клиент для анализа и критики (мощный)
         critic_client = instructor.from_provider(
-            "google/gemini-2.5-flash", 
+            f"google/{CRITIC_MODEL}",
             # "google/gemini-2.0-flash",
-            mode=instructor.Mode.GENAI_STRUCTURED_OUTPUTS
+            mode=instructor.Mode.GENAI_STRUCTURED_OUTPUTS,
+            async_client=async_client
         )
         
         print("✅ Gemini клиенты успешно инициализированы!")
+        # Все вызовы проходят через общие для модели лимиты RPM/TPM и повторы при 429
+        # (синхронные и асинхронные клиенты делят один лимитер модели)
+        rate_limited = AsyncRateLimitedClient if async_client else RateLimitedClient
+        extractor_client = rate_limited(extractor_client, get_rate_limiter(EXTRACTOR_MODEL))
+        critic_client = rate_limited(critic_client, get_rate_limiter(CRITIC_MODEL))
+        
+        # Кэш стоит снаружи лимитера: попадания не расходуют лимиты модели
+        llm_response_cache = get_llm_response_cache()
+        if llm_response_cache is not None:
+            cached = AsyncCachedClient if async_client else CachedClient
+            extractor_client = cached(extractor_client, llm_response_cache, EXTRACTOR_MODEL)
+            critic_client = cached(critic_client, llm_response_cache, CRITIC_MODEL)
         return extractor_client, critic_client
         
     except Exception as e:
@@ -51,4 +109,5 @@ def init_gemini_clients():
 
 # Инициализация при импорте модуля
 check_api_key()
-llm_extractor_client, llm_critic_client = init_gemini_clients() 
\ No newline at end of file
+llm_extractor_client, llm_critic_client = init_gemini_clients()
+llm_extractor_aclient, llm_critic_aclient = init_gemini_clients(async_client=True) 
\ No newline at end of file
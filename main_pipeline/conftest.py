@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов main_pipeline
+"""
+
+import pytest
+
+from graph.knowledge_graph import ScientificKnowledgeGraph
+from core.models import ExtractedKnowledge, ScientificConcept
+
+@pytest.fixture
+def fake_graph():
+    """
+    Фабрика графов, в которых извлечение концептов записывает вызов вместо запроса к LLM
+
+    fake_graph(calls) -> ScientificKnowledgeGraph; каждая статья дает один концепт Result
+    с текстом статьи в качестве утверждения.
+    """
+    def make(calls: list) -> ScientificKnowledgeGraph:
+        skg = ScientificKnowledgeGraph(batched_extraction=False, chunked_extraction=False)
+
+        async def fake_extract(paper_id, text):
+            calls.append(paper_id)
+            return ExtractedKnowledge(paper_id=paper_id, concepts=[
+                ScientificConcept(concept_type="Result", statement=text)
+            ])
+
+        skg._extract_scientific_concepts = fake_extract
+        return skg
+
+    return make
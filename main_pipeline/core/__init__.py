@@ -5,12 +5,12 @@ Core модуль с основными моделями данных и ком
 
 from .models import (
     ConceptType, EntityType, MentionedEntity, ScientificConcept, 
-    ExtractedKnowledge, Critique, PrioritizedDirection, SynthesizedBridgeIdea,
-    ThematicProgram, HierarchicalReport, DirectionSubgroup, DirectionType
+    ExtractedKnowledge, ExtractedKnowledgeBatch, CritiqueScores, Critique, DirectionCritique, CritiqueBatch, TriageScore, TriageBatch,
+    PrioritizedDirection, SynthesizedBridgeIdea, ThematicProgram, HierarchicalReport, DirectionSubgroup, DirectionType
 )
 
 __all__ = [
     'ConceptType', 'EntityType', 'MentionedEntity', 'ScientificConcept',
-    'ExtractedKnowledge', 'Critique', 'PrioritizedDirection', 'SynthesizedBridgeIdea',
-    'ThematicProgram', 'HierarchicalReport', 'DirectionSubgroup', 'DirectionType'
+    'ExtractedKnowledge', 'ExtractedKnowledgeBatch', 'CritiqueScores', 'Critique', 'DirectionCritique', 'CritiqueBatch', 'TriageScore', 'TriageBatch',
+    'PrioritizedDirection', 'SynthesizedBridgeIdea', 'ThematicProgram', 'HierarchicalReport', 'DirectionSubgroup', 'DirectionType'
 ] 
\ No newline at end of file
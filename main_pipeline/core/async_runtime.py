@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Асинхронное ядро пайплайна: один цикл событий на процесс вместо пулов потоков
+Сетевые вызовы (Gemini, instructor) выполняются корутинами в фоновом цикле,
+общий семафор ограничивает число запросов в полете; синхронный код получает
+результаты через обычные concurrent.futures.Future.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+
+# Сколько запросов к API может одновременно ждать ответа (поверх лимитов RPM/TPM моделей)
+DEFAULT_MAX_IN_FLIGHT = 256
+
+
+class AsyncRuntime:
+    """
+    Фоновый цикл событий в отдельном потоке
+
+    - submit(coro) -> concurrent.futures.Future: для синхронных этапов (tqdm, as_completed)
+    - run(coro): синхронный фасад - ждет результат корутины
+    - slot(): глобальный семафор запросов в полете (используется RateLimiter.acall)
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # Семафор привязан к циклу событий; корутины из чужого цикла (asyncio.run в тестах) получают свой
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Цикл событий (запускается при первом обращении)"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="pipeline-async-io", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Запускает корутину в фоновом цикле, возвращает потокобезопасный Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Синхронно выполняет корутину в фоновом цикле и возвращает ее результат"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("синхронный фасад вызван из цикла событий - используйте await вместо него")
+        return self.submit(coro).result()
+
+    def slot(self) -> asyncio.Semaphore:
+        """Глобальный семафор запросов в полете для текущего цикла событий"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+            return semaphore
+
+    def close(self):
+        """Останавливает фоновый цикл (незавершенные корутины отменяются)"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+_runtime = AsyncRuntime()
+
+
+def configure_runtime(max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+    """Задает глобальный предел запросов в полете"""
+    _runtime.max_in_flight = max_in_flight
+    _runtime._semaphores = weakref.WeakKeyDictionary()
+
+
+def get_runtime() -> AsyncRuntime:
+    """Общий на процесс цикл событий пайплайна"""
+    return _runtime
+
+
+def run_sync(coro):
+    """Синхронный фасад над корутиной (для кода и скриптов, которые не используют asyncio)"""
+    return _runtime.run(coro)
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """Запускает корутину в общем цикле событий"""
+    return _runtime.submit(coro)
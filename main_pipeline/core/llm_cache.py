@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Постоянный кэш ответов LLM с адресацией по содержимому
+Ключ: (модель, хэш запроса, хэш схемы response_model); хранилище - SQLite (WAL)
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+
+def _canonical(obj):
+    """Приводит несериализуемые части запроса к стабильному виду для хэширования"""
+    if isinstance(obj, (bytes, bytearray)):
+        return hashlib.sha256(obj).hexdigest()
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(mode='json', exclude_none=True)
+    return str(obj)
+
+
+class LLMResponseCache:
+    """
+    Кэш структурированных ответов LLM
+
+    - TTL: записи старше ttl_days считаются промахом и удаляются
+    - Размер: при превышении max_size_mb вытесняются давно не читанные записи (LRU)
+    - Счетчики hits/misses/stores для отчета о сэкономленных вызовах
+    """
+
+    def __init__(self, db_path: str = "cache/llm_responses.sqlite", ttl_days: float = 30,
+                 max_size_mb: float = 512, evict_every: int = 100):
+        self.db_path = Path(db_path)
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adapters = {}
+        # База создается при первом запросе, а не в конструкторе: импорт config не оставляет файлов
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._schema_ready:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS responses (
+                            key TEXT PRIMARY KEY,
+                            model TEXT NOT NULL,
+                            value TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            created_at REAL NOT NULL,
+                            accessed_at REAL NOT NULL
+                        )
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+                    conn.commit()
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _adapter(self, response_model):
+        """TypeAdapter для модели ответа (подходит и для BaseModel, и для List[BaseModel])"""
+        adapter = self._adapters.get(response_model)
+        if adapter is None:
+            adapter = TypeAdapter(response_model)
+            schema_hash = hashlib.sha256(
+                json.dumps(adapter.json_schema(), sort_keys=True).encode('utf-8')
+            ).hexdigest()
+            adapter = self._adapters[response_model] = (adapter, schema_hash)
+        return adapter
+
+    def make_key(self, model: str, response_model, request: dict) -> str:
+        """Ключ кэша: модель + хэш запроса + хэш JSON-схемы ответа"""
+        _, schema_hash = self._adapter(response_model)
+        request_json = json.dumps(request, sort_keys=True, ensure_ascii=False, default=_canonical)
+        request_hash = hashlib.sha256(request_json.encode('utf-8')).hexdigest()
+        return f"{model}:{request_hash}:{schema_hash}"
+
+    def get(self, key: str, response_model):
+        """Возвращает закэшированный ответ или None"""
+        conn = self._connect()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is not None and self.ttl and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            row = None
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            adapter, _ = self._adapter(response_model)
+            value = adapter.validate_json(row[0])
+        except Exception:
+            # Запись не соответствует схеме (например, модель изменилась без изменения схемы)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, model: str, response_model, value):
+        """Сохраняет ответ; раз в evict_every записей проверяет лимит размера"""
+        try:
+            adapter, _ = self._adapter(response_model)
+            payload = adapter.dump_json(value).decode('utf-8')
+        except Exception:
+            return  # Несериализуемые ответы (например, потоковые Iterable) не кэшируем
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, value, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, payload, len(payload), now, now)
+        )
+        conn.commit()
+        with self._lock:
+            self.stores += 1
+            check_size = self.stores % self.evict_every == 0
+        if check_size:
+            self.evict()
+
+    def evict(self) -> int:
+        """Удаляет просроченные записи и самые давно читанные сверх лимита размера"""
+        conn = self._connect()
+        removed = 0
+        if self.ttl:
+            removed += conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                    (time.time() - self.ttl,)).rowcount
+        if self.max_size:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_size:
+                # Освобождаем с запасом 10%, чтобы не чистить кэш на каждой записи
+                excess = total - int(self.max_size * 0.9)
+                freed = 0
+                stale_keys = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    stale_keys.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+        conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        row = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': row[0],
+            'size_mb': row[1] / (1024 * 1024),
+        }
+
+
+class CachedClient:
+    """
+    Обертка instructor-клиента: одинаковые запросы отдаются из кэша без вызова API
+
+    Ставится снаружи RateLimitedClient, поэтому попадания в кэш не тратят лимиты модели.
+    """
+
+    def __init__(self, client, cache: LLMResponseCache, model: str):
+        self._client = client
+        self.cache = cache
+        self.model = model
+        self.chat = self
+        self.completions = self
+
+    def create(self, response_model=None, **kwargs):
+        if response_model is None:
+            return self._client.chat.completions.create(**kwargs)
+
+        key = self.cache.make_key(self.model, response_model, kwargs)
+        cached = self.cache.get(key, response_model)
+        if cached is not None:
+            return cached
+
+        response = self._client.chat.completions.create(response_model=response_model, **kwargs)
+        self.cache.put(key, self.model, response_model, response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class AsyncCachedClient(CachedClient):
+    """
+    То же для асинхронного клиента
+
+    Чтение и запись SQLite занимают доли миллисекунды и выполняются прямо в цикле событий.
+    """
+
+    async def create(self, response_model=None, **kwargs):
+        if response_model is None:
+            return await self._client.chat.completions.create(**kwargs)
+
+        key = self.cache.make_key(self.model, response_model, kwargs)
+        cached = self.cache.get(key, response_model)
+        if cached is not None:
+            return cached
+
+        response = await self._client.chat.completions.create(response_model=response_model, **kwargs)
+        self.cache.put(key, self.model, response_model, response)
+        return response
+
+
+def print_llm_cache_stats(cache: LLMResponseCache):
+    """Печатает статистику кэша ответов LLM"""
+    s = cache.stats()
+    print(f"   💾 Кэш ответов LLM: попаданий {s['hits']}, промахов {s['misses']} "
+          f"({s['hit_rate']:.0%}), записей {s['entries']}, {s['size_mb']:.1f} МБ")
@@ -27,17 +27,41 @@ class ExtractedKnowledge(BaseModel):
     paper_id: str
     concepts: List[ScientificConcept]
 
-class Critique(BaseModel):
-    """Критика направления исследования от агента-критика"""
+class ExtractedKnowledgeBatch(BaseModel):
+    """Знания из нескольких статей, извлеченные одним запросом (по одному элементу на статью)"""
+    papers: List[ExtractedKnowledge] = Field(..., description="One entry per input paper, paper_id copied exactly from the input")
+
+class CritiqueScores(BaseModel):
+    """Ответ агента-критика: сырые оценки и текст (итог считается локально, см. analysis/scoring.py)"""
     is_interesting: bool = Field(..., description="Проходит ли направление базовую проверку интереса?")
     novelty_score: float = Field(..., description="Оценка новизны 0-10. 10 - новая парадигма")
     impact_score: float = Field(..., description="Оценка влияния 0-10. 10 - Нобелевская премия") 
     feasibility_score: float = Field(..., description="Оценка выполнимости 0-10. 10 - можно сделать за год")
-    final_score: float = Field(..., description="Итоговая оценка (0.5*impact + 0.3*novelty + 0.2*feasibility)")
     strengths: List[str] = Field(..., description="Сильные стороны направления")
     weaknesses: List[str] = Field(..., description="Слабые стороны и риски")
+
+class Critique(CritiqueScores):
+    """Критика направления исследования с итоговой оценкой и рекомендацией"""
+    final_score: float = Field(..., description="Итоговая оценка (0.5*impact + 0.3*novelty + 0.2*feasibility)")
     recommendation: Literal["Strongly Recommend", "Consider", "Reject"]
 
+class DirectionCritique(CritiqueScores):
+    """Критика одного направления из пачки (direction_id - идентификатор из запроса)"""
+    direction_id: str = Field(..., description="ID of the evaluated direction, copied exactly from the input")
+
+class CritiqueBatch(BaseModel):
+    """Критика нескольких направлений, полученная одним запросом"""
+    critiques: List[DirectionCritique] = Field(..., description="One entry per input direction")
+
+class TriageScore(BaseModel):
+    """Быстрая предварительная оценка направления (до полного критика)"""
+    direction_id: str = Field(..., description="ID of the direction, copied exactly from the input")
+    promise_score: float = Field(..., description="Expected final score of a full expert review, 0-10")
+
+class TriageBatch(BaseModel):
+    """Предварительные оценки нескольких направлений одним запросом"""
+    scores: List[TriageScore] = Field(..., description="One entry per input direction")
+
 class PrioritizedDirection(BaseModel):
     """Приоритизированное направление исследования"""
     rank: int
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Адаптивное ограничение скорости вызовов Gemini
+Token bucket по RPM/TPM модели + AIMD-регулятор параллелизма + повторы с джиттером
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from .async_runtime import get_runtime
+
+# Признаки перегрузки API: лимит запросов/токенов или временная недоступность модели
+THROTTLE_CODES = (429, 503)
+THROTTLE_MARKERS = ('429', 'RESOURCE_EXHAUSTED', 'rate limit', 'quota', '503', 'UNAVAILABLE', 'overloaded')
+_RETRY_DELAY = re.compile(r"retry_?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Проверяет, вызвана ли ошибка перегрузкой API (в т.ч. обернутая instructor)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if getattr(error, 'code', None) in THROTTLE_CODES or getattr(error, 'status_code', None) in THROTTLE_CODES:
+            return True
+        message = str(error)
+        if any(marker.lower() in message.lower() for marker in THROTTLE_MARKERS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _suggested_delay(error: Exception):
+    """Задержка из ответа сервера (Gemini присылает retryDelay в деталях ошибки 429)"""
+    match = _RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def estimate_tokens(payload) -> int:
+    """
+    Грубая оценка числа токенов запроса (~4 символа на токен)
+
+    Понимает строки, байты (inline PDF), словари, списки и pydantic-объекты google-genai
+    """
+    if payload is None or isinstance(payload, type):
+        return 0
+    if isinstance(payload, str):
+        return len(payload) // 4
+    if isinstance(payload, (bytes, bytearray)):
+        # Gemini считает ~258 токенов на страницу PDF, страница в среднем ~50 КБ
+        return len(payload) // 200
+    if isinstance(payload, dict):
+        return sum(estimate_tokens(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(estimate_tokens(item) for item in payload)
+    if hasattr(payload, 'model_dump'):
+        return sum(estimate_tokens(value) for value in vars(payload).values())
+    return 0
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate единиц в минуту, запас не больше capacity"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, amount: float) -> float:
+        """Забирает amount единиц, если они есть; иначе возвращает время ожидания пополнения"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount: float = 1.0):
+        """Забирает amount единиц, при нехватке ждет пополнения"""
+        while (wait := self._take(amount)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1.0):
+        """То же, что acquire, но ожидание не блокирует цикл событий"""
+        while (wait := self._take(amount)) > 0:
+            await asyncio.sleep(wait)
+
+
+class AIMDController:
+    """
+    Регулятор параллелизма по схеме AIMD (как управление окном в TCP)
+
+    Каждый успешный вызов увеличивает лимит на 1/limit (т.е. +1 за "окно"),
+    ответ 429 уменьшает его в decrease_factor раз - не чаще раза в cooldown секунд,
+    чтобы пачка одновременных отказов не обрушила лимит до минимума.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.5, cooldown: float = 2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        # Корутины, ждущие слот: (цикл событий, future), будятся при каждом освобождении
+        self._async_waiters = []
+
+    def acquire(self):
+        """Занимает слот, ждет пока число активных вызовов не опустится ниже лимита"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """То же, что acquire, для корутин: ожидание не занимает поток"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, throttled: bool = False):
+        """Освобождает слот и корректирует лимит по результату вызова"""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # release может прийти из другого потока - будим корутины через их цикл
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ThroughputMeter:
+    """Скользящее окно для живой метрики пропускной способности"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.succeeded = 0
+        self.throttled = 0
+        self.failed = 0
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def record(self, tokens: int = 0, throttled: bool = False, failed: bool = False):
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            elif failed:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+                self._events.append((time.monotonic(), tokens))
+            self._trim()
+
+    def _trim(self):
+        horizon = time.monotonic() - self.window
+        while self._events and self._events[0][0] < horizon:
+            self._events.popleft()
+
+    def rate(self) -> tuple:
+        """Успешные запросы и токены в минуту за последнее окно"""
+        with self._lock:
+            self._trim()
+            scale = 60.0 / self.window
+            return len(self._events) * scale, sum(tokens for _, tokens in self._events) * scale
+
+
+class RateLimiter:
+    """
+    Лимиты одной модели: RPM, TPM, адаптивный параллелизм и повторы при 429
+
+    Один экземпляр на модель разделяется всеми потоками пайплайна
+    (извлечение, синтез, критика), поэтому общий бюджет не превышается.
+    """
+
+    def __init__(self, name: str, rpm: int = 1000, tpm: int = 1_000_000, max_concurrency: int = 32,
+                 initial_concurrency: int = 8, max_retries: int = 6, base_delay: float = 1.0,
+                 max_delay: float = 60.0, output_tokens: int = 2048):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AIMDController(min(initial_concurrency, max_concurrency), max_limit=max_concurrency)
+        self.meter = ThroughputMeter()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_tokens = output_tokens
+
+    def _after_error(self, error: Exception, attempt: int, throttled: bool):
+        """Учитывает неудачный вызов; возвращает паузу перед повтором или None, если повторять нельзя"""
+        self.meter.record(throttled=throttled, failed=not throttled)
+        if not throttled or attempt == self.max_retries:
+            return None
+        # Full jitter: случайная пауза до экспоненциально растущей границы
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _suggested_delay(error) or 0)
+
+    def call(self, func, *args, **kwargs):
+        """Вызывает func с соблюдением лимитов; при перегрузке API повторяет с джиттером"""
+        estimated = estimate_tokens((args, kwargs)) + self.output_tokens
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire()
+            self.tokens.acquire(estimated)
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                delay = self._after_error(e, attempt, throttled)
+                if delay is None:
+                    raise
+            else:
+                self.meter.record(tokens=estimated)
+                return result
+            finally:
+                # Слот освобождается при любом исходе, в том числе KeyboardInterrupt
+                self.concurrency.release(throttled=throttled)
+            time.sleep(delay)
+
+    async def acall(self, func, *args, **kwargs):
+        """
+        Асинхронный вариант call для корутинных функций (client.aio, AsyncInstructor)
+
+        Лимиты модели общие с синхронными вызовами. Слот глобального семафора
+        запросов в полете занимается только после допуска по лимиту параллелизма
+        модели: ожидающие своей модели запросы не отнимают слоты у других этапов.
+        """
+        estimated = estimate_tokens((args, kwargs)) + self.output_tokens
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire_async()
+            await self.tokens.acquire_async(estimated)
+            await self.concurrency.acquire_async()
+            throttled = False
+            try:
+                async with get_runtime().slot():
+                    result = await func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                delay = self._after_error(e, attempt, throttled)
+                if delay is None:
+                    raise
+            else:
+                self.meter.record(tokens=estimated)
+                return result
+            finally:
+                # Слот модели освобождается при любом исходе, в том числе при отмене
+                self.concurrency.release(throttled=throttled)
+            # Пауза перед повтором - уже без слотов, чтобы не держать их впустую
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        requests_per_minute, tokens_per_minute = self.meter.rate()
+        return {
+            'model': self.name,
+            'rpm': round(requests_per_minute),
+            'tpm': round(tokens_per_minute),
+            'concurrency': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'succeeded': self.meter.succeeded,
+            'throttled': self.meter.throttled,
+            'failed': self.meter.failed,
+        }
+
+
+class RateLimitedClient:
+    """
+    Обертка instructor-клиента: client.chat.completions.create проходит через RateLimiter
+
+    Остальные атрибуты проксируются к исходному клиенту без изменений.
+    """
+
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.chat = self
+        self.completions = self
+
+    def create(self, *args, **kwargs):
+        return self.limiter.call(self._client.chat.completions.create, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """Обертка асинхронного instructor-клиента: await client.chat.completions.create(...)"""
+
+    async def create(self, *args, **kwargs):
+        return await self.limiter.acall(self._client.chat.completions.create, *args, **kwargs)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_rate_limits(model_limits: dict):
+    """Задает бюджеты моделей: {model: {'rpm': ..., 'tpm': ..., 'max_concurrency': ...}}"""
+    with _limiters_lock:
+        for model, limits in model_limits.items():
+            _limiters[model] = RateLimiter(model, **limits)
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Общий лимитер модели (создается с лимитами по умолчанию, если модель не настроена)"""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(model)
+        return _limiters[model]
+
+
+def throughput_summary() -> str:
+    """Короткая строка с живой метрикой по всем моделям (для tqdm и логов)"""
+    parts = []
+    for limiter in list(_limiters.values()):
+        s = limiter.stats()
+        if s['succeeded'] or s['throttled'] or s['failed']:
+            parts.append(f"{s['model']}: {s['rpm']} rpm, {s['tpm'] // 1000}k tpm, "
+                         f"x{s['concurrency']}, 429: {s['throttled']}")
+    return "; ".join(parts)
+
+
+def track_throughput(progress):
+    """Обновляет подпись прогресс-бара tqdm живой метрикой API на каждой итерации"""
+    for item in progress:
+        progress.set_postfix_str(throughput_summary(), refresh=False)
+        yield item
+
+
+def print_rate_limit_stats():
+    """Печатает итоговую статистику вызовов API по моделям"""
+    for limiter in list(_limiters.values()):
+        s = limiter.stats()
+        if not (s['succeeded'] or s['throttled'] or s['failed']):
+            continue
+        print(f"   📡 {s['model']}: успешно {s['succeeded']}, 429/503 {s['throttled']}, ошибок {s['failed']}, "
+              f"текущий параллелизм {s['concurrency']}, {s['rpm']} запросов/мин")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал сборки графа знаний для возобновления после сбоя
+Каждая извлеченная статья дописывается строкой JSON, fsync выполняется пачками
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from core.models import ExtractedKnowledge
+
+class BuildJournal:
+    """
+    Append-only журнал результатов извлечения (JSON Lines)
+
+    Запись: paper_id, year, text (первые 500 символов), content_hash, ExtractedKnowledge.
+    Диск синхронизируется раз в fsync_every записей или fsync_interval секунд,
+    поэтому при сбое теряется не больше одной пачки уже оплаченных вызовов API.
+    """
+
+    def __init__(self, path: str = "cache/build_journal.jsonl", fsync_every: int = 50, fsync_interval: float = 2.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def replay(self) -> dict:
+        """
+        Читает журнал прошлой сборки
+
+        Returns:
+            {paper_id: (text, year, ExtractedKnowledge, content_hash)}
+            Оборванная при сбое последняя строка пропускается
+        """
+        records = {}
+        if not self.path.exists():
+            return records
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    knowledge = ExtractedKnowledge.model_validate(record['knowledge'])
+                except Exception:
+                    continue
+                records[record['paper_id']] = (record.get('text', ''), record.get('year', 2024),
+                                               knowledge, record.get('content_hash'))
+        return records
+
+    def open(self, truncate: bool = False):
+        """Открывает журнал на дозапись (truncate=True начинает журнал заново)"""
+        self._file = open(self.path, 'w' if truncate else 'a', encoding='utf-8')
+        self._last_sync = time.monotonic()
+
+    def append(self, paper_id: str, text: str, year, knowledge: ExtractedKnowledge, content_hash: str = None):
+        """Дописывает результат извлечения одной статьи"""
+        record = {
+            'paper_id': paper_id,
+            'year': year,
+            'text': text[:500],
+            'content_hash': content_hash,
+            'knowledge': knowledge.model_dump(),
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def clear(self):
+        """Удаляет журнал после успешной сборки - следующая сборка не должна его воспроизводить"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self):
+        """Синхронизирует оставшиеся записи и закрывает файл"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+                self._file = None
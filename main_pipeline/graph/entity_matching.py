@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Локальные (без LLM) инструменты сопоставления имен сущностей
+Нормализованные ключи, аббревиатуры и сокращения, блокировка по похожести и union-find
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List
+
+# Греческие буквы в именах генов/белков пишут и символом, и словом: TNF-α == TNF-alpha
+GREEK_LETTERS = {
+    'α': 'alpha', 'β': 'beta', 'γ': 'gamma', 'δ': 'delta', 'ε': 'epsilon',
+    'ζ': 'zeta', 'η': 'eta', 'θ': 'theta', 'ι': 'iota', 'κ': 'kappa',
+    'λ': 'lambda', 'μ': 'mu', 'ν': 'nu', 'ξ': 'xi', 'ο': 'omicron',
+    'π': 'pi', 'ρ': 'rho', 'σ': 'sigma', 'ς': 'sigma', 'τ': 'tau',
+    'υ': 'upsilon', 'φ': 'phi', 'χ': 'chi', 'ψ': 'psi', 'ω': 'omega',
+}
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_TOKEN = re.compile(r'[a-z]+|[0-9]+')
+_DIGITS = re.compile(r'[0-9]+')
+# Служебные слова полного имени, которые сокращение может пропустить
+_STOPWORDS = frozenset({'of', 'the', 'and', 'in', 'for', 'to', 'with'})
+# Окончания множественного числа: 'apolipoproteins' ~ 'apolipoprotein', но не 'mitochondrial' ~ 'mitochondria'
+_PLURAL_SUFFIXES = frozenset({'s', 'es'})
+
+
+def _fold(name: str) -> str:
+    """Приводит строку к нижнему регистру, раскрывает греческие буквы"""
+    text = unicodedata.normalize('NFKC', name).casefold()
+    return ''.join(GREEK_LETTERS.get(ch, ch) for ch in text)
+
+
+def normalize_entity_key(name: str) -> str:
+    """
+    Нормализованный ключ имени: регистр, пунктуация, пробелы и греческие буквы не важны
+
+    'SIRT-1', 'Sirt1', 'sirt 1' -> 'sirt1';  'TNF-α' -> 'tnfalpha'
+    """
+    return _NON_ALNUM.sub('', _fold(name))
+
+
+def acronym_key(name: str) -> str:
+    """
+    Аббревиатура многословного имени: первые буквы слов + числа целиком
+
+    'Glucagon-like peptide-1 receptor' -> 'glp1r'. Для однословных имен - пустая строка.
+    """
+    tokens = _TOKEN.findall(_fold(name))
+    if len(tokens) < 2:
+        return ''
+    return ''.join(token if token.isdigit() else token[0] for token in tokens)
+
+
+def abbreviation_tokens(name: str) -> tuple:
+    """Слова имени для is_abbreviation (регистр и греческие буквы приведены)"""
+    return tuple(_TOKEN.findall(_fold(name)))
+
+
+def is_abbreviation(short_key: str, long_tokens: tuple) -> bool:
+    """
+    Является ли ключ short_key сокращением многословного имени (см. abbreviation_tokens)
+
+    Сокращение - склейка фрагментов всех слов по порядку: фрагмент начинается с первой
+    буквы слова, остальные его буквы идут в слове по порядку (inter-Leukin -> 'il');
+    служебные слова можно пропустить, числа берутся целиком:
+    'sirt1' ~ 'sirtuin 1', 'il6' ~ 'interleukin-6', 'mtor' ~ 'mechanistic target of rapamycin'
+    """
+    if len(long_tokens) < 2 or len(short_key) >= sum(len(token) for token in long_tokens):
+        return False
+    # Позиции в ключе, до которых он покрыт уже разобранными словами
+    positions = {0}
+    for token in long_tokens:
+        reached = set(positions) if token in _STOPWORDS else set()
+        for pos in positions:
+            if token.isdigit():
+                if short_key.startswith(token, pos):
+                    reached.add(pos + len(token))
+            elif pos < len(short_key) and short_key[pos] == token[0]:
+                # Самый длинный фрагмент ключа, который укладывается в слово по порядку
+                end, i = pos + 1, 1
+                while end < len(short_key):
+                    i = token.find(short_key[end], i) + 1
+                    if i == 0:
+                        break
+                    end += 1
+                reached.update(range(pos + 1, end + 1))
+        if not reached:
+            return False
+        positions = reached
+    return len(short_key) in positions
+
+
+def _same_word_forms(tokens: tuple, other_tokens: tuple) -> bool:
+    """
+    Слова попарно не являются разными производными одного корня
+
+    Если одно слово продолжает другое, разница допустима только в окончании множественного
+    числа: 'proteins' ~ 'protein', но 'mitochondrial' (прилагательное) !~ 'mitochondria'
+    """
+    for token, other in zip(tokens, other_tokens):
+        short, long = sorted((token, other), key=len)
+        if short != long and long.startswith(short) and long[len(short):] not in _PLURAL_SUFFIXES:
+            return False
+    return True
+
+
+def _abbreviation_signature(key: str) -> tuple:
+    """Первая буква и числа ключа - у сокращения и полного имени они совпадают"""
+    return key[0], tuple(_DIGITS.findall(key))
+
+
+class UnionFind:
+    """Система непересекающихся множеств для объединения групп синонимов"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def add(self, item):
+        self.parent.setdefault(item, item)
+
+    def find(self, item):
+        self.add(item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Сжатие путей
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+    def groups(self) -> List[List]:
+        """Возвращает все множества в виде списков"""
+        result = defaultdict(list)
+        for item in self.parent:
+            result[self.find(item)].append(item)
+        return list(result.values())
+
+
+def group_by_key(names: List[str]) -> Dict[str, List[str]]:
+    """Группирует имена по нормализованному ключу (безопасное локальное объединение)"""
+    groups = defaultdict(list)
+    for name in names:
+        groups[normalize_entity_key(name) or name].append(name)
+    return dict(groups)
+
+
+def _link_similar_keys(keys: List[str], similarity_threshold: float, window: int) -> UnionFind:
+    """
+    Объединяет похожие ключи без сравнения всех пар (sorted neighborhood):
+    каждый ключ сравнивается только с window соседями в отсортированном списке
+    """
+    uf = UnionFind()
+    for key in keys:
+        uf.add(key)
+
+    sorted_keys = sorted(keys)
+    for i, key in enumerate(sorted_keys):
+        for other in sorted_keys[i + 1:i + 1 + window]:
+            if SequenceMatcher(None, key, other).ratio() >= similarity_threshold:
+                uf.union(key, other)
+    return uf
+
+
+def candidate_clusters(names: List[str], similarity_threshold: float = 0.75, window: int = 5) -> List[List[str]]:
+    """
+    Кластеры-кандидаты в синонимы по исходным именам
+
+    Имена с одинаковым ключом всегда в одном кластере. Кластеры из одного
+    ключа не возвращаются - их объединение безопасно сделать локально.
+    """
+    key_groups = group_by_key(names)
+    uf = _link_similar_keys(list(key_groups), similarity_threshold, window)
+
+    # Многословное имя и его аббревиатура: 'Glucagon-like peptide-1 receptor' ~ 'GLP1R'
+    for key, members in key_groups.items():
+        for name in members:
+            acronym = acronym_key(name)
+            if acronym and acronym != key and acronym in key_groups:
+                uf.union(key, acronym)
+
+    clusters = []
+    for key_cluster in uf.groups():
+        if len(key_cluster) > 1:
+            clusters.append([name for key in key_cluster for name in key_groups[key]])
+    return clusters
+
+
+class AliasMatcher:
+    """
+    Офлайн-сопоставление незнакомых имен с известными алиасами (без сетевых вызовов)
+
+    1. Точное совпадение нормализованного ключа: 'Sirt-1' -> 'SIRT1'
+    2. Сокращение и полное имя (см. is_abbreviation) в обе стороны:
+       'sirtuin 1' -> 'SIRT1', 'IL6' -> алиас 'interleukin 6'; при нескольких
+       разных канонических кандидатах совпадение не засчитывается
+    3. Ближайший сосед по символьным триграммам ключа (коэффициент Дайса) с порогом
+       уверенности; числа в именах обязаны совпадать, чтобы не путать IL-6 и IL-8.
+       Сравниваются только имена с одинаковым числом слов (многословное имя не сводится
+       к сокращению или одному слову: 'Calorie-restriction mimetic' !~ 'CR'), близкой длины
+       (min_length_ratio) и без производных форм одного слова ('mitochondrial' !~ 'Mitochondria')
+    Результаты запоминаются в LRU-кэше.
+    """
+
+    def __init__(self, reverse_map: Dict[str, str] = None, threshold: float = 0.75,
+                 min_key_length: int = 4, min_abbreviation_length: int = 3, min_length_ratio: float = 0.8,
+                 cache_size: int = 100_000):
+        self.threshold = threshold
+        self.min_key_length = min_key_length
+        self.min_length_ratio = min_length_ratio
+        self.min_abbreviation_length = min_abbreviation_length
+        self._key_to_canonical = {}
+        self._short_index = defaultdict(list)  # сигнатура -> ключи, которые могут быть сокращениями
+        self._long_index = defaultdict(list)   # сигнатура -> (ключ, слова) многословных алиасов
+        self._keys = []
+        self._key_trigrams = []
+        self._key_tokens = []
+        self._trigram_index = defaultdict(list)
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+        for alias, canonical in (reverse_map or {}).items():
+            self.add(alias, canonical)
+
+    @staticmethod
+    def _trigrams(key: str) -> set:
+        padded = f"#{key}#"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, alias: str, canonical: str):
+        """Добавляет алиас в индексы"""
+        key = normalize_entity_key(alias)
+        if not key or key in self._key_to_canonical:
+            return
+        self._key_to_canonical[key] = canonical
+        signature = _abbreviation_signature(key)
+        if len(key) >= self.min_abbreviation_length:
+            self._short_index[signature].append(key)
+        tokens = abbreviation_tokens(alias)
+        if len(tokens) >= 2:
+            self._long_index[signature].append((key, tokens))
+        if len(key) >= self.min_key_length:
+            key_id = len(self._keys)
+            trigrams = self._trigrams(key)
+            self._keys.append(key)
+            self._key_trigrams.append(len(trigrams))
+            self._key_tokens.append(tokens)
+            for trigram in trigrams:
+                self._trigram_index[trigram].append(key_id)
+        # Новые алиасы могут изменить ответы на уже закэшированные запросы
+        self.match.cache_clear()
+
+    def _match(self, name: str):
+        """Возвращает каноническое имя или None, если уверенного совпадения нет"""
+        key = normalize_entity_key(name)
+        if not key:
+            return None
+
+        canonical = self._key_to_canonical.get(key)
+        if canonical is not None:
+            return canonical
+
+        canonical = self._match_abbreviation(name, key)
+        if canonical is not None or len(key) < self.min_key_length:
+            return canonical
+
+        # Считаем общие триграммы только с кандидатами из инвертированного индекса
+        query_trigrams = self._trigrams(key)
+        overlaps = defaultdict(int)
+        for trigram in query_trigrams:
+            for key_id in self._trigram_index.get(trigram, ()):
+                overlaps[key_id] += 1
+
+        query_digits = _DIGITS.findall(key)
+        query_tokens = abbreviation_tokens(name)
+        best_score, best_key = 0.0, None
+        for key_id, overlap in overlaps.items():
+            score = 2 * overlap / (len(query_trigrams) + self._key_trigrams[key_id])
+            if score > best_score and self._comparable(key, query_tokens, key_id) \
+                    and _DIGITS.findall(self._keys[key_id]) == query_digits:
+                best_score, best_key = score, self._keys[key_id]
+
+        if best_key is not None and best_score >= self.threshold:
+            return self._key_to_canonical[best_key]
+        return None
+
+    def _comparable(self, key: str, tokens: tuple, key_id: int) -> bool:
+        """Можно ли сравнивать ключ запроса с алиасом key_id по триграммам (см. пункт 3)"""
+        alias_key, alias_tokens = self._keys[key_id], self._key_tokens[key_id]
+        return (len(tokens) == len(alias_tokens)
+                and min(len(key), len(alias_key)) >= self.min_length_ratio * max(len(key), len(alias_key))
+                and _same_word_forms(tokens, alias_tokens))
+
+    def _match_abbreviation(self, name: str, key: str):
+        """Единственное каноническое имя, чей алиас - сокращение name или его полное имя"""
+        signature = _abbreviation_signature(key)
+        found = set()
+        tokens = abbreviation_tokens(name)
+        if len(tokens) >= 2:
+            found.update(self._key_to_canonical[alias_key] for alias_key in self._short_index.get(signature, ())
+                         if is_abbreviation(alias_key, tokens))
+        if len(key) >= self.min_abbreviation_length:
+            found.update(self._key_to_canonical[alias_key] for alias_key, alias_tokens in self._long_index.get(signature, ())
+                         if is_abbreviation(key, alias_tokens))
+        return found.pop() if len(found) == 1 else None
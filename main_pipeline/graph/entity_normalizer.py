@@ -5,21 +5,35 @@
 """
 
 import json
+import concurrent.futures
+from difflib import get_close_matches
 from typing import Dict, List, Set
 from google import genai
 
+from core.rate_limiter import get_rate_limiter
+from .entity_matching import UnionFind, AliasMatcher, group_by_key, candidate_clusters, normalize_entity_key
+
 class EntityNormalizer:
     """
     Агент-нормализатор для группировки синонимов биологических сущностей
     Простой класс без сложных конструкций
     """
     
-    def __init__(self):
+    def __init__(self, fuzzy_threshold: float = 0.75):
         """Инициализация нормализатора"""
         self.normalization_map = {}
         self.reverse_map = {}  # Для быстрого поиска канонического имени
+        self.fuzzy_threshold = fuzzy_threshold
+        self._alias_matcher = None  # Офлайн-сопоставление незнакомых имен (строится лениво)
         self._google_client = None  # Ленивая инициализация
     
+    @property
+    def alias_matcher(self) -> AliasMatcher:
+        """Ленивая сборка индексов офлайн-сопоставления по текущему мапингу"""
+        if self._alias_matcher is None:
+            self._alias_matcher = AliasMatcher(self.reverse_map, threshold=self.fuzzy_threshold)
+        return self._alias_matcher
+    
     @property
     def google_client(self):
         """Ленивая инициализация Google клиента"""
@@ -54,18 +68,16 @@ class EntityNormalizer:
         
         return unique_entities
     
-    def normalize_entities(self, entity_names: List[str]) -> Dict[str, List[str]]:
+    def _llm_group_entities(self, entity_names: List[str]) -> List[dict]:
         """
-        Нормализует список сущностей с помощью LLM
+        Один вызов LLM: группирует переданные имена по каноническим названиям
         
         Args:
-            entity_names: Список имен сущностей для нормализации
+            entity_names: Список имен сущностей (ограниченного размера)
             
         Returns:
-            Словарь канонических имен и их синонимов
+            Список {"canonical_name": ..., "aliases": [...]}
         """
-        print("🤖 Запускаю агента-нормализатора...")
-        
         # Prompt for entity normalizer agent
         prompt = """# ROLE
 You are a world-class bioinformatics expert specializing in biological entity normalization and ontologies. Your task is to analyze a list of terms extracted from a corpus of longevity research papers and group them by canonical (commonly accepted) names.
@@ -93,77 +105,253 @@ Your response MUST be a JSON array of objects with canonical names and their ali
 3. Include the canonical name in the aliases list
 4. Do not invent new groups - work only with the given entities"""
 
-        try:
-            # Подготавливаем данные для LLM
-            entity_list_json = json.dumps(entity_names, ensure_ascii=False, indent=2)
-            
-            # Вызываем LLM с структурированным выводом (нативный Google API)
-            response = self.google_client.models.generate_content(
-                # model="gemini-2.5-flash"
-                model="gemini-2.5-flash",
-                contents=prompt.format(entity_list=entity_list_json),
-                config={
-                    "response_mime_type": "application/json",
-                    "response_schema": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "canonical_name": {"type": "string"},
-                                "aliases": {
-                                    "type": "array",
-                                    "items": {"type": "string"}
-                                }
-                            },
-                            "required": ["canonical_name", "aliases"]
-                        }
+        # Подготавливаем данные для LLM
+        entity_list_json = json.dumps(entity_names, ensure_ascii=False, indent=2)
+        
+        # Вызываем LLM с структурированным выводом (нативный Google API)
+        response = get_rate_limiter("gemini-2.5-flash").call(
+            self.google_client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=prompt.format(entity_list=entity_list_json),
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "canonical_name": {"type": "string"},
+                            "aliases": {
+                                "type": "array",
+                                "items": {"type": "string"}
+                            }
+                        },
+                        "required": ["canonical_name", "aliases"]
                     }
                 }
-            )
-            
-            # Парсим JSON ответ и конвертируем в словарь
-            entities_array = json.loads(response.text)
-            normalization_map = {}
-            for item in entities_array:
-                canonical = item["canonical_name"]
-                aliases = item["aliases"]
-                normalization_map[canonical] = aliases
-            
-            print(f"   ✅ Агент создал {len(normalization_map)} канонических групп")
-            
-            # Создаем обратный словарь для быстрого поиска
-            reverse_map = {}
-            for canonical_name, aliases in normalization_map.items():
-                for alias in aliases:
-                    reverse_map[alias] = canonical_name
-            
-            self.normalization_map = normalization_map
-            self.reverse_map = reverse_map
+            }
+        )
+        return json.loads(response.text)
+    
+    def _make_batches(self, clusters: List[List[str]], batch_size: int) -> List[List[str]]:
+        """Упаковывает кластеры-кандидаты в батчи не больше batch_size имен, не разрывая кластеры"""
+        batches = []
+        current = []
+        for cluster in sorted(clusters, key=len, reverse=True):
+            # Слишком большой кластер режем на части - LLM все равно не вместит его целиком
+            for i in range(0, len(cluster), batch_size):
+                part = cluster[i:i + batch_size]
+                if current and len(current) + len(part) > batch_size:
+                    batches.append(current)
+                    current = []
+                current.extend(part)
+        if current:
+            batches.append(current)
+        # Одно имя группировать не с чем
+        return [batch for batch in batches if len(batch) > 1]
+    
+    @staticmethod
+    def _pick_canonical(aliases: List[str]) -> str:
+        """Каноническое имя группы без подсказки LLM: самое короткое, при равенстве - в верхнем регистре"""
+        return min(aliases, key=lambda name: (len(name), name))
+    
+    def normalize_entities(self, entity_names: List[str], batch_size: int = 150, max_workers: int = 8,
+                           similarity_threshold: float = 0.75) -> Dict[str, List[str]]:
+        """
+        Нормализует список сущностей: локальная предгруппировка + LLM только для кандидатов
+        
+        1. Имена с одинаковым нормализованным ключом (регистр, пунктуация, греческие буквы)
+           объединяются локально, без LLM
+        2. Похожие ключи и пары "название - аббревиатура" образуют кластеры-кандидаты,
+           которые отправляются в LLM параллельными батчами ограниченного размера
+        3. Частичные результаты сливаются через union-find
+        
+        Args:
+            entity_names: Список имен сущностей для нормализации
+            batch_size: Максимум имен в одном запросе к LLM
+            max_workers: Количество параллельных запросов к LLM
+            similarity_threshold: Порог похожести ключей для кластеров-кандидатов
             
-            return normalization_map
+        Returns:
+            Словарь канонических имен и их синонимов
+        """
+        print("🤖 Запускаю агента-нормализатора...")
+        
+        uf = UnionFind()
+        for name in entity_names:
+            uf.add(name)
+        
+        # 1. Безопасная локальная группировка по нормализованному ключу
+        for members in group_by_key(entity_names).values():
+            for other in members[1:]:
+                uf.union(members[0], other)
+        
+        # 2. Кластеры-кандидаты для LLM. Небольшой словарь целиком помещается в один
+        #    запрос - тогда LLM видит все имена и находит даже непохожие синонимы (RSV -> Resveratrol)
+        if len(entity_names) <= batch_size:
+            batches = [list(entity_names)] if len(entity_names) > 1 else []
+            print(f"   📦 Словарь помещается в один запрос ({len(entity_names)} сущностей)")
+        else:
+            clusters = candidate_clusters(entity_names, similarity_threshold)
+            batches = self._make_batches(clusters, batch_size)
+            print(f"   📦 Кластеров-кандидатов: {len(clusters)}, запросов к LLM: {len(batches)} "
+                  f"(из {len(entity_names)} сущностей)")
+        
+        known_names = set(entity_names)
+        llm_canonical = {}  # имя -> каноническое имя, предложенное LLM
+        failed_batches = 0
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_batch = {executor.submit(self._llm_group_entities, batch): batch for batch in batches}
+            for future in concurrent.futures.as_completed(future_to_batch):
+                try:
+                    groups = future.result()
+                except Exception as e:
+                    # Ошибка одного батча не сбрасывает нормализацию остальных
+                    failed_batches += 1
+                    print(f"   ⚠️ Ошибка нормализации батча ({len(future_to_batch[future])} имен): {e}")
+                    continue
+                
+                # 3. Слияние ответа LLM с локальными группами
+                for item in groups:
+                    aliases = [alias for alias in item.get("aliases", []) if alias in known_names]
+                    if not aliases:
+                        continue
+                    for alias in aliases[1:]:
+                        uf.union(aliases[0], alias)
+                    for alias in aliases:
+                        llm_canonical[alias] = item["canonical_name"]
+        
+        normalization_map = {}
+        for aliases in uf.groups():
+            suggested = [llm_canonical[alias] for alias in aliases if alias in llm_canonical]
+            canonical = suggested[0] if suggested else self._pick_canonical(aliases)
+            normalization_map.setdefault(canonical, []).extend(aliases)
+        
+        if failed_batches:
+            print(f"   ⚠️ {failed_batches} батчей не обработано, для них использована только локальная группировка")
+        print(f"   ✅ Агент создал {len(normalization_map)} канонических групп")
+        
+        self._set_mapping(normalization_map)
+        return normalization_map
+    
+    def normalize_new_entities(self, entity_names: List[str], batch_size: int = 150, max_workers: int = 8) -> int:
+        """
+        Инкрементальная нормализация: разрешает только имена, которых еще нет в мапинге
+        
+        1. Новое имя, уверенно сопоставленное с известным алиасом офлайн (AliasMatcher),
+           сразу присоединяется к его группе
+        2. Остальные отправляются в LLM вместе с похожими существующими каноническими
+           именами: LLM либо присоединяет их к существующей группе, либо создает новую
+        
+        Args:
+            entity_names: Все имена сущностей из текущего набора документов
+            batch_size: Максимум имен в одном запросе к LLM
+            max_workers: Количество параллельных запросов к LLM
             
-        except Exception as e:
-            print(f"   ❌ Ошибка при нормализации: {e}")
-            print("   ⚠️ Использую исходные имена без нормализации")
+        Returns:
+            Количество добавленных в мапинг имен
+        """
+        unseen = sorted({name for name in entity_names if name not in self.reverse_map})
+        if not unseen:
+            print("   ✅ Новых сущностей нет, мапинг актуален")
+            return 0
+        
+        print(f"🤖 Нормализую {len(unseen)} новых сущностей (известно {len(self.reverse_map)})...")
+        
+        # 1. Локальное сопоставление с известными алиасами (ключ, сокращения, затем триграммы)
+        assignments = {}
+        pending = []
+        for name in unseen:
+            canonical = self.alias_matcher.match(name)
+            if canonical:
+                assignments[name] = canonical
+            else:
+                pending.append(name)
+        print(f"   🧹 Локально сопоставлено: {len(assignments)}, требуют LLM: {len(pending)}")
+        
+        # 2. LLM: новые имена + похожие существующие канонические имена
+        if pending:
+            canonical_by_key = {normalize_entity_key(canonical): canonical 
+                                for canonical in self.normalization_map}
+            canonical_keys = list(canonical_by_key)
+            new_per_batch = max(1, batch_size // 2)
             
-            # Fallback: каждая сущность сама себе канонический вариант
-            fallback_map = {name: [name] for name in entity_names}
-            self.normalization_map = fallback_map
-            self.reverse_map = {name: name for name in entity_names}
+            batches = []
+            for i in range(0, len(pending), new_per_batch):
+                new_names = pending[i:i + new_per_batch]
+                candidates = []
+                for name in new_names:
+                    for key in get_close_matches(normalize_entity_key(name), canonical_keys, n=3, cutoff=0.6):
+                        if canonical_by_key[key] not in candidates:
+                            candidates.append(canonical_by_key[key])
+                batches.append((new_names, candidates[:batch_size - len(new_names)]))
             
-            return fallback_map
+            pending_set = set(pending)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_batch = {
+                    executor.submit(self._llm_group_entities, new_names + candidates): new_names
+                    for new_names, candidates in batches if len(new_names) + len(candidates) > 1
+                }
+                for future in concurrent.futures.as_completed(future_to_batch):
+                    try:
+                        groups = future.result()
+                    except Exception as e:
+                        print(f"   ⚠️ Ошибка нормализации батча новых сущностей: {e}")
+                        continue
+                    
+                    for item in groups:
+                        aliases = item.get("aliases", [])
+                        new_aliases = [alias for alias in aliases if alias in pending_set]
+                        existing = [alias for alias in aliases if alias in self.normalization_map]
+                        if not new_aliases:
+                            continue
+                        # Присоединяем к существующей группе, иначе создаем новую
+                        target = existing[0] if existing else item["canonical_name"]
+                        for alias in new_aliases:
+                            assignments.setdefault(alias, target)
+        
+        # Имена, которые LLM не сгруппировал (или батч упал), становятся своими группами
+        for name in unseen:
+            canonical = assignments.get(name, name)
+            self.normalization_map.setdefault(canonical, [])
+            if name not in self.normalization_map[canonical]:
+                self.normalization_map[canonical].append(name)
+            self.reverse_map[name] = canonical
+            if self._alias_matcher is not None:
+                self._alias_matcher.add(name, canonical)
+        
+        print(f"   ✅ Добавлено {len(unseen)} сущностей, канонических групп: {len(self.normalization_map)}")
+        return len(unseen)
+    
+    def _set_mapping(self, normalization_map: Dict[str, List[str]]):
+        """Устанавливает мапинг и пересоздает обратный словарь для быстрого поиска"""
+        reverse_map = {}
+        for canonical_name, aliases in normalization_map.items():
+            for alias in aliases:
+                reverse_map[alias] = canonical_name
+        
+        self.normalization_map = normalization_map
+        self.reverse_map = reverse_map
+        self._alias_matcher = None
     
     def get_canonical_name(self, entity_name: str) -> str:
         """
         Получает каноническое имя для данной сущности
         
+        Имена, которых нет в мапинге, сопоставляются локально: по нормализованному
+        ключу, затем по триграммам с порогом уверенности (без обращения к LLM)
+        
         Args:
             entity_name: Имя сущности
             
         Returns:
             Каноническое имя сущности
         """
-        return self.reverse_map.get(entity_name, entity_name)
+        canonical = self.reverse_map.get(entity_name)
+        if canonical is not None:
+            return canonical
+        return self.alias_matcher.match(entity_name) or entity_name
     
     def save_mapping(self, file_path: str) -> bool:
         """
@@ -195,13 +383,7 @@ Your response MUST be a JSON array of objects with canonical names and their ali
         """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                self.normalization_map = json.load(f)
-            
-            # Пересоздаем обратный словарь
-            self.reverse_map = {}
-            for canonical_name, aliases in self.normalization_map.items():
-                for alias in aliases:
-                    self.reverse_map[alias] = canonical_name
+                self._set_mapping(json.load(f))
             
             return True
         except Exception as e:
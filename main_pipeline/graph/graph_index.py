@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Вторичные индексы графа знаний
+Позволяют находить узлы по типу, имени сущности и статье без полного обхода графа
+"""
+
+from collections import defaultdict
+
+# Типы концептов, которые привязаны к статье через атрибут paper_id
+CONCEPT_TYPES = ('Hypothesis', 'Method', 'Result', 'Conclusion')
+
+class GraphIndex:
+    """
+    Индексы поверх NetworkX графа:
+    - тип узла -> множество id узлов
+    - имя сущности -> множество id узлов Entity (одно имя бывает у разных типов сущностей)
+    - paper_id -> множество id концептов статьи
+
+    Синхронизируются через обертки add_node/remove_node в ScientificKnowledgeGraph
+    """
+
+    def __init__(self):
+        self.nodes_by_type = defaultdict(set)
+        self.entities_by_name = defaultdict(set)
+        self.concepts_by_paper = defaultdict(set)
+
+    def add_node(self, node_id, attrs: dict):
+        """Индексирует узел по его атрибутам"""
+        node_type = attrs.get('type')
+        if node_type:
+            self.nodes_by_type[node_type].add(node_id)
+        if node_type == 'Entity' and attrs.get('name'):
+            self.entities_by_name[attrs['name']].add(node_id)
+        if node_type in CONCEPT_TYPES and attrs.get('paper_id'):
+            self.concepts_by_paper[attrs['paper_id']].add(node_id)
+
+    def remove_node(self, node_id, attrs: dict):
+        """Убирает узел из индексов (attrs - атрибуты узла до удаления)"""
+        node_type = attrs.get('type')
+        if node_type:
+            self._discard(self.nodes_by_type, node_type, node_id)
+        if node_type == 'Entity' and attrs.get('name'):
+            self._discard(self.entities_by_name, attrs['name'], node_id)
+        if node_type in CONCEPT_TYPES and attrs.get('paper_id'):
+            self._discard(self.concepts_by_paper, attrs['paper_id'], node_id)
+
+    def rebuild(self, graph):
+        """Пересоздает индексы с нуля (после загрузки графа из файла)"""
+        self.nodes_by_type.clear()
+        self.entities_by_name.clear()
+        self.concepts_by_paper.clear()
+        for node_id, attrs in graph.nodes(data=True):
+            self.add_node(node_id, attrs)
+
+    @staticmethod
+    def _discard(index: dict, key, node_id):
+        """Удаляет id из множества и сам ключ, если множество опустело"""
+        node_ids = index.get(key)
+        if node_ids is not None:
+            node_ids.discard(node_id)
+            if not node_ids:
+                del index[key]
+
+
+def build_entity_mentions(graph) -> dict:
+    """
+    Строит инвертированный индекс упоминаний за один проход по рёбрам MENTIONS
+
+    Returns:
+        {имя сущности: {paper_id: [контексты упоминаний]}}
+        Статья попадает в индекс даже если у ребра нет контекста (список пустой)
+    """
+    mentions = defaultdict(lambda: defaultdict(list))
+    nodes = graph.nodes
+    for concept_id, entity_id, data in graph.edges(data=True):
+        if data.get('type') != 'MENTIONS':
+            continue
+        paper_id = nodes[concept_id].get('paper_id')
+        entity_name = nodes[entity_id].get('name')
+        if paper_id and entity_name:
+            contexts = mentions[entity_name][paper_id]
+            if data.get('context'):
+                contexts.append(data['context'])
+    return mentions
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Компактный бинарный снимок графа знаний
+Колоночные таблицы узлов и рёбер + таблица интернированных строк (msgpack)
+"""
+
+import gc
+from pathlib import Path
+
+import msgpack
+import networkx as nx
+
+SNAPSHOT_SUFFIX = ".lgs"
+SNAPSHOT_MAGIC = b"LGS1"
+SNAPSHOT_VERSION = 1
+# Единственный формат тела снимка - msgpack; снимки не исполняют код при чтении (в отличие от pickle)
+SNAPSHOT_CODEC = b"m"
+
+# Признак колонки: все значения - строки (хранятся индексами в таблице строк) или произвольные
+STRING_COLUMN = "s"
+VALUE_COLUMN = "v"
+
+
+class _StringTable:
+    """Таблица интернированных строк: каждая строка хранится один раз"""
+
+    def __init__(self):
+        self.strings = []
+        self._index = {}
+
+    def intern(self, value: str) -> int:
+        idx = self._index.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self._index[value] = idx
+            self.strings.append(value)
+        return idx
+
+
+def _encode_columns(rows, strings: _StringTable) -> list:
+    """
+    Превращает последовательность словарей атрибутов в разреженные колонки
+
+    Каждая колонка: [индекс имени атрибута, тип, индексы строк-владельцев, значения]
+    Строковые значения сразу заменяются индексами в таблице строк.
+    """
+    intern = strings.intern
+    columns = {}
+    for row_idx, attrs in enumerate(rows):
+        for key, value in attrs.items():
+            column = columns.get(key)
+            if column is None:
+                # [строковая ли колонка, индексы строк, значения, исходные значения]
+                column = columns[key] = [True, [], [], []]
+            column[1].append(row_idx)
+            column[3].append(value)
+            if column[0]:
+                if isinstance(value, str):
+                    column[2].append(intern(value))
+                else:
+                    column[0] = False
+
+    encoded = []
+    for key, (is_string, row_ids, interned, values) in columns.items():
+        if is_string:
+            encoded.append([intern(key), STRING_COLUMN, row_ids, interned])
+        else:
+            encoded.append([intern(key), VALUE_COLUMN, row_ids, values])
+    return encoded
+
+
+def _decode_columns(columns: list, row_count: int, strings: list) -> list:
+    """Обратное преобразование колонок в список словарей атрибутов"""
+    rows = [{} for _ in range(row_count)]
+    for key_idx, column_type, row_ids, values in columns:
+        key = strings[key_idx]
+        if column_type == STRING_COLUMN:
+            for row_idx, value_idx in zip(row_ids, values):
+                rows[row_idx][key] = strings[value_idx]
+        else:
+            for row_idx, value in zip(row_ids, values):
+                rows[row_idx][key] = value
+    return rows
+
+
+def save_graph_snapshot(graph: nx.DiGraph, filepath):
+    """
+    Сохраняет граф в бинарный снимок
+
+    Args:
+        graph: Граф NetworkX
+        filepath: Путь к файлу снимка (.lgs)
+    """
+    strings = _StringTable()
+
+    node_ids = []
+    node_attrs = []
+    for node_id, attrs in graph.nodes(data=True):
+        node_ids.append(node_id)
+        node_attrs.append(attrs)
+    node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    edge_src, edge_dst, edge_attrs = [], [], []
+    for u, neighbors in graph.adjacency():
+        u_idx = node_index[u]
+        for v, attrs in neighbors.items():
+            edge_src.append(u_idx)
+            edge_dst.append(node_index[v])
+            edge_attrs.append(attrs)
+
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "directed": graph.is_directed(),
+        "nodes": [strings.intern(str(node_id)) for node_id in node_ids],
+        "node_columns": _encode_columns(node_attrs, strings),
+        "edge_src": edge_src,
+        "edge_dst": edge_dst,
+        "edge_columns": _encode_columns(edge_attrs, strings),
+        "graph_attrs": dict(graph.graph),
+    }
+    payload["strings"] = strings.strings
+
+    filepath = Path(filepath)
+    with open(filepath, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + SNAPSHOT_CODEC)
+        f.write(msgpack.packb(payload, use_bin_type=True))
+
+
+def load_graph_snapshot(filepath) -> nx.DiGraph:
+    """
+    Загружает граф из бинарного снимка
+
+    Args:
+        filepath: Путь к файлу снимка (.lgs)
+
+    Returns:
+        Граф NetworkX
+    """
+    data = Path(filepath).read_bytes()
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{filepath} не является снимком графа")
+
+    codec = data[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 1]
+    body = data[len(SNAPSHOT_MAGIC) + 1:]
+    if codec == b"p":
+        raise ValueError(f"{filepath}: снимки в формате pickle больше не загружаются - "
+                         f"пересохраните граф из GraphML")
+    if codec != SNAPSHOT_CODEC:
+        raise ValueError(f"Неизвестный формат снимка: {codec!r}")
+    payload = msgpack.unpackb(body, raw=False, strict_map_key=False)
+
+    if payload.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {payload.get('version')}")
+
+    # Сборка создает сотни тысяч словарей - циклический GC здесь только тратит время
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        strings = payload["strings"]
+        node_ids = [strings[idx] for idx in payload["nodes"]]
+        node_attrs = _decode_columns(payload["node_columns"], len(node_ids), strings)
+        edge_attrs = _decode_columns(payload["edge_columns"], len(payload["edge_src"]), strings)
+
+        graph = nx.DiGraph() if payload.get("directed", True) else nx.Graph()
+        graph.graph.update(payload.get("graph_attrs") or {})
+        graph.add_nodes_from(zip(node_ids, node_attrs))
+        graph.add_edges_from(
+            (node_ids[src], node_ids[dst], attrs)
+            for src, dst, attrs in zip(payload["edge_src"], payload["edge_dst"], edge_attrs)
+        )
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return graph
@@ -4,33 +4,111 @@
 Простой класс для построения и управления графом знаний
 """
 
+import asyncio
+import hashlib
+import itertools
 import networkx as nx
 import matplotlib.pyplot as plt
 from pathlib import Path
 from tqdm import tqdm
 import concurrent.futures
 
-from core.models import ExtractedKnowledge
+from core.models import ExtractedKnowledge, ExtractedKnowledgeBatch
 from processing.pdf_processing import SimplePDFReader, CacheManager
-from config import llm_extractor_client
+from processing.chunking import CHARS_PER_TOKEN, split_into_chunks, merge_concepts
+from config import llm_extractor_aclient
+from core.rate_limiter import track_throughput
+from core.async_runtime import get_runtime, submit
 from .entity_normalizer import EntityNormalizer
+from .graph_snapshot import SNAPSHOT_SUFFIX, save_graph_snapshot, load_graph_snapshot
+from .graph_index import GraphIndex, build_entity_mentions
+from .build_journal import BuildJournal
+
+# Без фрагментации текст длиннее этого лимита обрезается (~50k токенов)
+MAX_PROMPT_CHARS = 200_000
+
+def concept_node_id(paper_id: str, concept_type: str, statement: str) -> str:
+    """ID узла концепта; одинаков во всех запусках (встроенный hash() строк случаен в каждом процессе)"""
+    digest = hashlib.sha1(statement.encode('utf-8')).hexdigest()[:16]
+    return f"{paper_id}_{concept_type}_{digest}"
 
 class ScientificKnowledgeGraph:
     """Граф знаний для научных статей"""
     
-    def __init__(self):
+    def __init__(self, pdf_extraction_mode: str = "single_pass", chunked_extraction: bool = True,
+                 chunk_tokens: int = 6000, chunk_workers: int = 4, batched_extraction: bool = True,
+                 batch_token_budget: int = 12000, batch_item_max_tokens: int = 1500, max_batch_size: int = 20):
+        """
+        Args:
+            pdf_extraction_mode: режим извлечения из PDF ("single_pass" или "two_pass")
+            chunked_extraction: делить длинные тексты на фрагменты по разделам вместо обрезки
+            chunk_tokens: бюджет токенов на фрагмент
+            chunk_workers: сколько фрагментов одной статьи извлекать параллельно
+            batched_extraction: упаковывать короткие тексты (аннотации) по несколько в один запрос
+            batch_token_budget: бюджет входных токенов на пачку
+            batch_item_max_tokens: тексты длиннее этого не упаковываются
+            max_batch_size: предел статей в пачке (ограничен размером ответа модели)
+        """
+        self.chunked_extraction = chunked_extraction
+        self.chunk_tokens = chunk_tokens
+        self.chunk_workers = chunk_workers
+        self.batched_extraction = batched_extraction
+        self.batch_token_budget = batch_token_budget
+        self.batch_item_max_tokens = batch_item_max_tokens
+        self.max_batch_size = max_batch_size
         self.graph = nx.DiGraph()
-        self.pdf_reader = SimplePDFReader()
+        self.index = GraphIndex()
+        self.pdf_reader = SimplePDFReader(extraction_mode=pdf_extraction_mode)
         self.cache = CacheManager()
         self.entity_normalizer = EntityNormalizer()
 
+    def add_node(self, node_id, **attrs):
+        """Добавляет (или обновляет) узел графа, поддерживая индексы"""
+        if self.graph.has_node(node_id):
+            self.index.remove_node(node_id, self.graph.nodes[node_id])
+        self.graph.add_node(node_id, **attrs)
+        self.index.add_node(node_id, self.graph.nodes[node_id])
+
+    def add_edge(self, u, v, **attrs):
+        """Добавляет ребро; отсутствующие концы создаются через add_node"""
+        for node_id in (u, v):
+            if not self.graph.has_node(node_id):
+                self.add_node(node_id)
+        self.graph.add_edge(u, v, **attrs)
+
+    def remove_nodes(self, node_ids):
+        """Удаляет узлы графа вместе с их записями в индексах"""
+        for node_id in node_ids:
+            if self.graph.has_node(node_id):
+                self.index.remove_node(node_id, self.graph.nodes[node_id])
+                self.graph.remove_node(node_id)
+
+    def nodes_of_type(self, node_type: str) -> list:
+        """Возвращает [(node_id, data)] узлов заданного типа через индекс"""
+        return [(node_id, self.graph.nodes[node_id]) for node_id in self.index.nodes_by_type.get(node_type, ())]
+
+    def concepts_of_paper(self, paper_id: str) -> list:
+        """Возвращает [(node_id, data)] концептов статьи через индекс"""
+        return [(node_id, self.graph.nodes[node_id]) for node_id in self.index.concepts_by_paper.get(paper_id, ())]
+
+    def entity_nodes_by_name(self, name: str) -> set:
+        """Возвращает id узлов Entity с данным (нормализованным) именем"""
+        return set(self.index.entities_by_name.get(name, ()))
+
+    def entity_mentions(self) -> dict:
+        """Инвертированный индекс {сущность: {paper_id: [контексты]}} за один проход по рёбрам"""
+        return build_entity_mentions(self.graph)
+
     def save_graph(self, filepath: str = "knowledge_graph.graphml"):
-        """Сохраняет граф в файл GraphML"""
+        """Сохраняет граф в файл: бинарный снимок (.lgs) или GraphML (остальные расширения)"""
         try:
             filepath = Path(filepath)
             filepath.parent.mkdir(parents=True, exist_ok=True)
             
-            nx.write_graphml(self.graph, filepath)
+            if filepath.suffix == SNAPSHOT_SUFFIX:
+                save_graph_snapshot(self.graph, filepath)
+            else:
+                nx.write_graphml(self.graph, filepath)
             print(f"💾 Граф сохранен в файл: {filepath}")
             return True
         except Exception as e:
@@ -38,14 +116,18 @@ class ScientificKnowledgeGraph:
             return False
 
     def load_graph(self, filepath: str = "knowledge_graph.graphml") -> bool:
-        """Загружает граф из файла GraphML"""
+        """Загружает граф из файла: бинарного снимка (.lgs) или GraphML"""
         try:
             filepath = Path(filepath)
             if not filepath.exists():
                 print(f"📁 Файл графа не найден: {filepath}")
                 return False
             
-            self.graph = nx.read_graphml(filepath)
+            if filepath.suffix == SNAPSHOT_SUFFIX:
+                self.graph = load_graph_snapshot(filepath)
+            else:
+                self.graph = nx.read_graphml(filepath)
+            self.index.rebuild(self.graph)
             print(f"✅ Граф загружен из файла: {filepath}")
             print(f"   📊 Узлов: {self.graph.number_of_nodes()}, Рёбер: {self.graph.number_of_edges()}")
             return True
@@ -58,22 +140,27 @@ class ScientificKnowledgeGraph:
         if not self.graph:
             return "Граф пуст"
         
+        nodes_by_type = self.index.nodes_by_type
         stats = {
             'nodes': self.graph.number_of_nodes(),
             'edges': self.graph.number_of_edges(),
-            'papers': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Paper']),
-            'hypotheses': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Hypothesis']),
-            'methods': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Method']),
-            'results': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Result']),
-            'conclusions': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Conclusion']),
-            'entities': len([n for n, d in self.graph.nodes(data=True) if d.get('type') == 'Entity'])
+            'papers': len(nodes_by_type.get('Paper', ())),
+            'hypotheses': len(nodes_by_type.get('Hypothesis', ())),
+            'methods': len(nodes_by_type.get('Method', ())),
+            'results': len(nodes_by_type.get('Result', ())),
+            'conclusions': len(nodes_by_type.get('Conclusion', ())),
+            'entities': len(nodes_by_type.get('Entity', ()))
         }
         return stats
 
-    def _extract_scientific_concepts(self, paper_id: str, text: str) -> ExtractedKnowledge:
+    async def _extract_scientific_concepts(self, paper_id: str, text: str) -> ExtractedKnowledge:
         """Извлекает научные концепты из текста статьи"""
-        # Ограничиваем текст если он слишком большой
-        text_for_prompt = text[:200000] + ("..." if len(text) > 80000 else "")
+        # Длинные статьи делим на фрагменты по разделам, чтобы ничего не обрезать
+        if self.chunked_extraction and len(text) > self.chunk_tokens * CHARS_PER_TOKEN:
+            return await self._extract_concepts_chunked(paper_id, text)
+        
+        # Ограничиваем текст если он слишком большой (тот же порог и для многоточия)
+        text_for_prompt = text[:MAX_PROMPT_CHARS] + ("..." if len(text) > MAX_PROMPT_CHARS else "")
         
         prompt_text = f"""
         You are an expert in scientific research methodology and bioinformatics.
@@ -99,7 +186,7 @@ class ScientificKnowledgeGraph:
         """
         
         try:
-            knowledge = llm_extractor_client.chat.completions.create(
+            knowledge = await llm_extractor_aclient.chat.completions.create(
                 messages=[{"role": "user", "content": prompt_text}],
                 response_model=ExtractedKnowledge
             )
@@ -109,21 +196,182 @@ class ScientificKnowledgeGraph:
             print(f"⚠️ Ошибка извлечения концептов для {paper_id}: {e}")
             return ExtractedKnowledge(paper_id=paper_id, concepts=[])
 
-    def _process_single_document(self, paper_id, doc_data):
+    async def _extract_concepts_chunked(self, paper_id: str, text: str) -> ExtractedKnowledge:
+        """
+        Извлекает концепты из фрагментов статьи параллельно и сливает их
+        
+        Фрагменты режутся по разделам в пределах chunk_tokens; каждый фрагмент получает
+        начало статьи (название/аннотация) как контекст. Дубликаты концептов убираются.
+        """
+        chunks = split_into_chunks(text, self.chunk_tokens)
+        paper_context = text[:1500]
+        # Не больше chunk_workers фрагментов одной статьи одновременно - остальные статьи не ждут
+        semaphore = asyncio.Semaphore(max(1, self.chunk_workers))
+        
+        async def extract_chunk(chunk_number, chunk):
+            async with semaphore:
+                return await self._extract_chunk_concepts(paper_id, paper_context, chunk, chunk_number, len(chunks))
+        
+        chunk_results = await asyncio.gather(*(extract_chunk(n, chunk) for n, chunk in enumerate(chunks, start=1)))
+        
+        failed = sum(1 for concepts in chunk_results if concepts is None)
+        concept_lists = [concepts for concepts in chunk_results if concepts]
+        concepts = merge_concepts(concept_lists)
+        print(f"  🧩 {paper_id}: {len(chunks)} фрагментов, {sum(len(c) for c in concept_lists)} концептов "
+              f"→ {len(concepts)} после слияния" + (f", ошибок во фрагментах: {failed}" if failed else ""))
+        return ExtractedKnowledge(paper_id=paper_id, concepts=concepts)
+
+    async def _extract_chunk_concepts(self, paper_id: str, paper_context: str, chunk: dict, chunk_number: int, total_chunks: int):
+        """Извлекает концепты из одного фрагмента статьи (None при ошибке)"""
+        prompt_text = f"""
+        You are an expert in scientific research methodology and bioinformatics.
+        
+        TASK: Analyze the following FRAGMENT ({chunk_number} of {total_chunks}, sections: {", ".join(chunk['sections'])}) of a scientific paper and extract its core components.
+        Extract components ONLY from the fragment; the paper beginning is given for context.
+        
+        IMPORTANT DISTINCTIONS:
+        - Hypothesis: A testable prediction or proposed explanation (often starts with "we hypothesize", "we propose", "we test the hypothesis")
+        - Method: The experimental technique or approach used (e.g., "using CRISPR", "via flow cytometry", "mass spectrometry")  
+        - Result: The actual findings or observations from experiments (e.g., "we observed", "showed", "revealed")
+        - Conclusion: Final interpretations or implications drawn from results (e.g., "we conclude", "this confirms")
+        
+        For each component, identify all mentioned biological entities (Genes like SIRT1, Proteins like mTOR, Diseases, Compounds like Rapamycin, Processes like senescence).
+
+        CRITICAL: Your response MUST be a structured JSON that follows the ExtractedKnowledge schema.
+        CRITICAL: All text fields (statements, entity names) MUST be in English only.
+
+        PAPER BEGINNING (context only): "{paper_context}"
+
+        FRAGMENT TEXT: "{chunk['text']}"
+        
+        Paper ID: {paper_id}
+        """
+        
+        try:
+            knowledge = await llm_extractor_aclient.chat.completions.create(
+                messages=[{"role": "user", "content": prompt_text}],
+                response_model=ExtractedKnowledge
+            )
+            return knowledge.concepts
+        except Exception as e:
+            print(f"⚠️ Ошибка извлечения концептов для {paper_id} (фрагмент {chunk_number}/{total_chunks}): {e}")
+            return None
+
+    async def _extract_concepts_batch(self, papers: list) -> dict:
+        """
+        Извлекает концепты из нескольких коротких текстов одним запросом
+        
+        Args:
+            papers: [(paper_id, text)]
+        
+        Returns:
+            {paper_id: ExtractedKnowledge} только для статей, которые модель вернула
+        """
+        papers_text = "\n\n".join(f'### PAPER ID: {paper_id}\n"{text}"' for paper_id, text in papers)
+        prompt_text = f"""
+        You are an expert in scientific research methodology and bioinformatics.
+        
+        TASK: Analyze EACH of the following {len(papers)} scientific texts independently and extract their core components.
+        
+        IMPORTANT DISTINCTIONS:
+        - Hypothesis: A testable prediction or proposed explanation (often starts with "we hypothesize", "we propose", "we test the hypothesis")
+        - Method: The experimental technique or approach used (e.g., "using CRISPR", "via flow cytometry", "mass spectrometry")  
+        - Result: The actual findings or observations from experiments (e.g., "we observed", "showed", "revealed")
+        - Conclusion: Final interpretations or implications drawn from results (e.g., "we conclude", "this confirms")
+        
+        For each component, identify all mentioned biological entities (Genes like SIRT1, Proteins like mTOR, Diseases, Compounds like Rapamycin, Processes like senescence).
+        
+        BE PRECISE: Never mix components between papers. A hypothesis without corresponding results in the same paper should remain unconnected.
+
+        CRITICAL: Return exactly one entry per paper in "papers", with paper_id copied exactly as given.
+        CRITICAL: Your response MUST be a structured JSON that follows the ExtractedKnowledgeBatch schema.
+        CRITICAL: All text fields (statements, entity names) MUST be in English only.
+
+        PAPERS:
+        {papers_text}
+        """
+        
+        try:
+            batch = await llm_extractor_aclient.chat.completions.create(
+                messages=[{"role": "user", "content": prompt_text}],
+                response_model=ExtractedKnowledgeBatch
+            )
+        except Exception as e:
+            print(f"⚠️ Ошибка пакетного извлечения ({len(papers)} статей): {e}")
+            return {}
+        
+        requested = {paper_id for paper_id, _ in papers}
+        return {knowledge.paper_id: knowledge for knowledge in batch.papers if knowledge.paper_id in requested}
+
+    def _is_batchable(self, doc_data) -> bool:
+        """Короткий текст без PDF (обычно аннотация) - кандидат в пакетный запрос"""
+        if doc_data.get('has_pdf') and doc_data.get('pdf_path'):
+            return False
+        text = doc_data.get('full_text') or ''
+        return 0 < len(text) // CHARS_PER_TOKEN <= self.batch_item_max_tokens
+
+    def _pack_batches(self, documents: list) -> list:
+        """Жадно упаковывает документы в пачки по бюджету входных токенов"""
+        batches, current, current_tokens = [], [], 0
+        for paper_id, doc_data in documents:
+            tokens = len(doc_data['full_text']) // CHARS_PER_TOKEN
+            if current and (current_tokens + tokens > self.batch_token_budget or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append((paper_id, doc_data))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _extract_batch_with_cache(self, batch: list, content_hashes: dict, use_cache: bool) -> list:
+        """
+        Обрабатывает пачку документов: кэш, затем один общий запрос
+        
+        Статьи, которые пачка не вернула (или весь запрос упал), извлекаются
+        по одной - ошибка одной статьи не теряет остальные.
+        """
+        results, pending = [], []
+        for paper_id, doc_data in batch:
+            if use_cache:
+                cached_knowledge = self.cache.get_extracted_knowledge(content_hashes[paper_id])
+                if cached_knowledge is not None:
+                    cached_knowledge.paper_id = paper_id
+                    print(f"  📁 {paper_id}: концепты из кэша ({len(cached_knowledge.concepts)})")
+                    results.append((paper_id, doc_data['full_text'], doc_data.get('year', 2024), cached_knowledge))
+                    continue
+            pending.append((paper_id, doc_data))
+        
+        extracted = {}
+        if len(pending) > 1:
+            extracted = await self._extract_concepts_batch([(paper_id, doc_data['full_text']) for paper_id, doc_data in pending])
+            print(f"  📦 Пачка из {len(pending)} статей: получено {len(extracted)}")
+        
+        for paper_id, doc_data in pending:
+            knowledge = extracted.get(paper_id)
+            if knowledge is None:
+                results.append(await self._extract_with_cache(paper_id, doc_data, content_hashes[paper_id], use_cache=False))
+                continue
+            if knowledge.concepts:
+                self.cache.save_extracted_knowledge(content_hashes[paper_id], knowledge)
+            results.append((paper_id, doc_data['full_text'], doc_data.get('year', 2024), knowledge))
+        return results
+
+    async def _process_single_document(self, paper_id, doc_data):
         """Обрабатывает один документ для извлечения концептов"""
         year = doc_data.get('year', 2024)
         
         # Если есть PDF файл - извлекаем концепты напрямую из PDF
         if doc_data.get('has_pdf') and doc_data.get('pdf_path'):
             print(f"  📄 {paper_id}: прямое извлечение из PDF")
-            extracted_knowledge = self.pdf_reader.extract_concepts_from_pdf(
+            extracted_knowledge = await self.pdf_reader.extract_concepts_from_pdf_async(
                 doc_data['pdf_path'], paper_id
             )
             text = f"Processed from PDF: {doc_data['pdf_path']}"
         else:
             # Иначе используем текст (для обратной совместимости)
             text = doc_data['full_text']
-            extracted_knowledge = self._extract_scientific_concepts(paper_id, text)
+            extracted_knowledge = await self._extract_scientific_concepts(paper_id, text)
         
         if extracted_knowledge:
             print(f"  📄 {paper_id}: найдено {len(extracted_knowledge.concepts)} концептов")
@@ -133,96 +381,353 @@ class ScientificKnowledgeGraph:
         
         return paper_id, text, year, extracted_knowledge
 
-    def build_graph(self, documents: dict, max_workers=4, force_rebuild_normalization=False):
-        """Строит граф знаний из документов с нормализацией сущностей"""
-        print(f"🚀 Запускаем параллельное извлечение концептов из {len(documents)} документов (потоков: {max_workers})")
-        
-        # Фаза 1: Параллельно извлекаем все концепты
-        all_results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_paper = {
-                executor.submit(self._process_single_document, paper_id, doc_data): paper_id 
-                for paper_id, doc_data in documents.items()
-            }
-            
-            # Используем tqdm без desc для избежания дублирования в многопоточности
-            for future in tqdm(concurrent.futures.as_completed(future_to_paper), 
-                             total=len(documents), desc="Извлечение концептов", 
-                             position=0, leave=True):
-                paper_id = future_to_paper[future]
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                except Exception as e:
-                    print(f"❌ Ошибка обработки {paper_id}: {e}")
+    def _compute_content_hash(self, doc_data) -> str:
+        """Считает хэш содержимого статьи (байты PDF, либо текст)"""
+        hasher = hashlib.sha256()
+        pdf_path = doc_data.get('pdf_path')
         
-        # Фаза 2: Нормализация сущностей
-        print("\n🔄 Фаза нормализации сущностей...")
+        if pdf_path and Path(pdf_path).exists():
+            with open(pdf_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(block)
+        else:
+            hasher.update(doc_data.get('full_text', '').encode('utf-8'))
         
-        # Собираем все извлеченные знания для нормализации
-        all_extracted_knowledge = [result[3] for result in all_results]  # result[3] = extracted_knowledge
+        return hasher.hexdigest()
+
+    def _plan_incremental_update(self, documents: dict, content_hashes: dict) -> dict:
+        """Сравнивает документы с графом: удаляет пропавшие статьи и возвращает новые/изменённые"""
+        existing_hashes = {
+            node_id: data.get('content_hash') for node_id, data in self.nodes_of_type('Paper')
+        }
         
-        # Собираем все уникальные сущности
-        unique_entities = self.entity_normalizer.collect_all_entities(all_extracted_knowledge)
+        # Статьи, которых больше нет в корпусе
+        deleted_papers = [paper_id for paper_id in existing_hashes if paper_id not in documents]
+        for paper_id in deleted_papers:
+            self.remove_paper(paper_id)
         
-        if unique_entities:
-            # Проверяем существующий мапинг нормализации
-            normalization_file = "entity_normalization_map.json"
-            
-            # Удаляем старый мапинг при принудительном пересоздании
-            if force_rebuild_normalization and Path(normalization_file).exists():
-                print(f"🗑️ Удаляю старый мапинг нормализации: {normalization_file}")
-                Path(normalization_file).unlink()
+        documents_to_process = {}
+        changed_count = 0
+        for paper_id, doc_data in documents.items():
+            if paper_id not in existing_hashes:
+                documents_to_process[paper_id] = doc_data
+            elif (existing_hashes[paper_id] != content_hashes[paper_id]
+                  or not self.index.concepts_by_paper.get(paper_id)):
+                # Содержимое изменилось или прошлое извлечение ничего не дало - извлекаем заново
+                self.remove_paper(paper_id)
+                documents_to_process[paper_id] = doc_data
+                changed_count += 1
+        
+        new_count = len(documents_to_process) - changed_count
+        unchanged_count = len(documents) - len(documents_to_process)
+        print(f"♻️ Инкрементальная сборка: новых {new_count}, изменённых {changed_count}, "
+              f"удалённых {len(deleted_papers)}, без изменений {unchanged_count}")
+        return documents_to_process
+
+    def remove_paper(self, paper_id: str):
+        """Удаляет статью, её концепты и сущности, на которые больше никто не ссылается"""
+        if not self.graph.has_node(paper_id):
+            return
+        
+        concept_ids = list(self.index.concepts_by_paper.get(paper_id, ()))
+        entity_ids = set()
+        for concept_id in concept_ids:
+            entity_ids.update(self.graph.successors(concept_id))
+        
+        self.remove_nodes(concept_ids + [paper_id])
+        orphan_entities = [n for n in entity_ids 
+                           if self.graph.has_node(n) and self.graph.in_degree(n) == 0]
+        self.remove_nodes(orphan_entities)
+
+    async def _extract_with_cache(self, paper_id, doc_data, content_hash, use_cache):
+        """Берёт знания из кэша по хэшу содержимого или извлекает их через LLM"""
+        if use_cache:
+            cached_knowledge = self.cache.get_extracted_knowledge(content_hash)
+            if cached_knowledge is not None:
+                cached_knowledge.paper_id = paper_id
+                text = doc_data.get('full_text') or f"Processed from PDF: {doc_data.get('pdf_path')}"
+                print(f"  📁 {paper_id}: концепты из кэша ({len(cached_knowledge.concepts)})")
+                return paper_id, text, doc_data.get('year', 2024), cached_knowledge
+        
+        result = await self._process_single_document(paper_id, doc_data)
+        extracted_knowledge = result[3]
+        # Пустой результат обычно означает ошибку API - такое не кэшируем
+        if extracted_knowledge.concepts:
+            self.cache.save_extracted_knowledge(content_hash, extracted_knowledge)
+        return result
+
+    def _add_paper_to_graph(self, paper_id, text, year, extracted_knowledge, content_hash=None):
+        """Добавляет статью, её концепты и нормализованные сущности в граф"""
+        # Добавляем узел для статьи; хэш только при непустом извлечении - иначе
+        # инкрементальная сборка сочтет статью неизменной и не повторит неудачное извлечение
+        paper_attrs = {'content_hash': content_hash} if content_hash and extracted_knowledge.concepts else {}
+        self.add_node(paper_id, type='Paper', content=text[:500], year=year, **paper_attrs)
+        
+        # Добавляем концепты и связи
+        for concept in extracted_knowledge.concepts:
+            concept_id = concept_node_id(paper_id, concept.concept_type, concept.statement)
+            self.add_node(concept_id, 
+                          type=concept.concept_type, 
+                          content=concept.statement, 
+                          statement=concept.statement,
+                          paper_id=paper_id)
+            self.add_edge(paper_id, concept_id, type='CONTAINS')
             
-            if Path(normalization_file).exists() and not force_rebuild_normalization:
-                print(f"📁 Найден существующий мапинг нормализации: {normalization_file}")
-                if self.entity_normalizer.load_mapping(normalization_file):
-                    print("   ✅ Мапинг загружен успешно")
-                else:
-                    print("   ⚠️ Ошибка загрузки, создаем новый мапинг")
-                    self.entity_normalizer.normalize_entities(unique_entities)
+            # Добавляем сущности с нормализацией
+            for entity in concept.mentioned_entities:
+                # Используем каноническое имя вместо исходного
+                canonical_name = self.entity_normalizer.get_canonical_name(entity.name)
+                entity_id = f"{entity.type}_{canonical_name.upper()}"
+                
+                if not self.graph.has_node(entity_id):
+                    self.add_node(entity_id, 
+                                  type='Entity', 
+                                  entity_type=entity.type, 
+                                  name=canonical_name.upper(),
+                                  canonical_name=canonical_name)
+                self.add_edge(concept_id, entity_id, type='MENTIONS', context=concept.statement)
+
+    def _normalize_entities(self, unique_entities: list, force_rebuild_normalization=False,
+                            normalization_file: str = "entity_normalization_map.json"):
+        """
+        Нормализует имена сущностей
+        
+        Существующий мапинг переиспользуется, а LLM разрешает только имена, которых в нём ещё нет
+        """
+        if not unique_entities:
+            print("   ⚠️ Не найдено сущностей для нормализации")
+            return
+        
+        # Удаляем старый мапинг при принудительном пересоздании
+        if force_rebuild_normalization and Path(normalization_file).exists():
+            print(f"🗑️ Удаляю старый мапинг нормализации: {normalization_file}")
+            Path(normalization_file).unlink()
+        
+        if Path(normalization_file).exists():
+            print(f"📁 Найден существующий мапинг нормализации: {normalization_file}")
+            if self.entity_normalizer.load_mapping(normalization_file):
+                print("   ✅ Мапинг загружен успешно")
+                # Дополняем мапинг только новыми именами
+                if self.entity_normalizer.normalize_new_entities(unique_entities):
                     self.entity_normalizer.save_mapping(normalization_file)
             else:
-                # Создаем новый мапинг нормализации
-                print("🆕 Создаю новый мапинг нормализации...")
+                print("   ⚠️ Ошибка загрузки, создаем новый мапинг")
                 self.entity_normalizer.normalize_entities(unique_entities)
                 self.entity_normalizer.save_mapping(normalization_file)
-                
-            # Выводим статистику нормализации
-            self.entity_normalizer.print_statistics()
         else:
-            print("   ⚠️ Не найдено сущностей для нормализации")
+            # Создаем новый мапинг нормализации
+            print("🆕 Создаю новый мапинг нормализации...")
+            self.entity_normalizer.normalize_entities(unique_entities)
+            self.entity_normalizer.save_mapping(normalization_file)
+            
+        # Выводим статистику нормализации
+        self.entity_normalizer.print_statistics()
+
+    def _iter_extractions(self, documents: dict, content_hashes: dict, use_cache=False, max_pending=None):
+        """
+        Извлекает концепты параллельно и отдает результаты по мере готовности
         
-        # Фаза 3: Строим граф с нормализованными сущностями
-        print("\n🏗️ Строим граф из извлеченных концептов...")
+        Задачи - корутины в общем цикле событий (core.async_runtime), а не потоки:
+        фактический параллелизм запросов задают лимитеры моделей и глобальный семафор.
+        Одновременно в работе не больше max_pending задач (по умолчанию - глобальный предел
+        запросов в полете), поэтому готовые, но не обработанные результаты не копятся в памяти.
+        Задача - один документ или пачка коротких текстов (при batched_extraction).
+        """
+        max_pending = max_pending or get_runtime().max_in_flight
         
-        for paper_id, text, year, extracted_knowledge in tqdm(all_results, desc="Построение графа"):
-            # Добавляем узел для статьи
-            self.graph.add_node(paper_id, type='Paper', content=text[:500], year=year)
+        work_items = []
+        batchable = []
+        for paper_id, doc_data in documents.items():
+            if self.batched_extraction and self._is_batchable(doc_data):
+                batchable.append((paper_id, doc_data))
+            else:
+                work_items.append([(paper_id, doc_data)])
+        if batchable:
+            batches = self._pack_batches(batchable)
+            print(f"📦 {len(batchable)} коротких текстов упаковано в {len(batches)} пакетных запросов")
+            work_items = batches + work_items
+        pending_items = iter(work_items)
+        
+        async def process_item(item):
+            if len(item) == 1:
+                paper_id, doc_data = item[0]
+                return [await self._extract_with_cache(paper_id, doc_data, content_hashes[paper_id], use_cache)]
+            return await self._extract_batch_with_cache(item, content_hashes, use_cache)
+        
+        future_to_item = {}
+        
+        def submit_next():
+            item = next(pending_items, None)
+            if item is None:
+                return False
+            future_to_item[submit(process_item(item))] = item
+            return True
+        
+        while len(future_to_item) < max_pending and submit_next():
+            pass
+        
+        try:
+            while future_to_item:
+                done, _ = concurrent.futures.wait(future_to_item, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    item = future_to_item.pop(future)
+                    submit_next()
+                    try:
+                        yield from future.result()
+                    except Exception as e:
+                        print(f"❌ Ошибка обработки {', '.join(paper_id for paper_id, _ in item)}: {e}")
+        finally:
+            # Генератор закрыт досрочно (ошибка сборки) - незавершенные запросы отменяются
+            for future in future_to_item:
+                future.cancel()
+
+    def _relabel_entities(self) -> int:
+        """
+        Переименовывает предварительные узлы сущностей в канонические после нормализации
+        
+        Узлы, которые попали в одну каноническую группу, сливаются: рёбра MENTIONS
+        переносятся на канонический узел, предварительный узел удаляется
+        
+        Returns:
+            Количество слитых узлов
+        """
+        merged = 0
+        for entity_id, data in list(self.nodes_of_type('Entity')):
+            if not self.graph.has_node(entity_id):
+                continue
+            canonical_name = self.entity_normalizer.get_canonical_name(data.get('canonical_name', data.get('name')))
+            target_id = f"{data.get('entity_type')}_{canonical_name.upper()}"
+            if target_id == entity_id:
+                continue
             
-            # Добавляем концепты и связи
+            if not self.graph.has_node(target_id):
+                self.add_node(target_id, 
+                              type='Entity', 
+                              entity_type=data.get('entity_type'), 
+                              name=canonical_name.upper(),
+                              canonical_name=canonical_name)
+            for concept_id in list(self.graph.predecessors(entity_id)):
+                if not self.graph.has_edge(concept_id, target_id):
+                    self.add_edge(concept_id, target_id, **self.graph.edges[concept_id, entity_id])
+            self.remove_nodes([entity_id])
+            merged += 1
+        return merged
+
+    def _journaled(self, results, journal: BuildJournal, content_hashes: dict):
+        """Дописывает каждый успешный результат извлечения в журнал сборки"""
+        for result in results:
+            paper_id, text, year, extracted_knowledge = result
+            # Пустой результат обычно означает ошибку API - при возобновлении его стоит извлечь заново
+            if extracted_knowledge.concepts:
+                journal.append(paper_id, text, year, extracted_knowledge, content_hashes.get(paper_id))
+            yield result
+
+    def _build_graph_streaming(self, results, total: int, content_hashes: dict,
+                               force_rebuild_normalization=False,
+                               normalization_file: str = "entity_normalization_map.json"):
+        """
+        Потоковая сборка: каждая статья попадает в граф сразу после извлечения
+        
+        Сущности сначала нормализуются предварительно (существующим мапингом и офлайн-сопоставлением),
+        в конце выполняется один проход нормализации новых имен и слияние узлов сущностей.
+        ExtractedKnowledge не накапливаются в памяти - хранятся только имена сущностей.
+        """
+        # Предварительная нормализация существующим мапингом
+        if not force_rebuild_normalization and Path(normalization_file).exists():
+            self.entity_normalizer.load_mapping(normalization_file)
+        
+        unique_entities = set()
+        for paper_id, text, year, extracted_knowledge in track_throughput(tqdm(
+                results, total=total, desc="Извлечение и построение графа", position=0, leave=True)):
+            self._add_paper_to_graph(paper_id, text, year, extracted_knowledge, content_hashes.get(paper_id))
             for concept in extracted_knowledge.concepts:
-                concept_id = f"{paper_id}_{concept.concept_type}_{hash(concept.statement)}"
-                self.graph.add_node(concept_id, 
-                                  type=concept.concept_type, 
-                                  content=concept.statement, 
-                                  statement=concept.statement,
-                                  paper_id=paper_id)
-                self.graph.add_edge(paper_id, concept_id, type='CONTAINS')
-                
-                # Добавляем сущности с нормализацией
                 for entity in concept.mentioned_entities:
-                    # Используем каноническое имя вместо исходного
-                    canonical_name = self.entity_normalizer.get_canonical_name(entity.name)
-                    entity_id = f"{entity.type}_{canonical_name.upper()}"
-                    
-                    if not self.graph.has_node(entity_id):
-                        self.graph.add_node(entity_id, 
-                                          type='Entity', 
-                                          entity_type=entity.type, 
-                                          name=canonical_name.upper(),
-                                          canonical_name=canonical_name)
-                    self.graph.add_edge(concept_id, entity_id, type='MENTIONS', context=concept.statement)
+                    unique_entities.add(entity.name)
+        
+        print("\n🔄 Финальная нормализация сущностей...")
+        self._normalize_entities(sorted(unique_entities), force_rebuild_normalization, normalization_file)
+        merged = self._relabel_entities()
+        print(f"   🔗 Слито предварительных узлов сущностей: {merged}")
+
+    def build_graph(self, documents: dict, max_workers=4, force_rebuild_normalization=False, incremental=False,
+                    streaming=False, resume=False, journal_path: str = "cache/build_journal.jsonl"):
+        """
+        Строит граф знаний из документов с нормализацией сущностей
+        
+        При incremental=True граф дополняется: извлекаются только новые и изменённые
+        статьи (по хэшу содержимого), удалённые статьи убираются из графа.
+        При streaming=True статьи добавляются в граф по мере извлечения, без ожидания
+        всех документов; нормализация сущностей выполняется в конце одним проходом.
+        Каждый результат извлечения пишется в журнал; resume=True восстанавливает из журнала
+        статьи прерванной сборки (с тем же хэшем содержимого) и извлекает только оставшиеся.
+        После успешной сборки журнал удаляется, поэтому воспроизводится только прерванная сборка.
+        Извлечение идет корутинами в общем цикле событий: max_workers оставлен для совместимости,
+        параллелизм задают MAX_IN_FLIGHT и лимитеры моделей (config.py).
+        """
+        content_hashes = {paper_id: self._compute_content_hash(doc_data) 
+                          for paper_id, doc_data in documents.items()}
+        
+        if incremental:
+            documents = self._plan_incremental_update(documents, content_hashes)
+            if not documents:
+                print("✅ Граф актуален, извлечение не требуется")
+                return
+        
+        journal = BuildJournal(journal_path)
+        replayed_results = []
+        if resume:
+            for paper_id, (text, year, knowledge, content_hash) in journal.replay().items():
+                if paper_id in documents and content_hash == content_hashes.get(paper_id):
+                    replayed_results.append((paper_id, text, year, knowledge))
+            replayed_ids = {result[0] for result in replayed_results}
+            total = len(documents)
+            documents = {paper_id: doc_data for paper_id, doc_data in documents.items() 
+                         if paper_id not in replayed_ids}
+            print(f"⏯️ Возобновление сборки: из журнала восстановлено {len(replayed_results)} из {total} статей")
+        
+        print(f"🚀 Запускаем асинхронное извлечение концептов из {len(documents)} документов "
+              f"(в полете до {get_runtime().max_in_flight} запросов)")
+        
+        # Журнал продолжается при возобновлении и начинается заново при обычной сборке
+        journal.open(truncate=not resume)
+        try:
+            extracted = self._journaled(
+                self._iter_extractions(documents, content_hashes, use_cache=incremental),
+                journal, content_hashes
+            )
+            results = itertools.chain(replayed_results, extracted)
+            total = len(replayed_results) + len(documents)
+            
+            if streaming:
+                self._build_graph_streaming(results, total, content_hashes, force_rebuild_normalization)
+                journal.clear()
+                return
+            
+            # Фаза 1: Параллельно извлекаем все концепты
+            # Используем tqdm без desc для избежания дублирования в многопоточности
+            all_results = list(track_throughput(tqdm(results, total=total, desc="Извлечение концептов", 
+                                                     position=0, leave=True)))
+        finally:
+            journal.close()
+            if self.pdf_reader.stats.records:
+                print("\n📏 Статистика извлечения из PDF (на статью):")
+                self.pdf_reader.stats.print_summary()
+        
+        # Фаза 2: Нормализация сущностей
+        print("\n🔄 Фаза нормализации сущностей...")
+        
+        # Собираем все извлеченные знания для нормализации
+        all_extracted_knowledge = [result[3] for result in all_results]  # result[3] = extracted_knowledge
+        unique_entities = self.entity_normalizer.collect_all_entities(all_extracted_knowledge)
+        self._normalize_entities(unique_entities, force_rebuild_normalization)
+        
+        # Фаза 3: Строим граф с нормализованными сущностями
+        print("\n🏗️ Строим граф из извлеченных концептов...")
+        
+        for paper_id, text, year, extracted_knowledge in tqdm(all_results, desc="Построение графа"):
+            self._add_paper_to_graph(paper_id, text, year, extracted_knowledge, content_hashes.get(paper_id))
+        
+        journal.clear()
 
     def visualize_graph(self):
         """Простая визуализация графа"""
@@ -240,7 +745,7 @@ class ScientificKnowledgeGraph:
         }
         
         for node_type in colors:
-            nodes = [n for n, data in self.graph.nodes(data=True) if data.get('type') == node_type]
+            nodes = list(self.index.nodes_by_type.get(node_type, ()))
             nx.draw_networkx_nodes(self.graph, pos, nodelist=nodes, 
                                  node_color=colors[node_type], 
                                  node_size=300, alpha=0.8)
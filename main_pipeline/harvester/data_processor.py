@@ -10,30 +10,36 @@ try:
 except ImportError:
     GENAI_AVAILABLE = False
 
+from processing.file_registry import get_file_registry
+from processing.local_pdf import LOCAL_PDF_AVAILABLE, extract_pdf_local, extract_many_local, is_usable
+
 class SimplePDFReader:
     def __init__(self):
         if GENAI_AVAILABLE:
             self.client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+            self.files = get_file_registry(self.client)
         else:
             self.client = None
     
-    def read_pdf(self, pdf_path: str) -> str:
+    def read_pdf(self, pdf_path: str, try_local: bool = True) -> str:
+        # Локальный текстовый слой PDF - без вызова Gemini; LLM только для сканов и битого текста
+        if try_local and LOCAL_PDF_AVAILABLE:
+            local_result = extract_pdf_local(pdf_path)
+            if is_usable(local_result):
+                return local_result['text']
+        
         if not self.client:
             return ""
         
         try:
             pdf_path = Path(pdf_path)
-            pdf_data = pdf_path.read_bytes()
             
             prompt = "Извлеки полный текст из научной статьи. Включи все разделы: введение, методы, результаты, обсуждение, заключение."
             
-            response = self.client.models.generate_content(
+            response = self.files.with_file(pdf_path, lambda pdf_part: self.client.models.generate_content(
                 model="gemini-2.0-flash",
-                contents=[
-                    types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'),
-                    prompt
-                ]
-            )
+                contents=[pdf_part, prompt]
+            ))
             return response.text
         except:
             return ""
@@ -87,6 +93,10 @@ class DataProcessor:
         
         # Обрабатываем данные arXiv
         if arxiv_data:
+            # Локально извлекаем текст всех новых PDF параллельно в пуле процессов
+            uncached = [data["pdf_path"] for data in arxiv_data.values() if not self.cache.get_pdf_text(data["pdf_path"])]
+            local_results = extract_many_local(uncached)
+            
             for paper_id, data in arxiv_data.items():
                 pdf_path = data["pdf_path"]
                 
@@ -94,8 +104,11 @@ class DataProcessor:
                 cached_text = self.cache.get_pdf_text(pdf_path)
                 if cached_text:
                     full_text = cached_text
+                elif is_usable(local_results.get(str(pdf_path))):
+                    full_text = local_results[str(pdf_path)]['text']
+                    self.cache.save_pdf_text(pdf_path, full_text)
                 else:
-                    full_text = self.pdf_reader.read_pdf(pdf_path)
+                    full_text = self.pdf_reader.read_pdf(pdf_path, try_local=False)
                     if full_text:
                         self.cache.save_pdf_text(pdf_path, full_text)
                 
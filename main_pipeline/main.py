@@ -11,6 +11,9 @@ import os
 from graph import ScientificKnowledgeGraph
 from analysis import ResearchAnalyst
 from processing import load_documents
+from core.rate_limiter import print_rate_limit_stats
+from core.llm_cache import print_llm_cache_stats
+from config import get_llm_response_cache
 
 def create_results_folder():
     """Создает уникальную папку для результатов анализа"""
@@ -34,14 +37,36 @@ def main():
     results_dir = create_results_folder()
     
     # Файлы будут сохраняться в папке результатов
-    GRAPH_FILE = results_dir / "longevity_knowledge_graph.graphml"
+    GRAPH_FILE = results_dir / "longevity_knowledge_graph.graphml"  # GraphML для Gephi/Cytoscape
+    GRAPH_SNAPSHOT_FILE = results_dir / "longevity_knowledge_graph.lgs"  # Быстрый бинарный снимок
     REPORT_FILE = results_dir / "research_report.json"
     HIERARCHICAL_REPORT_FILE = results_dir / "hierarchical_research_report.json"
     ENTITY_MAP_FILE = results_dir / "entity_normalization_map.json"
     
+    # Постоянный граф, который дополняется между запусками в инкрементальном режиме
+    BASE_GRAPH_FILE = Path("longevity_knowledge_graph.lgs")
+    LEGACY_BASE_GRAPH_FILE = Path("longevity_knowledge_graph.graphml")
+    
     # Настройки для анализа
-    FORCE_REBUILD = True  # Установите True для принудительного пересоздания графа
-    MAX_WORKERS = 30  # Количество потоков для параллельной обработки
+    FORCE_REBUILD = True  # Установите True для принудительного пересоздания графа (False - включает INCREMENTAL_BUILD и RESUME_BUILD)
+    INCREMENTAL_BUILD = True  # Извлекать только новые/изменённые статьи, удалённые убирать из графа (при FORCE_REBUILD = False)
+    STREAMING_BUILD = True  # Добавлять статьи в граф по мере извлечения, нормализация - одним проходом в конце
+    RESUME_BUILD = True  # Продолжить прерванную сборку по журналу cache/build_journal.jsonl (не при FORCE_REBUILD)
+    PDF_EXTRACTION_MODE = "single_pass"  # "single_pass" - JSON по схеме за один вызов, "two_pass" - текст + разбор
+    CHUNKED_EXTRACTION = True  # Длинные тексты делить на фрагменты по разделам и извлекать параллельно
+    CHUNK_TOKENS = 6000  # Бюджет токенов на фрагмент
+    BATCHED_EXTRACTION = True  # Упаковывать короткие аннотации (без PDF) по несколько в один запрос
+    SEMANTIC_DEDUP = True  # Сливать почти одинаковые направления по эмбеддингам описаний до критики
+    DEDUP_THRESHOLD = 0.92  # Косинусная близость описаний, начиная с которой направления - дубликаты
+    BATCHED_CRITIQUE = True  # Критиковать по несколько направлений за запрос (рубрика критика - один раз на пачку)
+    CRITIQUE_BATCH_TOKENS = 8000  # Бюджет токенов пачки критики: описания + ожидаемые ответы
+    TRIAGE = True  # Предварительный отбор дешевой моделью: к полному критику идут только перспективные направления
+    TRIAGE_RECALL = 0.95  # Какую долю интересных (по вердикту критика) направлений должен сохранять отбор
+    SCORE_WEIGHTS = {'impact': 0.5, 'novelty': 0.3, 'feasibility': 0.2}  # Веса итоговой оценки (считается локально)
+    TOP_K_DIRECTIONS = 100  # Сколько лучших направлений держать в рейтинге и отчете (None - все)
+    CLUSTER_SIZE = 12  # Средний размер тематического кластера (программы) в иерархическом отчете
+    MAX_CLUSTER_SIZE = 24  # Предел направлений в одном промпте синтеза программы
+    MAX_WORKERS = 30  # Процессов для локального разбора PDF; вызовы API - корутины (config.MAX_IN_FLIGHT, AIMD-регулятор)
     
     # Путь к документам - ИЗМЕНИТЕ ЗДЕСЬ для другой папки
     PDF_FOLDER = "downloaded_pdfs/dataset_1"
@@ -51,15 +76,26 @@ def main():
     print(f"📂 Результаты будут сохранены в: {results_dir}")
     
     # Создаем объект графа знаний
-    skg = ScientificKnowledgeGraph()
+    skg = ScientificKnowledgeGraph(pdf_extraction_mode=PDF_EXTRACTION_MODE,
+                                   chunked_extraction=CHUNKED_EXTRACTION, chunk_tokens=CHUNK_TOKENS,
+                                   batched_extraction=BATCHED_EXTRACTION)
     
     # Проверяем, нужно ли загружать существующий граф
     # Примечание: теперь каждый запуск создает новый граф, но можно изменить логику
-    graph_exists = GRAPH_FILE.exists()
+    graph_exists = GRAPH_SNAPSHOT_FILE.exists() or GRAPH_FILE.exists()
+    incremental = INCREMENTAL_BUILD and not FORCE_REBUILD
     
-    if graph_exists and not FORCE_REBUILD:
-        print(f"📁 Найден сохранённый граф: {GRAPH_FILE}")
-        if skg.load_graph(str(GRAPH_FILE)):
+    if incremental:
+        # Берём граф прошлого запуска за основу, дальше build_graph обновит только изменения
+        base_graph_file = BASE_GRAPH_FILE if BASE_GRAPH_FILE.exists() else LEGACY_BASE_GRAPH_FILE
+        if base_graph_file.exists():
+            print(f"📁 Найден базовый граф для инкрементального обновления: {base_graph_file}")
+            skg.load_graph(str(base_graph_file))
+        graph_exists = False
+    elif graph_exists and not FORCE_REBUILD:
+        saved_graph_file = GRAPH_SNAPSHOT_FILE if GRAPH_SNAPSHOT_FILE.exists() else GRAPH_FILE
+        print(f"📁 Найден сохранённый граф: {saved_graph_file}")
+        if skg.load_graph(str(saved_graph_file)):
             # Выводим статистику загруженного графа
             stats = skg.get_graph_stats()
             print(f"   📊 Статистика графа:")
@@ -77,27 +113,39 @@ def main():
     if not graph_exists or FORCE_REBUILD:
         if FORCE_REBUILD:
             print("🔄 Принудительное пересоздание графа...")
+        elif incremental:
+            print("♻️ Инкрементальное обновление графа...")
         else:
             print("📁 Сохранённый граф не найден. Начинаю построение с нуля.")
         
         # Загружаем документы из указанной папки
         print(f"📁 Загружаем документы из папки: {PDF_FOLDER}")
-        documents = load_documents(data_source=PDF_FOLDER, use_cache=USE_CACHE, max_workers=MAX_WORKERS)
+        # В инкрементальном режиме тексты PDF берём из кэша, иначе каждый запуск перечитывает все файлы
+        documents = load_documents(data_source=PDF_FOLDER, use_cache=USE_CACHE or incremental, max_workers=MAX_WORKERS)
         
         if not documents:
             print("❌ Не найдено документов для обработки!")
             return
         
         print("🧬 --- Stage 1: Building the Knowledge Graph ---")
-        skg.build_graph(documents, max_workers=MAX_WORKERS, force_rebuild_normalization=FORCE_REBUILD)
+        skg.build_graph(documents, max_workers=MAX_WORKERS, force_rebuild_normalization=FORCE_REBUILD,
+                        incremental=incremental, streaming=STREAMING_BUILD,
+                        resume=RESUME_BUILD and not FORCE_REBUILD)
         
         # Сохраняем граф
+        skg.save_graph(str(GRAPH_SNAPSHOT_FILE))
         if skg.save_graph(str(GRAPH_FILE)):
             stats = skg.get_graph_stats()
             print(f"✅ Граф построен и сохранён: {stats['nodes']} узлов, {stats['edges']} рёбер")
         else:
             print("⚠️ Граф построен, но сохранение не удалось")
         
+        print_rate_limit_stats()
+        
+        # Обновляем базовый граф для следующего инкрементального запуска
+        if INCREMENTAL_BUILD:
+            skg.save_graph(str(BASE_GRAPH_FILE))
+        
         # Копируем файл нормализации сущностей в папку результатов
         import shutil
         source_entity_map = "entity_normalization_map.json"
@@ -111,16 +159,26 @@ def main():
             print("⚠️ Файл нормализации сущностей не найден")
     
     print("\n🔬 --- Stage 2: Analysis and Prioritization ---")
-    # ПРИМЕЧАНИЕ: Кластеризация отключена - все направления будут в одной программе
-    analyst = ResearchAnalyst(skg)
+    # Направления группируются в программы кластеризацией эмбеддингов описаний (MiniBatchKMeans)
+    analyst = ResearchAnalyst(skg, semantic_dedup=SEMANTIC_DEDUP, dedup_threshold=DEDUP_THRESHOLD,
+                              batched_critique=BATCHED_CRITIQUE, critique_batch_tokens=CRITIQUE_BATCH_TOKENS,
+                              triage=TRIAGE, triage_recall=TRIAGE_RECALL, score_weights=SCORE_WEIGHTS,
+                              top_k=TOP_K_DIRECTIONS, cluster_size=CLUSTER_SIZE, max_cluster_size=MAX_CLUSTER_SIZE)
 
+    # Синтез и критика - один потоковый конвейер (stream_critique): направление уходит на критику
+    # сразу после синтеза, а analyze_and_synthesize_report берет готовую критику
     print("\n   🌟 -> Divergent Phase: Generating raw research directions...")
     raw_directions = analyst.generate_research_directions(max_workers=MAX_WORKERS)
     print(f"   ✅ Сгенерировано {len(raw_directions)} исходных направлений.")
+    print_rate_limit_stats()
     
     if raw_directions:
         # Новый вызов иерархического анализа v2.0
         hierarchical_report = analyst.analyze_and_synthesize_report(raw_directions, max_workers=MAX_WORKERS)
+        print_rate_limit_stats()
+        llm_response_cache = get_llm_response_cache()
+        if llm_response_cache is not None:
+            print_llm_cache_stats(llm_response_cache)
         
         # Сохраняем новый иерархический отчет
         if analyst.save_hierarchical_report(hierarchical_report, str(HIERARCHICAL_REPORT_FILE)):
@@ -167,7 +225,7 @@ def main():
         print("   ⚠️ Не найдено направлений для анализа. Проверьте входные данные.")
     
     print(f"\n💾 Результаты сохранены в папке: {results_dir}")
-    print(f"   • Граф знаний: {GRAPH_FILE.name}")
+    print(f"   • Граф знаний: {GRAPH_FILE.name} (бинарный снимок: {GRAPH_SNAPSHOT_FILE.name})")
     print(f"   • Иерархический отчет v2.0: {HIERARCHICAL_REPORT_FILE.name}")
     print(f"   • Старый формат отчета: {REPORT_FILE.name}")
     print(f"   • Карта нормализации сущностей: {ENTITY_MAP_FILE.name}")
@@ -4,6 +4,9 @@ Processing модуль для обработки PDF файлов и загру
 """
 
 from .pdf_processing import SimplePDFReader, CacheManager
+from .result_store import ResultStore
+from .file_registry import GeminiFileRegistry, FakeFileAPI, get_file_registry
+from .local_pdf import extract_pdf_local, extract_many_local, segment_sections, text_quality_score
 from .data_loader import load_documents, load_harvester_data, process_single_pdf
 
-__all__ = ['SimplePDFReader', 'CacheManager', 'load_documents', 'load_harvester_data', 'process_single_pdf'] 
\ No newline at end of file
+__all__ = ['SimplePDFReader', 'CacheManager', 'ResultStore', 'GeminiFileRegistry', 'FakeFileAPI', 'get_file_registry', 'extract_pdf_local', 'extract_many_local', 'segment_sections', 'text_quality_score', 'load_documents', 'load_harvester_data', 'process_single_pdf'] 
\ No newline at end of file
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Разбиение длинных статей на фрагменты по разделам и слияние извлеченных концептов
+Фрагменты ограничены бюджетом токенов, поэтому текст после старого лимита не теряется
+"""
+
+import re
+from typing import Dict, List
+
+from core.models import MentionedEntity, ScientificConcept
+from .local_pdf import segment_sections
+
+# Грубая оценка: ~4 символа английского текста на токен
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Режет слишком длинный абзац по границам предложений (в крайнем случае - по символам)"""
+    parts, current = [], ''
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            parts.append(current)
+            current = ''
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_into_chunks(text: str, max_tokens: int = 6000) -> List[Dict]:
+    """
+    Делит текст статьи на фрагменты не длиннее max_tokens
+
+    Разделы (Abstract/Methods/Results/...) упаковываются в фрагменты целиком, пока
+    помещаются в бюджет; длинные разделы режутся по строкам. References отбрасывается.
+
+    Returns:
+        [{'sections': [имена разделов], 'text': текст с заголовками разделов}]
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+
+    # Блоки (раздел, текст) не длиннее бюджета
+    blocks = []
+    for section, section_text in segment_sections(text).items():
+        # Место под заголовок раздела, с которого может начаться фрагмент
+        block_chars = max(1, max_chars - len(f"## {section}\n"))
+        # Строки одного раздела снова склеиваются в блоки до бюджета
+        for paragraph in section_text.split('\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for piece in ([paragraph] if len(paragraph) <= block_chars else _split_long(paragraph, block_chars)):
+                if blocks and blocks[-1][0] == section and len(blocks[-1][1]) + len(piece) + 1 <= block_chars:
+                    blocks[-1] = (section, blocks[-1][1] + "\n" + piece)
+                else:
+                    blocks.append((section, piece))
+
+    # Жадная упаковка блоков во фрагменты
+    chunks = []
+    current_sections, current_parts, current_size = [], [], 0
+    for section, block in blocks:
+        header = f"## {section}\n" if not current_sections or current_sections[-1] != section else ""
+        size = len(header) + len(block) + 1
+        if current_parts and current_size + size > max_chars:
+            chunks.append({'sections': current_sections, 'text': "\n".join(current_parts)})
+            current_sections, current_parts, current_size = [], [], 0
+            header = f"## {section}\n"
+            size = len(header) + len(block) + 1
+        if not current_sections or current_sections[-1] != section:
+            current_sections.append(section)
+        current_parts.append(header + block)
+        current_size += size
+    if current_parts:
+        chunks.append({'sections': current_sections, 'text': "\n".join(current_parts)})
+    return chunks
+
+
+def _statement_key(statement: str) -> str:
+    return _NON_ALNUM.sub(' ', statement.casefold()).strip()
+
+
+def _token_set(key: str) -> set:
+    return set(key.split())
+
+
+def merge_concepts(concept_lists: List[List[ScientificConcept]], similarity_threshold: float = 0.85) -> List[ScientificConcept]:
+    """
+    Объединяет концепты из фрагментов одной статьи и убирает дубликаты
+
+    Концепты одного типа считаются дубликатами при совпадении нормализованного
+    утверждения или высокой доле общих слов (Жаккар); остается более полная
+    формулировка, упомянутые сущности объединяются.
+    """
+    merged = []  # [(концепт, ключ, множество слов)]
+    for concepts in concept_lists:
+        for concept in concepts:
+            key = _statement_key(concept.statement)
+            tokens = _token_set(key)
+            duplicate = None
+            for i, (existing, existing_key, existing_tokens) in enumerate(merged):
+                if existing.concept_type != concept.concept_type:
+                    continue
+                if key == existing_key or (
+                        tokens and existing_tokens and
+                        len(tokens & existing_tokens) / len(tokens | existing_tokens) >= similarity_threshold):
+                    duplicate = i
+                    break
+
+            if duplicate is None:
+                merged.append((concept.model_copy(deep=True), key, tokens))
+                continue
+
+            existing, existing_key, existing_tokens = merged[duplicate]
+            entities = {(e.name.casefold(), e.type): e for e in existing.mentioned_entities}
+            for entity in concept.mentioned_entities:
+                entities.setdefault((entity.name.casefold(), entity.type), entity)
+            statement = concept.statement if len(concept.statement) > len(existing.statement) else existing.statement
+            merged[duplicate] = (
+                ScientificConcept(concept_type=existing.concept_type, statement=statement,
+                                  mentioned_entities=[MentionedEntity(name=e.name, type=e.type) for e in entities.values()]),
+                _statement_key(statement), _token_set(_statement_key(statement))
+            )
+    return [concept for concept, _, _ in merged]
@@ -9,10 +9,16 @@ from pathlib import Path
 from tqdm import tqdm
 import concurrent.futures
 
+from core.async_runtime import run_sync, submit
 from .pdf_processing import SimplePDFReader, CacheManager
+from .local_pdf import LOCAL_PDF_AVAILABLE, extract_many_local, is_usable
 
-def process_single_pdf(pdf_file, cache, pdf_reader):
-    """Обрабатывает один PDF файл (для параллелизации)"""
+def process_single_pdf(pdf_file, cache, pdf_reader, local_texts=None):
+    """Обрабатывает один PDF файл (синхронный фасад над process_single_pdf_async)"""
+    return run_sync(process_single_pdf_async(pdf_file, cache, pdf_reader, local_texts))
+
+async def process_single_pdf_async(pdf_file, cache, pdf_reader, local_texts=None):
+    """Обрабатывает один PDF файл (корутина общего цикла событий)"""
     paper_id = f"PDF_{pdf_file.stem}"
     
     # Проверяем кэш
@@ -23,14 +29,43 @@ def process_single_pdf(pdf_file, cache, pdf_reader):
             return paper_id, cached_text, 2024
         else:
             print(f"  🔄 {paper_id}: читаем PDF...")
-            full_text = pdf_reader.read_pdf(str(pdf_file))
+            full_text = await _read_pdf_text(pdf_file, pdf_reader, local_texts)
             if full_text:
                 cache.save_pdf_text(str(pdf_file), full_text)
             return paper_id, full_text, 2024
     else:
-        full_text = pdf_reader.read_pdf(str(pdf_file))
+        full_text = await _read_pdf_text(pdf_file, pdf_reader, local_texts)
         return paper_id, full_text, 2024
 
+async def _read_pdf_text(pdf_file, pdf_reader, local_texts=None):
+    """Текст PDF: результат локального прохода, иначе Gemini"""
+    if local_texts is not None:
+        # Локальный проход уже был - в Gemini идут только PDF с плохим текстовым слоем
+        return local_texts.get(str(pdf_file)) or await pdf_reader.read_pdf_async(str(pdf_file), try_local=False)
+    return await pdf_reader.read_pdf_async(str(pdf_file))
+
+def extract_local_texts(pdf_files, cache=None, max_workers=4):
+    """
+    Локально извлекает текст PDF, которых нет в кэше, в пуле процессов
+    
+    Returns:
+        {путь: текст} только для PDF с качественным текстовым слоем или None,
+        если библиотеки для локального чтения не установлены
+    """
+    if not LOCAL_PDF_AVAILABLE:
+        print("⚠️ pypdf/pdfminer не установлены - весь текст PDF читается через Gemini")
+        return None
+    
+    pending = [pdf_file for pdf_file in pdf_files if not (cache and cache.get_pdf_text(str(pdf_file)))]
+    if not pending:
+        return {}
+    
+    results = extract_many_local(pending, max_workers)
+    local_texts = {path: result['text'] for path, result in results.items() if is_usable(result)}
+    print(f"⚡ Локально извлечён текст {len(local_texts)} из {len(pending)} PDF, "
+          f"в Gemini пойдут {len(pending) - len(local_texts)} (сканы или битый текст)")
+    return local_texts
+
 def load_harvester_data(data_path, use_cache=True, max_workers=4):
     """Загружает данные от harvester (новый формат lcgr_ready_*.json)"""
     print(f"📄 Загружаем данные от harvester: {data_path}")
@@ -48,32 +83,34 @@ def load_harvester_data(data_path, use_cache=True, max_workers=4):
     
     print(f"📊 Найдено: {len(pdf_papers)} PDF + {len(text_papers)} только текст")
     
-    # Параллельно обрабатываем PDF файлы
+    # Параллельно обрабатываем PDF файлы: корутины в общем цикле событий вместо пула потоков
     if pdf_papers:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_paper = {
-                executor.submit(process_single_pdf, Path(pdf_path), cache, pdf_reader): (paper_id, doc_data) 
-                for paper_id, doc_data in pdf_papers
-            }
-            
-            for future in tqdm(concurrent.futures.as_completed(future_to_paper), 
-                             total=len(pdf_papers), desc="Обработка PDF файлов",
-                             position=0, leave=True):
-                paper_id, doc_data = future_to_paper[future]
-                try:
-                    _, full_text, _ = future.result()
-                    if full_text:
-                        documents[paper_id] = {
-                            "full_text": full_text,
-                            "year": doc_data.get('year', 2024)
-                        }
-                except Exception as e:
-                    print(f"❌ Ошибка обработки PDF {paper_id}: {e}")
-                    # Fallback на аннотацию
+        local_texts = extract_local_texts([Path(doc_data['pdf_path']) for _, doc_data in pdf_papers],
+                                          cache, max_workers)
+        future_to_paper = {
+            submit(process_single_pdf_async(Path(doc_data['pdf_path']), cache, pdf_reader, local_texts)): (paper_id, doc_data) 
+            for paper_id, doc_data in pdf_papers
+        }
+        
+        for future in tqdm(concurrent.futures.as_completed(future_to_paper), 
+                         total=len(pdf_papers), desc="Обработка PDF файлов",
+                         position=0, leave=True):
+            paper_id, doc_data = future_to_paper[future]
+            try:
+                _, full_text, _ = future.result()
+                if full_text:
                     documents[paper_id] = {
-                        "full_text": doc_data.get('abstract', ''),
-                        "year": doc_data.get('year', 2024)
+                        "full_text": full_text,
+                        "year": doc_data.get('year', 2024),
+                        "pdf_path": doc_data.get('pdf_path')
                     }
+            except Exception as e:
+                print(f"❌ Ошибка обработки PDF {paper_id}: {e}")
+                # Fallback на аннотацию
+                documents[paper_id] = {
+                    "full_text": doc_data.get('abstract', ''),
+                    "year": doc_data.get('year', 2024)
+                }
     
     # Добавляем документы только с текстом
     for paper_id, doc_data in text_papers:
@@ -95,28 +132,31 @@ def load_pdf_directory(data_path, use_cache=True, max_workers=4):
     cache = CacheManager() if use_cache else None
     pdf_reader = SimplePDFReader()
     
-    print(f"🚀 Запускаем параллельную обработку {len(pdf_files)} PDF файлов (потоков: {max_workers})")
+    print(f"🚀 Запускаем параллельную обработку {len(pdf_files)} PDF файлов (процессов для локального текста: {max_workers})")
     
-    # Параллельная обработка PDF файлов
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_pdf = {
-            executor.submit(process_single_pdf, pdf_file, cache, pdf_reader): pdf_file 
-            for pdf_file in pdf_files
-        }
-        
-        for future in tqdm(concurrent.futures.as_completed(future_to_pdf), 
-                         total=len(pdf_files), desc="Обработка PDF файлов",
-                         position=0, leave=True):
-            pdf_file = future_to_pdf[future]
-            try:
-                paper_id, full_text, year = future.result()
-                if full_text:
-                    documents[paper_id] = {
-                        "full_text": full_text,
-                        "year": year
-                    }
-            except Exception as e:
-                print(f"❌ Ошибка обработки {pdf_file}: {e}")
+    # Сначала локальное извлечение текста (пул процессов), затем Gemini для остальных
+    local_texts = extract_local_texts(pdf_files, cache, max_workers)
+    
+    # Параллельная обработка PDF файлов: корутины в общем цикле событий вместо пула потоков
+    future_to_pdf = {
+        submit(process_single_pdf_async(pdf_file, cache, pdf_reader, local_texts)): pdf_file 
+        for pdf_file in pdf_files
+    }
+    
+    for future in tqdm(concurrent.futures.as_completed(future_to_pdf), 
+                     total=len(pdf_files), desc="Обработка PDF файлов",
+                     position=0, leave=True):
+        pdf_file = future_to_pdf[future]
+        try:
+            paper_id, full_text, year = future.result()
+            if full_text:
+                documents[paper_id] = {
+                    "full_text": full_text,
+                    "year": year,
+                    "pdf_path": str(pdf_file)
+                }
+        except Exception as e:
+            print(f"❌ Ошибка обработки {pdf_file}: {e}")
     
     print(f"✅ Загружено {len(documents)} PDF файлов")
     return documents
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Реестр PDF, загруженных в Gemini File API
+Каждый файл загружается один раз (по SHA-256 содержимого) и переиспользуется всеми этапами
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+try:
+    from google.genai import types
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: запись реестра блокируется только внутри процесса
+    FCNTL_AVAILABLE = False
+
+# Gemini хранит загруженные файлы 48 часов; берем запас, чтобы не сослаться на удаленный файл
+FILE_TTL = timedelta(hours=47)
+# Мелкие файлы дешевле передать прямо в запросе, чем загружать отдельно
+INLINE_MAX_BYTES = 512 * 1024
+# Признаки того, что файл на стороне Gemini уже удален или недоступен
+MISSING_FILE_MARKERS = ('404', 'NOT_FOUND', '403', 'PERMISSION_DENIED', 'not exist', 'expired')
+
+# Реестр лежит в main_pipeline/cache независимо от рабочей папки, чтобы его видели
+# и validation_pipe, и pipeline1 (путь можно переопределить переменной окружения).
+# Загруженные файлы видны только своему API ключу/проекту, поэтому у каждого
+# аккаунта свой файл реестра рядом с этим (см. account_scope)
+DEFAULT_REGISTRY_PATH = os.getenv(
+    'GEMINI_FILE_REGISTRY', str(Path(__file__).resolve().parent.parent / 'cache' / 'gemini_files.json')
+)
+
+
+class GeminiFileRegistry:
+    """
+    Хэш содержимого -> загруженный файл Gemini (имя, URI, срок жизни)
+
+    Реестр сохраняется в JSON, поэтому загрузки переживают перезапуск пайплайна
+    и общие для извлечения, валидации и суммаризации. Один реестр - один API ключ
+    (get_file_registry выбирает файл реестра по аккаунту клиента).
+    Несколько процессов могут работать с одним файлом: запись идет под файловой
+    блокировкой и сливается с тем, что на диске (см. _save).
+    """
+
+    def __init__(self, files_api, registry_path: str = DEFAULT_REGISTRY_PATH,
+                 inline_max_bytes: int = INLINE_MAX_BYTES, poll_interval: float = 1.0):
+        """
+        Args:
+            files_api: client.files из google-genai (или FakeFileAPI в тестах)
+            registry_path: JSON файл реестра
+            inline_max_bytes: файлы не больше этого размера передаются inline
+        """
+        self.files_api = files_api
+        self.registry_path = Path(registry_path)
+        self.inline_max_bytes = inline_max_bytes
+        self.poll_interval = poll_interval
+        self.uploads = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._digest_locks = {}
+        # Записи, забытые этим процессом (digest -> имя файла): при слиянии не возвращаются с диска
+        self._removed = {}
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            if self.registry_path.exists():
+                with open(self.registry_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Ошибка чтения реестра файлов Gemini: {e}")
+        return {}
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка реестра через lock-файл рядом с ним"""
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self.registry_path.with_name(self.registry_path.name + ".lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merged(self, on_disk: dict) -> dict:
+        """Записи с диска + записи процесса; для одного файла побеждает более поздний срок жизни"""
+        merged = dict(on_disk)
+        for digest, name in self._removed.items():
+            if merged.get(digest, {}).get('name') == name:
+                del merged[digest]
+        for digest, entry in self._entries.items():
+            current = merged.get(digest)
+            if current is None or entry['expires_at'] > current['expires_at']:
+                merged[digest] = entry
+        return merged
+
+    def _refresh(self):
+        """Подхватывает загрузки других процессов (вызывается под self._lock)"""
+        self._entries = self._merged(self._load())
+
+    def _save(self):
+        """
+        Записывает реестр, не теряя записи других процессов (вызывается под self._lock)
+
+        Под файловой блокировкой реестр перечитывается с диска и сливается с записями
+        процесса, затем атомарно заменяется через временный файл.
+        """
+        with self._file_lock():
+            self._refresh()
+            self._removed.clear()
+            tmp_path = self.registry_path.with_name(f"{self.registry_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.registry_path)
+
+    def _digest_lock(self, digest: str) -> threading.Lock:
+        """Блокировка на файл: параллельные этапы не загружают один PDF дважды"""
+        with self._lock:
+            return self._digest_locks.setdefault(digest, threading.Lock())
+
+    @staticmethod
+    def _expires_at(uploaded) -> float:
+        expiration = getattr(uploaded, 'expiration_time', None)
+        if isinstance(expiration, datetime):
+            # Срок от сервера тоже сокращаем на час - часы машины могут расходиться
+            return (expiration - timedelta(hours=1)).timestamp()
+        return (datetime.now(timezone.utc) + FILE_TTL).timestamp()
+
+    def _wait_active(self, uploaded):
+        """Ждет окончания обработки файла на стороне Gemini"""
+        while str(getattr(uploaded, 'state', '') or '').upper().endswith('PROCESSING'):
+            time.sleep(self.poll_interval)
+            uploaded = self.files_api.get(name=uploaded.name)
+        if str(getattr(uploaded, 'state', '') or '').upper().endswith('FAILED'):
+            raise RuntimeError(f"Gemini не смог обработать файл {uploaded.name}")
+        return uploaded
+
+    def get_part(self, source, mime_type: str = 'application/pdf'):
+        """
+        Возвращает часть запроса для generate_content
+
+        Args:
+            source: путь к файлу или его байты
+
+        Returns:
+            types.Part: inline-байты для мелких файлов, иначе ссылка на загруженный файл
+        """
+        data = source if isinstance(source, (bytes, bytearray)) else Path(source).read_bytes()
+        if len(data) <= self.inline_max_bytes:
+            return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._digest_lock(digest):
+            entry = self._entries.get(digest)
+            if not (entry and entry['expires_at'] > time.time()):
+                # Файл мог загрузить другой процесс - перечитать реестр дешевле, чем загрузить заново
+                with self._lock:
+                    self._refresh()
+                    entry = self._entries.get(digest)
+            if entry and entry['expires_at'] > time.time():
+                with self._lock:
+                    self.reused += 1
+                return types.Part.from_uri(file_uri=entry['uri'], mime_type=entry['mime_type'])
+
+            display_name = Path(source).name if not isinstance(source, (bytes, bytearray)) else digest[:16]
+            uploaded = self.files_api.upload(
+                file=io.BytesIO(data),
+                config={'mime_type': mime_type, 'display_name': display_name}
+            )
+            uploaded = self._wait_active(uploaded)
+            with self._lock:
+                self.uploads += 1
+                self._entries[digest] = {
+                    'name': uploaded.name,
+                    'uri': uploaded.uri,
+                    'mime_type': mime_type,
+                    'size': len(data),
+                    'expires_at': self._expires_at(uploaded),
+                }
+                self._save()
+            return types.Part.from_uri(file_uri=uploaded.uri, mime_type=mime_type)
+
+    def invalidate(self, source):
+        """Забывает загрузку файла (например, если Gemini удалил его раньше срока)"""
+        data = source if isinstance(source, (bytes, bytearray)) else Path(source).read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if entry is not None:
+                self._removed[digest] = entry['name']
+                self._save()
+
+    def with_file(self, source, func, mime_type: str = 'application/pdf'):
+        """
+        Вызывает func(part) с частью запроса для файла
+
+        Если ссылка на загруженный файл оказалась недействительной, файл
+        загружается заново и вызов повторяется один раз.
+        """
+        return self.with_files([source], lambda parts: func(parts[0]), mime_type)
+
+    def with_files(self, sources: list, func, mime_type: str = 'application/pdf'):
+        """
+        Вызывает func(parts) с частями запроса для нескольких файлов (в порядке sources)
+
+        Если какая-то ссылка оказалась недействительной, все загруженные файлы
+        запроса загружаются заново и вызов повторяется один раз.
+        """
+        parts = [self.get_part(source, mime_type) for source in sources]
+        try:
+            return func(parts)
+        except Exception as e:
+            uploaded = [source for source, part in zip(sources, parts) if getattr(part, 'file_data', None) is not None]
+            if not uploaded or not any(marker in str(e) for marker in MISSING_FILE_MARKERS):
+                raise
+            for source in uploaded:
+                self.invalidate(source)
+            return func([self.get_part(source, mime_type) for source in sources])
+
+    async def with_file_async(self, source, func, mime_type: str = 'application/pdf'):
+        """
+        Асинхронный with_file: await func(part)
+
+        Чтение файла и загрузка в File API (редкая, один раз на файл) идут в потоке,
+        чтобы не останавливать цикл событий.
+        """
+        part = await asyncio.to_thread(self.get_part, source, mime_type)
+        try:
+            return await func(part)
+        except Exception as e:
+            is_uploaded = getattr(part, 'file_data', None) is not None
+            if not is_uploaded or not any(marker in str(e) for marker in MISSING_FILE_MARKERS):
+                raise
+            await asyncio.to_thread(self.invalidate, source)
+            return await func(await asyncio.to_thread(self.get_part, source, mime_type))
+
+    def purge_expired(self) -> int:
+        """Удаляет из реестра просроченные записи, возвращает их количество"""
+        now = time.time()
+        with self._lock:
+            expired = [digest for digest, entry in self._entries.items() if entry['expires_at'] <= now]
+            for digest in expired:
+                self._removed[digest] = self._entries.pop(digest)['name']
+            if expired:
+                self._save()
+        return len(expired)
+
+
+class FakeFileAPI:
+    """
+    Локальная замена client.files для тестов без сети
+
+    Считает загрузки и хранит содержимое в памяти; state сразу ACTIVE.
+    """
+
+    def __init__(self, ttl: timedelta = timedelta(hours=48)):
+        self.ttl = ttl
+        self.files = {}
+        self.upload_count = 0
+
+    def upload(self, file, config=None):
+        config = config or {}
+        data = file.read() if hasattr(file, 'read') else Path(file).read_bytes()
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        uploaded = SimpleNamespace(
+            name=name,
+            uri=f"https://fake.googleapis.com/v1beta/{name}",
+            mime_type=config.get('mime_type', 'application/pdf'),
+            display_name=config.get('display_name'),
+            size_bytes=len(data),
+            state='ACTIVE',
+            expiration_time=datetime.now(timezone.utc) + self.ttl,
+        )
+        self.files[name] = (uploaded, data)
+        self.upload_count += 1
+        return uploaded
+
+    def get(self, name):
+        if name not in self.files:
+            raise FileNotFoundError(f"404 NOT_FOUND: {name}")
+        return self.files[name][0]
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def account_scope(client) -> str:
+    """
+    Короткий отпечаток аккаунта клиента: хэш API ключа или проекта Vertex AI
+
+    Сам ключ в имя файла не попадает. Пустая строка - аккаунт определить не удалось.
+    """
+    api_client = getattr(client, '_api_client', None)
+    identity = getattr(api_client, 'api_key', None) or ':'.join(
+        str(getattr(api_client, attr, None) or '') for attr in ('project', 'location'))
+    if not identity.strip(':'):
+        return ''
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+
+
+def get_file_registry(client, registry_path: str = DEFAULT_REGISTRY_PATH) -> GeminiFileRegistry:
+    """
+    Общий на процесс реестр аккаунта клиента (все читатели PDF видят одни загрузки)
+
+    Файл реестра - registry_path с отпечатком аккаунта в имени:
+    gemini_files.json -> gemini_files.<scope>.json
+    """
+    scope = account_scope(client)
+    if scope:
+        path = Path(registry_path)
+        registry_path = str(path.with_name(f"{path.stem}.{scope}{path.suffix}"))
+    key = str(Path(registry_path).resolve())
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = GeminiFileRegistry(client.files, registry_path)
+        return registry
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное извлечение текста из PDF (без вызовов API)
+pypdf/pdfminer + сегментация по разделам + оценка качества текста.
+В Gemini отправляются только сканы и PDF с испорченным текстовым слоем.
+"""
+
+import os
+import re
+import concurrent.futures
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List
+
+# Обе библиотеки опциональны: без них все PDF читаются через Gemini
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+try:
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
+    PDFMINER_AVAILABLE = True
+except ImportError:
+    PDFMINER_AVAILABLE = False
+
+LOCAL_PDF_AVAILABLE = PYPDF_AVAILABLE or PDFMINER_AVAILABLE
+
+# Текст с оценкой ниже порога считается непригодным (скан, битая кодировка шрифтов)
+MIN_TEXT_QUALITY = 0.6
+# Меньше стольких символов на страницу - почти наверняка скан без текстового слоя
+MIN_CHARS_PER_PAGE = 500
+
+# Заголовки разделов научной статьи: отдельная строка, опционально с номером ("2.", "II.")
+SECTION_PATTERNS = [
+    ('Abstract', r'abstract|summary'),
+    ('Introduction', r'introduction|background'),
+    ('Methods', r'(?:materials\s+and\s+)?methods?|methodology|experimental\s+(?:procedures|section)|star\s*methods'),
+    ('Results', r'results(?:\s+and\s+discussion)?'),
+    ('Discussion', r'discussion'),
+    ('Conclusion', r'conclusions?|concluding\s+remarks'),
+    ('References', r'references|bibliography|literature\s+cited'),
+]
+_HEADING = re.compile(
+    r'^[ \t]*(?:[0-9]{1,2}\.?|[IVX]{1,4}\.)?[ \t]*(?:' +
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in SECTION_PATTERNS) +
+    r')[ \t]*[:.]?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+_WORD = re.compile(r'[A-Za-z]+')
+_VOWEL = re.compile(r'[aeiouyAEIOUY]')
+_CID_ARTIFACT = re.compile(r'\(cid:\d+\)')
+
+
+def _extract_with_pypdf(pdf_path: Path):
+    reader = PdfReader(str(pdf_path))
+    pages = [page.extract_text() or '' for page in reader.pages]
+    return '\n'.join(pages), len(pages)
+
+
+def _extract_with_pdfminer(pdf_path: Path):
+    text = pdfminer_extract_text(str(pdf_path))
+    # pdfminer разделяет страницы символом form feed
+    return text, max(text.count('\f'), 1)
+
+
+def text_quality_score(text: str, num_pages: int) -> float:
+    """
+    Оценка пригодности извлеченного текста от 0 до 1
+
+    Учитывает плотность текста на страницу (сканы), долю нормальных слов
+    (битые шрифты дают "слова" без гласных) и артефакты (cid:NN) / символы замены.
+    """
+    if not text or not text.strip():
+        return 0.0
+
+    density = min(1.0, len(text) / (max(num_pages, 1) * MIN_CHARS_PER_PAGE))
+
+    words = _WORD.findall(text)
+    if not words:
+        return 0.0
+    sample = words[:20000]
+    wordlike = sum(1 for w in sample if len(w) <= 25 and (_VOWEL.search(w) or len(w) <= 3)) / len(sample)
+
+    printable = sum(1 for ch in text[:200000] if ch.isprintable() or ch in '\n\t\f') / min(len(text), 200000)
+    artifacts = (len(_CID_ARTIFACT.findall(text)) * 8 + text.count('�')) / len(text)
+    cleanliness = max(0.0, printable - artifacts * 10)
+
+    # Плотность - множитель: почти пустой текстовый слой не спасают "чистые" слова
+    return round(density * (wordlike * 0.7 + cleanliness * 0.3), 3)
+
+
+def segment_sections(text: str) -> Dict[str, str]:
+    """
+    Делит текст статьи на разделы по заголовкам
+
+    Returns:
+        {'Preamble': ..., 'Abstract': ..., 'Methods': ..., ...} в порядке появления.
+        Повторный заголовок того же раздела дописывается к нему; References отбрасывается.
+    """
+    sections = {}
+    current, start = 'Preamble', 0
+    for match in _HEADING.finditer(text):
+        name = match.lastgroup
+        chunk = text[start:match.start()].strip()
+        if chunk:
+            sections[current] = (sections.get(current, '') + '\n' + chunk).strip()
+        current, start = name, match.end()
+    chunk = text[start:].strip()
+    if chunk:
+        sections[current] = (sections.get(current, '') + '\n' + chunk).strip()
+    sections.pop('References', None)
+    return sections
+
+
+def extract_pdf_local(pdf_path) -> dict:
+    """
+    Извлекает текст одного PDF локально (функция верхнего уровня - для пула процессов)
+
+    Returns:
+        {'path', 'text', 'pages', 'quality', 'method', 'error'}
+    """
+    pdf_path = Path(pdf_path)
+    result = {'path': str(pdf_path), 'text': '', 'pages': 0, 'quality': 0.0, 'method': None, 'error': None}
+    extractors = []
+    if PYPDF_AVAILABLE:
+        extractors.append(('pypdf', _extract_with_pypdf))
+    if PDFMINER_AVAILABLE:
+        extractors.append(('pdfminer', _extract_with_pdfminer))
+
+    for method, extractor in extractors:
+        try:
+            text, pages = extractor(pdf_path)
+        except Exception as e:
+            result['error'] = f"{method}: {e}"
+            continue
+        quality = text_quality_score(text, pages)
+        if quality > result['quality']:
+            result.update(text=text, pages=pages, quality=quality, method=method, error=None)
+        # pdfminer медленнее - пробуем его, только если pypdf дал плохой текст
+        if quality >= MIN_TEXT_QUALITY:
+            break
+    return result
+
+
+def extract_many_local(pdf_paths: List, max_workers: int = 4) -> Dict[str, dict]:
+    """
+    Параллельно извлекает текст из многих PDF в пуле процессов (разбор PDF упирается в CPU)
+
+    Returns:
+        {str(path): результат extract_pdf_local}
+    """
+    pdf_paths = [str(p) for p in pdf_paths]
+    if not LOCAL_PDF_AVAILABLE or not pdf_paths:
+        return {}
+    # Процессов больше, чем ядер, не нужно - в отличие от потоков для API
+    max_workers = max(1, min(max_workers, os.cpu_count() or 1, len(pdf_paths)))
+    # spawn, а не fork: в родителе уже работают поток асинхронного рантайма и соединения
+    # SQLite, копия их блокировок в дочернем процессе может повиснуть навсегда
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = executor.map(extract_pdf_local, pdf_paths, chunksize=max(1, len(pdf_paths) // (max_workers * 4)))
+        return {result['path']: result for result in results}
+
+
+def is_usable(result: dict, min_quality: float = MIN_TEXT_QUALITY) -> bool:
+    """Можно ли обойтись локальным текстом без Gemini"""
+    return bool(result) and result['quality'] >= min_quality
@@ -4,11 +4,19 @@
 Простые классы для чтения PDF и управления кэшем
 """
 
-import os
+import asyncio
 import json
+import os
 import threading
+import time
 from pathlib import Path
 
+from core.rate_limiter import get_rate_limiter, estimate_tokens
+from core.async_runtime import run_sync
+from .result_store import ResultStore, migrate_json_cache
+from .file_registry import get_file_registry
+from .local_pdf import LOCAL_PDF_AVAILABLE, extract_pdf_local, is_usable
+
 # Проверяем доступность PDF модуля
 try:
     from google import genai
@@ -21,46 +29,80 @@ except ImportError:
 class SimplePDFReader:
     """Простой класс для чтения PDF с помощью Gemini"""
     
-    def __init__(self):
+    def __init__(self, extraction_mode: str = "single_pass", max_schema_retries: int = 2):
+        """
+        Args:
+            extraction_mode: "single_pass" (JSON по схеме за один вызов) или "two_pass" (текст + разбор)
+            max_schema_retries: сколько раз переспрашивать модель при ответе не по схеме
+        """
+        self.extraction_mode = extraction_mode
+        self.max_schema_retries = max_schema_retries
+        self.stats = ExtractionStats()
         if GENAI_AVAILABLE:
             self.client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+            # PDF загружается в File API один раз и переиспользуется всеми этапами
+            self.files = get_file_registry(self.client)
         else:
             self.client = None
+            self.files = None
     
-    def read_pdf(self, pdf_path: str) -> str:
-        """Читает текст из PDF файла (устаревший метод)"""
+    def read_pdf(self, pdf_path: str, try_local: bool = True) -> str:
+        """Синхронный фасад над read_pdf_async"""
+        return run_sync(self.read_pdf_async(pdf_path, try_local))
+    
+    async def read_pdf_async(self, pdf_path: str, try_local: bool = True) -> str:
+        """
+        Читает текст из PDF файла
+        
+        Сначала текст извлекается локально (pypdf/pdfminer); Gemini используется только
+        для сканов и PDF с испорченным текстовым слоем. try_local=False - сразу Gemini.
+        """
+        if try_local and LOCAL_PDF_AVAILABLE:
+            # Разбор PDF занимает CPU - в потоке, чтобы не останавливать цикл событий
+            local_result = await asyncio.to_thread(extract_pdf_local, pdf_path)
+            if is_usable(local_result):
+                return local_result['text']
+        
         if not self.client:
             return "PDF reader недоступен - установите google-genai"
         
         try:
             pdf_path = Path(pdf_path)
-            pdf_data = pdf_path.read_bytes()
             
             prompt = """Extract ALL text from the scientific PDF. 
             Include: introduction, methods, results, discussion, conclusion.
             DO NOT summarize - full text is needed!
             CRITICAL: All extracted text MUST be in English only."""
             
-            response = self.client.models.generate_content(
+            response = await self.files.with_file_async(pdf_path, lambda pdf_part: get_rate_limiter("gemini-2.0-flash").acall(
+                self.client.aio.models.generate_content,
                 model="gemini-2.0-flash",
-                contents=[
-                    types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'),
-                    prompt
-                ]
-            )
+                contents=[pdf_part, prompt]
+            ))
             return response.text
         except Exception as e:
             print(f"⚠️ Ошибка чтения PDF {pdf_path}: {e}")
             return ""
 
     def extract_concepts_from_pdf(self, pdf_path: str, paper_id: str):
-        """Сразу извлекает концепты и сущности из PDF без промежуточного текста"""
+        """Синхронный фасад над extract_concepts_from_pdf_async"""
+        return run_sync(self.extract_concepts_from_pdf_async(pdf_path, paper_id))
+
+    async def extract_concepts_from_pdf_async(self, pdf_path: str, paper_id: str):
+        """
+        Сразу извлекает концепты и сущности из PDF без промежуточного текста
+        
+        single_pass: один вызов Gemini с JSON-схемой ExtractedKnowledge (повтор только при ошибке схемы)
+        two_pass: свободный текст по PDF, затем разбор текста через instructor (старый режим)
+        """
         if not self.client:
             return None
         
+        start = time.perf_counter()
+        usage = {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0}
+        knowledge = None
         try:
             pdf_path = Path(pdf_path)
-            pdf_data = pdf_path.read_bytes()
             
             prompt = f"""
             You are an expert in scientific research methodology and bioinformatics.
@@ -86,68 +128,191 @@ class SimplePDFReader:
             Paper ID: {paper_id}
             """
             
-            # Импортируем здесь чтобы избежать циклического импорта
-            from core.models import ExtractedKnowledge
-            from config import llm_extractor_client
-            
-            # Используем прямой API Gemini для мультимодальности
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[
-                    types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'),
-                    prompt
-                ]
-            )
-            
-            # Парсим ответ через instructor
-            parsed_response = llm_extractor_client.chat.completions.create(
-                messages=[{"role": "user", "content": f"Analyze this text and return structured data. CRITICAL: All text fields must be in English only:\n\n{response.text}"}],
-                response_model=ExtractedKnowledge
-            )
-            parsed_response.paper_id = paper_id
-            return parsed_response
+            if self.extraction_mode == "two_pass":
+                knowledge = await self._extract_two_pass(pdf_path, prompt, usage)
+            else:
+                knowledge = await self._extract_single_pass(pdf_path, prompt, usage)
+            knowledge.paper_id = paper_id
+            return knowledge
             
         except Exception as e:
             print(f"⚠️ Ошибка извлечения концептов из PDF {pdf_path}: {e}")
             return None
+        finally:
+            self.stats.record(paper_id, self.extraction_mode, time.perf_counter() - start,
+                              success=bool(knowledge and knowledge.concepts), **usage)
+
+    async def _extract_single_pass(self, pdf_path: Path, prompt: str, usage: dict):
+        """Один вызов: Gemini возвращает JSON по схеме ExtractedKnowledge, проверка - локально"""
+        from core.models import ExtractedKnowledge
+        
+        limiter = get_rate_limiter("gemini-2.0-flash")
+        retry_note = []
+        last_error = None
+        for _ in range(self.max_schema_retries + 1):
+            response = await self.files.with_file_async(pdf_path, lambda pdf_part: limiter.acall(
+                self.client.aio.models.generate_content,
+                model="gemini-2.0-flash",
+                contents=[pdf_part, prompt, *retry_note],
+                config={
+                    "response_mime_type": "application/json",
+                    "response_schema": ExtractedKnowledge,
+                }
+            ))
+            _add_usage(usage, response)
+            try:
+                return ExtractedKnowledge.model_validate_json(response.text or "")
+            except ValueError as e:
+                # Переспрашиваем только при ошибке схемы, показывая модели ее же ответ и ошибку
+                last_error = e
+                retry_note = [
+                    f"Your previous answer did not match the ExtractedKnowledge schema:\n{str(e)[:2000]}\n"
+                    f"Previous answer:\n{(response.text or '')[:4000]}\n"
+                    "Return the corrected JSON only."
+                ]
+        raise ValueError(f"ответ не соответствует схеме после {self.max_schema_retries + 1} попыток: {last_error}")
+
+    async def _extract_two_pass(self, pdf_path: Path, prompt: str, usage: dict):
+        """Два вызова: свободный текст по PDF, затем разбор текста в ExtractedKnowledge через instructor"""
+        # Импортируем здесь чтобы избежать циклического импорта
+        from core.models import ExtractedKnowledge
+        from config import llm_extractor_aclient
+        
+        # Используем прямой API Gemini для мультимодальности
+        response = await self.files.with_file_async(pdf_path, lambda pdf_part: get_rate_limiter("gemini-2.0-flash").acall(
+            self.client.aio.models.generate_content,
+            model="gemini-2.0-flash",
+            contents=[pdf_part, prompt]
+        ))
+        _add_usage(usage, response)
+        
+        # Парсим ответ через instructor
+        parse_prompt = f"Analyze this text and return structured data. CRITICAL: All text fields must be in English only:\n\n{response.text}"
+        parsed_response = await llm_extractor_aclient.chat.completions.create(
+            messages=[{"role": "user", "content": parse_prompt}],
+            response_model=ExtractedKnowledge
+        )
+        # instructor не отдает usage через обертки клиента - токены второго вызова оцениваются
+        usage['calls'] += 1
+        usage['prompt_tokens'] += estimate_tokens(parse_prompt)
+        usage['output_tokens'] += estimate_tokens(parsed_response.model_dump_json())
+        return parsed_response
+
+
+def _add_usage(usage: dict, response):
+    """Добавляет к счетчикам фактические токены из usage_metadata ответа Gemini"""
+    usage['calls'] += 1
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is not None:
+        usage['prompt_tokens'] += metadata.prompt_token_count or 0
+        usage['output_tokens'] += metadata.candidates_token_count or 0
+
+
+class ExtractionStats:
+    """
+    Статистика извлечения по статьям: задержка, число вызовов LLM и токены
+    
+    Каждая запись дописывается в JSONL, поэтому запуски в разных режимах можно сравнить.
+    """
+    
+    def __init__(self, stats_file: str = "cache/extraction_stats.jsonl"):
+        self.stats_file = Path(stats_file)
+        self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+        self.records = []
+        self._lock = threading.Lock()
+    
+    def record(self, paper_id: str, mode: str, latency: float, calls: int = 0,
+               prompt_tokens: int = 0, output_tokens: int = 0, success: bool = True):
+        record = {
+            'paper_id': paper_id,
+            'mode': mode,
+            'latency': round(latency, 3),
+            'calls': calls,
+            'prompt_tokens': prompt_tokens,
+            'output_tokens': output_tokens,
+            'success': success,
+        }
+        with self._lock:
+            self.records.append(record)
+            with open(self.stats_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def load_all(self) -> list:
+        """Все записи из файла статистики (включая прошлые запуски)"""
+        if not self.stats_file.exists():
+            return []
+        with open(self.stats_file, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
+    @staticmethod
+    def summarize(records: list) -> dict:
+        """Средние показатели на статью по режимам"""
+        by_mode = {}
+        for record in records:
+            by_mode.setdefault(record['mode'], []).append(record)
+        summary = {}
+        for mode, mode_records in by_mode.items():
+            n = len(mode_records)
+            summary[mode] = {
+                'papers': n,
+                'success_rate': sum(r['success'] for r in mode_records) / n,
+                'avg_latency': sum(r['latency'] for r in mode_records) / n,
+                'avg_calls': sum(r['calls'] for r in mode_records) / n,
+                'avg_prompt_tokens': sum(r['prompt_tokens'] for r in mode_records) / n,
+                'avg_output_tokens': sum(r['output_tokens'] for r in mode_records) / n,
+            }
+        return summary
+    
+    def print_summary(self, all_runs: bool = False):
+        """Печатает сравнение режимов (all_runs=True - по всем запускам из файла)"""
+        records = self.load_all() if all_runs else self.records
+        for mode, s in self.summarize(records).items():
+            print(f"   ⏱️ {mode}: {s['papers']} статей, {s['avg_latency']:.1f} сек/статья, "
+                  f"{s['avg_calls']:.1f} вызовов, токены: {s['avg_prompt_tokens']:.0f} вход / "
+                  f"{s['avg_output_tokens']:.0f} выход, успешно {s['success_rate']:.0%}")
 
 class CacheManager:
-    """Простой менеджер кэша для PDF текстов"""
+    """Менеджер кэша для PDF текстов и извлеченных знаний поверх SQLite-хранилища"""
+    
+    PDF_TEXTS = "pdf_texts"
+    KNOWLEDGE = "extracted_knowledge"
     
     def __init__(self, cache_dir: str = "cache"):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         
+        # Каждая запись хранится отдельно, поэтому запись не переписывает весь кэш
+        self.store = ResultStore(self.cache_dir / "results.sqlite")
+        
+        # Миграция со старого формата (один большой JSON файл на кэш)
         self.pdf_cache_file = self.cache_dir / "pdf_texts.json"
-        self.pdf_cache = self._load_cache()
-        # Блокировка для потокобезопасности
-        self._lock = threading.Lock()
-    
-    def _load_cache(self):
-        """Загружает кэш из файла"""
-        try:
-            if self.pdf_cache_file.exists():
-                with open(self.pdf_cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except:
-            pass
-        return {}
-    
-    def _save_cache(self):
-        """Сохраняет кэш в файл"""
-        with self._lock:
-            with open(self.pdf_cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.pdf_cache, f, ensure_ascii=False, indent=2)
+        self.knowledge_cache_file = self.cache_dir / "extracted_knowledge.json"
+        migrate_json_cache(self.store, self.pdf_cache_file, self.PDF_TEXTS)
+        migrate_json_cache(self.store, self.knowledge_cache_file, self.KNOWLEDGE, encode_values=True)
     
     def get_pdf_text(self, pdf_path: str) -> str:
         """Получает текст PDF из кэша"""
         file_key = f"{Path(pdf_path).name}_{os.path.getmtime(pdf_path)}"
-        with self._lock:
-            return self.pdf_cache.get(file_key, "")
+        return self.store.get(self.PDF_TEXTS, file_key) or ""
     
     def save_pdf_text(self, pdf_path: str, text: str):
         """Сохраняет текст PDF в кэш"""
         file_key = f"{Path(pdf_path).name}_{os.path.getmtime(pdf_path)}"
-        with self._lock:
-            self.pdf_cache[file_key] = text
-        self._save_cache() 
\ No newline at end of file
+        self.store.put(self.PDF_TEXTS, file_key, text)
+    
+    def get_extracted_knowledge(self, content_hash: str):
+        """Получает ExtractedKnowledge статьи по хэшу её содержимого"""
+        data = self.store.get(self.KNOWLEDGE, content_hash)
+        if not data:
+            return None
+        
+        from core.models import ExtractedKnowledge
+        try:
+            return ExtractedKnowledge.model_validate_json(data)
+        except Exception as e:
+            print(f"⚠️ Поврежденная запись кэша знаний {content_hash[:12]}: {e}")
+            return None
+    
+    def save_extracted_knowledge(self, content_hash: str, knowledge):
+        """Сохраняет ExtractedKnowledge статьи по хэшу её содержимого"""
+        self.store.put(self.KNOWLEDGE, content_hash, knowledge.model_dump_json())
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Встроенное хранилище результатов обработки на SQLite
+Ключ-значение по пространствам имен: тексты PDF, извлеченные знания и т.д.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+class ResultStore:
+    """
+    Простое key-value хранилище в SQLite (режим WAL)
+
+    Каждая запись - отдельная строка, поэтому get/put не зависят от размера кэша.
+    WAL позволяет читать параллельно с записью, у каждого потока своё соединение.
+    """
+
+    def __init__(self, db_path: str = "cache/results.sqlite"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока (создает при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """Получает значение по ключу или None"""
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, namespace: str, key: str, value: str):
+        """Сохраняет (или перезаписывает) значение по ключу"""
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, time.time())
+        )
+        conn.commit()
+
+    def put_many(self, namespace: str, items: Iterable[Tuple[str, str]]) -> int:
+        """Сохраняет много записей одной транзакцией, возвращает их количество"""
+        now = time.time()
+        rows = [(namespace, key, value, now) for key, value in items]
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+        return len(rows)
+
+    def delete(self, namespace: str, key: str):
+        """Удаляет запись"""
+        conn = self._connect()
+        conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        conn.commit()
+
+    def count(self, namespace: str) -> int:
+        """Количество записей в пространстве имен"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0]
+
+    def close(self):
+        """Закрывает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate_json_cache(store: ResultStore, json_file: Path, namespace: str, encode_values: bool = False) -> int:
+    """
+    Переносит старый монолитный JSON-кэш в хранилище
+
+    После успешного переноса файл переименовывается в *.migrated, чтобы не импортировать его повторно.
+
+    Args:
+        store: Хранилище результатов
+        json_file: Старый JSON файл вида {ключ: значение}
+        namespace: Пространство имен для записей
+        encode_values: Сериализовать значения в JSON (для словарей)
+
+    Returns:
+        Количество перенесенных записей
+    """
+    json_file = Path(json_file)
+    if not json_file.exists():
+        return 0
+
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data: Dict = json.load(f)
+
+        items = ((key, json.dumps(value, ensure_ascii=False) if encode_values else value)
+                 for key, value in data.items())
+        migrated = store.put_many(namespace, items)
+        json_file.rename(json_file.with_name(json_file.name + ".migrated"))
+        print(f"📦 Перенесено {migrated} записей из {json_file} в {store.db_path}")
+        return migrated
+    except Exception as e:
+        print(f"⚠️ Ошибка миграции кэша {json_file}: {e}")
+        return 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Тест журнала сборки графа: воспроизведение, возобновление и принудительная пересборка
+Извлечение концептов подменяется фейком - вызовы API не выполняются
+"""
+
+from graph.build_journal import BuildJournal
+from graph.knowledge_graph import ScientificKnowledgeGraph
+from core.models import ExtractedKnowledge, ScientificConcept
+
+def _knowledge(paper_id: str) -> ExtractedKnowledge:
+    return ExtractedKnowledge(paper_id=paper_id, concepts=[
+        ScientificConcept(concept_type="Hypothesis", statement=f"{paper_id} hypothesis")
+    ])
+
+def _documents(count: int = 3) -> dict:
+    return {f"P{i}": {'full_text': f"text of paper {i}", 'year': 2024} for i in range(count)}
+
+def test_replay_skips_truncated_line(tmp_path):
+    """Оборванная при сбое последняя строка не ломает воспроизведение"""
+    journal = BuildJournal(str(tmp_path / "journal.jsonl"))
+    journal.open(truncate=True)
+    journal.append("P0", "text", 2024, _knowledge("P0"), "hash0")
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"paper_id": "P1", "knowl')
+
+    records = journal.replay()
+    assert list(records) == ["P0"]
+    text, year, knowledge, content_hash = records["P0"]
+    assert (text, year, content_hash) == ("text", 2024, "hash0")
+    assert knowledge.concepts[0].statement == "P0 hypothesis"
+
+def test_resume_after_interrupted_build(tmp_path, monkeypatch, fake_graph):
+    """Статьи из журнала прерванной сборки не извлекаются повторно"""
+    monkeypatch.chdir(tmp_path)
+    journal_path = str(tmp_path / "journal.jsonl")
+    documents = _documents()
+
+    # Прерванная сборка успела записать в журнал одну статью
+    skg = ScientificKnowledgeGraph()
+    journal = BuildJournal(journal_path)
+    journal.open(truncate=True)
+    journal.append("P0", "text of paper 0", 2024, _knowledge("P0"), skg._compute_content_hash(documents["P0"]))
+    journal.close()
+
+    calls = []
+    skg = fake_graph(calls)
+    skg.build_graph(documents, resume=True, journal_path=journal_path)
+    assert sorted(calls) == ["P1", "P2"]
+    assert skg.get_graph_stats()['papers'] == 3
+
+def test_successful_build_clears_journal(tmp_path, monkeypatch, fake_graph):
+    """После успешной сборки журнал удаляется - он не растет между запусками"""
+    monkeypatch.chdir(tmp_path)
+    journal_path = tmp_path / "journal.jsonl"
+    for streaming in (False, True):
+        calls = []
+        fake_graph(calls).build_graph(_documents(), streaming=streaming, resume=True, journal_path=str(journal_path))
+        assert len(calls) == 3
+        assert not journal_path.exists()
+
+def test_force_rebuild_after_build_extracts_again(tmp_path, monkeypatch, fake_graph):
+    """Принудительная пересборка после обычной сборки извлекает все статьи заново"""
+    monkeypatch.chdir(tmp_path)
+    journal_path = str(tmp_path / "journal.jsonl")
+    documents = _documents()
+
+    fake_graph([]).build_graph(documents, resume=True, journal_path=journal_path)
+
+    calls = []
+    fake_graph(calls).build_graph(documents, force_rebuild_normalization=True, resume=True, journal_path=journal_path)
+    assert sorted(calls) == ["P0", "P1", "P2"]
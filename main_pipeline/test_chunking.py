@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Тест фрагментации длинных статей и слияния концептов из фрагментов - без вызовов API
+"""
+
+from processing.chunking import CHARS_PER_TOKEN, merge_concepts, split_into_chunks
+from core.models import MentionedEntity, ScientificConcept
+
+def _concept(statement, concept_type="Result", entities=()):
+    return ScientificConcept(concept_type=concept_type, statement=statement,
+                             mentioned_entities=[MentionedEntity(name=name, type="Gene") for name in entities])
+
+def test_split_into_chunks_respects_budget():
+    """Фрагменты не длиннее бюджета, текст не теряется, References отбрасывается"""
+    text = ("Abstract\nShort abstract here.\nIntroduction\n" + "Intro sentence. " * 200 +
+            "\nMethods\n" + "Method line.\n" * 100 + "References\n[1] Ref one.\n")
+    chunks = split_into_chunks(text, max_tokens=300)
+
+    assert len(chunks) > 1
+    assert all(len(chunk['text']) <= 300 * CHARS_PER_TOKEN for chunk in chunks)
+    assert [section for chunk in chunks for section in chunk['sections']][0] == 'Abstract'
+    assert sum(chunk['text'].count("Method line.") for chunk in chunks) == 100
+    assert not any("Ref one" in chunk['text'] for chunk in chunks)
+
+def test_merge_concepts_deduplicates_across_chunks():
+    """Дубликаты одного типа сливаются: остается полная формулировка, сущности объединяются"""
+    merged = merge_concepts([
+        [_concept("SIRT1 activation extends lifespan in mice.", entities=["SIRT1"]),
+         _concept("Rapamycin was given at 14 mg/kg", concept_type="Method", entities=["mTOR"])],
+        [_concept("SIRT1 activation extends lifespan in mice", entities=["sirt1", "NAD"]),
+         _concept("SIRT1 activation extends lifespan in male mice", entities=["FOXO3"])],
+    ])
+
+    results = [c for c in merged if c.concept_type == "Result"]
+    assert len(merged) == 2 and len(results) == 1
+    assert results[0].statement == "SIRT1 activation extends lifespan in male mice"
+    assert {e.name for e in results[0].mentioned_entities} == {"SIRT1", "NAD", "FOXO3"}
+
+def test_merge_concepts_keeps_different_types_and_statements():
+    """Одинаковое утверждение разных типов и непохожие утверждения не сливаются"""
+    merged = merge_concepts([
+        [_concept("Caloric restriction slows aging", concept_type="Hypothesis")],
+        [_concept("Caloric restriction slows aging", concept_type="Conclusion"),
+         _concept("Metformin reduces cancer incidence")],
+    ])
+    assert len(merged) == 3
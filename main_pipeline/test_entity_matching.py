@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Тест офлайн-сопоставления имен сущностей (AliasMatcher) - без вызовов API
+"""
+
+from graph.entity_matching import AliasMatcher, abbreviation_tokens, candidate_clusters, is_abbreviation
+
+REVERSE_MAP = {
+    'SIRT1': 'SIRT1', 'Sirt-1': 'SIRT1',
+    'mTOR': 'mTOR',
+    'interleukin 6': 'IL6', 'IL-8': 'IL8',
+    'TNF-α': 'TNF',
+    'Apolipoprotein E': 'APOE',
+}
+
+def test_is_abbreviation():
+    """Сокращение - фрагменты всех слов по порядку, числа целиком"""
+    assert is_abbreviation('sirt1', abbreviation_tokens('sirtuin 1'))
+    assert is_abbreviation('il6', abbreviation_tokens('Interleukin-6'))
+    assert is_abbreviation('mtor', abbreviation_tokens('mechanistic target of rapamycin'))
+    assert not is_abbreviation('sirt1', abbreviation_tokens('sirtuin 2'))
+    assert not is_abbreviation('sirt1', abbreviation_tokens('sirtuin 1 and 2'))
+    assert not is_abbreviation('sirt', abbreviation_tokens('sirtuin'))
+
+def test_alias_matcher_tiers():
+    """Ключ, сокращение в обе стороны, триграммы; числа обязаны совпадать"""
+    matcher = AliasMatcher(REVERSE_MAP)
+    # 1. Нормализованный ключ
+    assert matcher.match('sirt 1') == 'SIRT1'
+    assert matcher.match('TNF-alpha') == 'TNF'
+    # 2. Полное имя -> известное сокращение и сокращение -> известное полное имя
+    assert matcher.match('sirtuin 1') == 'SIRT1'
+    assert matcher.match('Sirtuin-1') == 'SIRT1'
+    assert matcher.match('mechanistic target of rapamycin') == 'mTOR'
+    assert matcher.match('interleukin 8') == 'IL8'
+    assert matcher.match('IL-6') == 'IL6'
+    # 3. Ближайший сосед по триграммам
+    assert matcher.match('Apolipoprotein-E4') is None
+    assert matcher.match('Apolipoproteins E') == 'APOE'
+    # Без уверенного совпадения - None (имя уйдет в LLM)
+    assert matcher.match('sirtuin 2') is None
+    assert matcher.match('IL-10') is None
+    assert matcher.match('FOXO3') is None
+
+def test_trigram_tier_requires_compatible_names():
+    """Триграммы не сводят многословное имя к сокращению и не путают производные слова"""
+    matcher = AliasMatcher({'CR': 'CR', 'Calorie restriction': 'CR', 'Mitochondria': 'Mitochondria',
+                            'Telomerase': 'TERT'})
+    assert matcher.match('Calorie-restriction mimetic') is None
+    assert matcher.match('calorie restriction mimetics') is None
+    assert matcher.match('mitochondrial') is None
+    assert matcher.match('Telomerase activator') is None
+    # Совместимые имена по-прежнему сопоставляются
+    assert matcher.match('Calorie restrictions') == 'CR'
+    assert matcher.match('mitochondrias') == 'Mitochondria'
+
+def test_alias_matcher_ambiguous_abbreviation():
+    """Сокращение, подходящее к двум разным каноническим именам, не засчитывается"""
+    matcher = AliasMatcher({'protein kinase 1': 'PK1A', 'pyruvate kinase 1': 'PK1B'})
+    assert matcher.match('PK1') is None
+
+def test_alias_matcher_add_resets_cache():
+    """Новый алиас меняет уже закэшированный ответ"""
+    matcher = AliasMatcher(REVERSE_MAP)
+    assert matcher.match('insulin receptor') is None
+    matcher.add('INSR', 'INSR')
+    assert matcher.match('insulin receptor') == 'INSR'
+
+def test_candidate_clusters():
+    """Многословное имя и его аббревиатура попадают в один кластер-кандидат"""
+    clusters = candidate_clusters(['Glucagon-like peptide-1 receptor', 'GLP1R', 'p53'])
+    assert any({'Glucagon-like peptide-1 receptor', 'GLP1R'} <= set(cluster) for cluster in clusters)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Тест реестра загрузок Gemini File API на FakeFileAPI - без сети
+"""
+
+from types import SimpleNamespace
+
+from processing.file_registry import FakeFileAPI, GeminiFileRegistry, get_file_registry
+
+PDF = b"%PDF-1.4 " + b"x" * 2048
+
+def _registry(tmp_path, files_api):
+    return GeminiFileRegistry(files_api, str(tmp_path / "files.json"), inline_max_bytes=1024)
+
+def test_upload_once(tmp_path):
+    """Один и тот же PDF загружается один раз, в том числе после перезапуска"""
+    files_api = FakeFileAPI()
+    _registry(tmp_path, files_api).get_part(PDF)
+    registry = _registry(tmp_path, files_api)
+    registry.get_part(PDF)
+    assert files_api.upload_count == 1 and registry.reused == 1
+
+def test_with_files_reuploads_missing_file(tmp_path):
+    """Удаленный на стороне Gemini файл загружается заново, запрос повторяется"""
+    files_api = FakeFileAPI()
+    registry = _registry(tmp_path, files_api)
+    other = b"%PDF-1.4 " + b"y" * 2048
+    registry.get_part(PDF)
+    files_api.files.clear()
+
+    def generate(parts):
+        for part in parts:
+            files_api.get(part.file_data.file_uri.rsplit('/v1beta/', 1)[1])
+        return len(parts)
+
+    assert registry.with_files([PDF, other], generate) == 2
+    # Какая ссылка устарела, неизвестно - заново загружены оба файла запроса
+    assert files_api.upload_count == 4
+
+def test_registry_per_api_key(tmp_path):
+    """У разных API ключей разные файлы реестра"""
+    def client(api_key):
+        return SimpleNamespace(files=FakeFileAPI(), _api_client=SimpleNamespace(api_key=api_key))
+
+    path = str(tmp_path / "gemini_files.json")
+    first, second = get_file_registry(client("key-a"), path), get_file_registry(client("key-b"), path)
+    assert first is not second
+    assert first.registry_path != second.registry_path
+    assert "key-a" not in first.registry_path.name
+    assert get_file_registry(client("key-a"), path) is first
+
+def test_concurrent_registries_keep_each_others_entries(tmp_path):
+    """Два процесса с одним файлом реестра: записи не теряются, забытая одним не возвращается"""
+    files_api = FakeFileAPI()
+    other = b"%PDF-1.4 " + b"y" * 2048
+    first, second = _registry(tmp_path, files_api), _registry(tmp_path, files_api)
+    first.get_part(PDF)
+    second.get_part(other)
+    # Второй процесс подхватил загрузку первого с диска, а не загрузил файл заново
+    second.get_part(PDF)
+    assert files_api.upload_count == 2 and second.reused == 1
+    assert len(_registry(tmp_path, files_api)._entries) == 2
+
+    first.invalidate(PDF)
+    entries = _registry(tmp_path, files_api)._entries
+    assert len(entries) == 1 and list(entries.values())[0]['size'] == len(other)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Тест бинарного снимка графа (.lgs): восстановление без потерь и отказ читать pickle
+"""
+
+import pickle
+
+import networkx as nx
+import pytest
+
+from graph.graph_snapshot import SNAPSHOT_MAGIC, load_graph_snapshot, save_graph_snapshot
+
+class _Payload:
+    """Объект, который при распаковке pickle выполнил бы код"""
+
+    unpickled = False
+
+    def __reduce__(self):
+        return (_mark_unpickled, ())
+
+def _mark_unpickled():
+    _Payload.unpickled = True
+
+def test_snapshot_roundtrip(tmp_path):
+    graph = nx.DiGraph(name="test")
+    graph.add_node("P0", type="Paper", year=2024)
+    graph.add_node("E0", type="Entity", aliases=["SIRT1", "Sirt-1"])
+    graph.add_edge("P0", "E0", relation="MENTIONS", weight=0.5)
+    path = tmp_path / "graph.lgs"
+    save_graph_snapshot(graph, path)
+
+    loaded = load_graph_snapshot(path)
+    assert dict(loaded.nodes(data=True)) == dict(graph.nodes(data=True))
+    assert list(loaded.edges(data=True)) == list(graph.edges(data=True))
+    assert loaded.graph == graph.graph
+
+def test_pickle_snapshot_is_refused(tmp_path):
+    """Файл с заголовком pickle-снимка отклоняется без распаковки"""
+    path = tmp_path / "graph.lgs"
+    path.write_bytes(SNAPSHOT_MAGIC + b"p" + pickle.dumps(_Payload()))
+    with pytest.raises(ValueError, match="pickle"):
+        load_graph_snapshot(path)
+    assert not _Payload.unpickled
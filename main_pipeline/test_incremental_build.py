@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Тест инкрементальной сборки графа: план обновления по хэшам содержимого и стабильные ID концептов
+Извлечение концептов подменяется фейком - вызовы API не выполняются
+"""
+
+import os
+import subprocess
+import sys
+
+from graph.knowledge_graph import ScientificKnowledgeGraph, concept_node_id
+from core.models import ExtractedKnowledge, ScientificConcept, MentionedEntity
+
+def _documents(texts: dict) -> dict:
+    return {paper_id: {'full_text': text, 'year': 2024} for paper_id, text in texts.items()}
+
+def test_concept_id_is_stable_across_processes():
+    """ID концепта не зависит от PYTHONHASHSEED - иначе инкрементальные diff'ы не совпадают между запусками"""
+    expected = concept_node_id("P0", "Hypothesis", "P0 hypothesis")
+    assert expected == "P0_Hypothesis_84c48345d27ac142"
+    code = ("from graph.knowledge_graph import concept_node_id; "
+            "print(concept_node_id('P0', 'Hypothesis', 'P0 hypothesis'))")
+    for seed in ("1", "2"):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                env={**os.environ, 'PYTHONHASHSEED': seed}).stdout
+        assert output.strip().splitlines()[-1] == expected
+
+def test_plan_incremental_update(tmp_path, monkeypatch, fake_graph):
+    """Новые и изменённые статьи извлекаются, удалённые убираются вместе с концептами"""
+    monkeypatch.chdir(tmp_path)
+    skg = fake_graph([])
+    skg.build_graph(_documents({"P0": "zero", "P1": "one", "P2": "two"}))
+    old_p1_concept = concept_node_id("P1", "Result", "one")
+    assert skg.graph.has_node(old_p1_concept)
+
+    documents = _documents({"P0": "zero", "P1": "one, revised", "P3": "three"})
+    content_hashes = {paper_id: skg._compute_content_hash(doc) for paper_id, doc in documents.items()}
+    to_process = skg._plan_incremental_update(documents, content_hashes)
+
+    assert sorted(to_process) == ["P1", "P3"]
+    assert not skg.graph.has_node("P2") and not skg.graph.has_node(concept_node_id("P2", "Result", "two"))
+    assert not skg.graph.has_node("P1") and not skg.graph.has_node(old_p1_concept)
+    assert skg.graph.has_node(concept_node_id("P0", "Result", "zero"))
+
+def test_incremental_build_extracts_only_changes(tmp_path, monkeypatch, fake_graph):
+    """Повторная инкрементальная сборка вызывает извлечение только для изменённых статей"""
+    monkeypatch.chdir(tmp_path)
+    skg = fake_graph([])
+    skg.build_graph(_documents({"P0": "zero", "P1": "one"}))
+
+    calls = []
+    skg._extract_scientific_concepts = fake_graph(calls)._extract_scientific_concepts
+    skg.build_graph(_documents({"P0": "zero", "P1": "one, revised"}), incremental=True)
+    assert calls == ["P1"]
+    assert skg.graph.has_node(concept_node_id("P1", "Result", "one, revised"))
+    assert skg.get_graph_stats()['papers'] == 2
+
+def test_empty_extraction_is_retried(tmp_path, monkeypatch, fake_graph):
+    """Статья с пустым извлечением (сбой API) извлекается заново при следующей инкрементальной сборке"""
+    monkeypatch.chdir(tmp_path)
+    skg = ScientificKnowledgeGraph(batched_extraction=False, chunked_extraction=False)
+
+    async def failed_extract(paper_id, text):
+        return ExtractedKnowledge(paper_id=paper_id, concepts=[])
+
+    skg._extract_scientific_concepts = failed_extract
+    skg.build_graph(_documents({"P0": "zero"}))
+    assert 'content_hash' not in skg.graph.nodes["P0"]
+
+    calls = []
+    skg._extract_scientific_concepts = fake_graph(calls)._extract_scientific_concepts
+    skg.build_graph(_documents({"P0": "zero"}), incremental=True)
+    assert calls == ["P0"]
+    assert skg.graph.has_node(concept_node_id("P0", "Result", "zero"))
+
+def test_remove_paper_keeps_shared_entities(tmp_path, monkeypatch):
+    """Сущность, на которую ссылается другая статья, при удалении статьи остаётся"""
+    monkeypatch.chdir(tmp_path)
+    skg = ScientificKnowledgeGraph()
+    skg.entity_normalizer._set_mapping({"SIRT1": ["SIRT1"], "mTOR": ["mTOR"]})
+    for paper_id, entities in (("P0", ["SIRT1", "mTOR"]), ("P1", ["SIRT1"])):
+        knowledge = ExtractedKnowledge(paper_id=paper_id, concepts=[ScientificConcept(
+            concept_type="Result", statement=f"{paper_id} result",
+            mentioned_entities=[MentionedEntity(name=name, type="Gene") for name in entities])])
+        skg._add_paper_to_graph(paper_id, "text", 2024, knowledge)
+
+    entities_before = {n for n, _ in skg.nodes_of_type('Entity')}
+    skg.remove_paper("P0")
+    entities_after = {n for n, _ in skg.nodes_of_type('Entity')}
+    assert len(entities_before) == 2 and len(entities_after) == 1
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Тест постоянного кэша ответов LLM: ключ, срок жизни, вытеснение по размеру и место кэша
+относительно лимитера (попадания не расходуют лимиты модели) - без вызовов API
+"""
+
+import asyncio
+from typing import List
+
+from pydantic import BaseModel
+
+from core import llm_cache
+from core.llm_cache import AsyncCachedClient, CachedClient, LLMResponseCache
+from core.rate_limiter import AsyncRateLimitedClient, RateLimitedClient, RateLimiter
+
+class Answer(BaseModel):
+    text: str
+
+class OtherAnswer(BaseModel):
+    text: str
+    score: float = 0.0
+
+class FakeInstructorClient:
+    """Минимальный instructor-клиент: считает вызовы create"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, response_model, messages):
+        self.calls += 1
+        return response_model(text=messages[0]['content'].upper())
+
+class FakeAsyncInstructorClient(FakeInstructorClient):
+    async def create(self, response_model, messages):
+        return FakeInstructorClient.create(self, response_model, messages)
+
+def _request(content: str) -> dict:
+    return {'messages': [{'role': 'user', 'content': content}]}
+
+def test_key_depends_on_model_request_and_schema(tmp_path):
+    """Ключ меняется вместе с моделью, запросом и JSON-схемой ответа, но не с порядком полей"""
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    key = cache.make_key("m1", Answer, _request("hi"))
+    assert key == cache.make_key("m1", Answer, {'messages': [{'content': 'hi', 'role': 'user'}]})
+    assert key != cache.make_key("m2", Answer, _request("hi"))
+    assert key != cache.make_key("m1", Answer, _request("hello"))
+    assert key != cache.make_key("m1", OtherAnswer, _request("hi"))
+    assert key != cache.make_key("m1", List[Answer], _request("hi"))
+
+def test_database_created_lazily(tmp_path):
+    """Конструктор не создает файлов - база появляется при первом обращении"""
+    path = tmp_path / "nested" / "llm.sqlite"
+    cache = LLMResponseCache(str(path))
+    assert not path.parent.exists()
+    assert cache.get(cache.make_key("m", Answer, _request("x")), Answer) is None
+    assert path.exists()
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    """Запись старше ttl_days - промах и удаляется"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl_days=1)
+    key = cache.make_key("m", Answer, _request("x"))
+    cache.put(key, "m", Answer, Answer(text="X"))
+
+    now[0] += 86400 - 1
+    assert cache.get(key, Answer) == Answer(text="X")
+    now[0] += 2
+    assert cache.get(key, Answer) is None
+    assert cache.stats()['entries'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_size_eviction_is_lru(tmp_path, monkeypatch):
+    """Сверх лимита размера вытесняются давно не читанные записи, недавно прочитанные остаются"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+    payload_size = len(Answer(text="x" * 1000).model_dump_json())
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl_days=None,
+                             max_size_mb=3.5 * payload_size / (1024 * 1024), evict_every=1000)
+    keys = [cache.make_key("m", Answer, _request(str(i))) for i in range(4)]
+    for key in keys[:3]:
+        now[0] += 1
+        cache.put(key, "m", Answer, Answer(text="x" * 1000))
+    now[0] += 1
+    assert cache.get(keys[0], Answer) is not None  # keys[0] становится самым свежим по чтению
+    now[0] += 1
+    cache.put(keys[3], "m", Answer, Answer(text="x" * 1000))
+
+    assert cache.evict() >= 1
+    assert cache.get(keys[1], Answer) is None
+    assert cache.get(keys[0], Answer) is not None and cache.get(keys[3], Answer) is not None
+
+def test_cached_client_sits_outside_rate_limiter(tmp_path):
+    """Попадание в кэш не вызывает модель и не проходит через лимитер"""
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    limiter = RateLimiter("fake-model")
+    inner = FakeInstructorClient()
+    client = CachedClient(RateLimitedClient(inner, limiter), cache, "fake-model")
+
+    first = client.chat.completions.create(response_model=Answer, **_request("hi"))
+    second = client.chat.completions.create(response_model=Answer, **_request("hi"))
+    assert first == second == Answer(text="HI")
+    assert inner.calls == 1
+    assert limiter.meter.succeeded == 1
+    assert (cache.hits, cache.stores) == (1, 1)
+
+def test_async_cached_client(tmp_path):
+    """Асинхронная обертка делит тот же кэш с синхронной"""
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    limiter = RateLimiter("fake-model")
+    CachedClient(RateLimitedClient(FakeInstructorClient(), limiter), cache, "fake-model").create(
+        response_model=Answer, **_request("hi"))
+
+    inner = FakeAsyncInstructorClient()
+    client = AsyncCachedClient(AsyncRateLimitedClient(inner, limiter), cache, "fake-model")
+    assert asyncio.run(client.chat.completions.create(response_model=Answer, **_request("hi"))) == Answer(text="HI")
+    assert inner.calls == 0 and limiter.meter.succeeded == 1
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Тест потоковой приоритизации лучших K направлений (TopKPrioritizer) - без вызовов API
+"""
+
+from analysis.prioritizer import TopKPrioritizer
+from core.models import CritiqueScores
+
+def _direction(name: str, score: float, triage_score: float = None, **extra) -> dict:
+    critique = CritiqueScores(is_interesting=True, impact_score=score, novelty_score=score,
+                              feasibility_score=score, strengths=[], weaknesses=[])
+    return {'title': name, 'critique': critique, 'triage_score': triage_score, **extra}
+
+def test_keeps_top_k_in_insertion_order():
+    """В куче остаются K лучших; при равенстве вытесняется более позднее направление"""
+    prioritizer = TopKPrioritizer(k=3)
+    for name, score in [("a", 5), ("b", 9), ("c", 5), ("d", 7), ("e", 5), ("f", 1)]:
+        prioritizer.push(_direction(name, score))
+
+    assert [d['title'] for d in prioritizer.directions()] == ["a", "b", "d"]
+    assert prioritizer.minimum == 5.0
+    assert (prioritizer.pushed, prioritizer.evicted) == (6, 3)
+
+def test_unbounded_keeps_everything():
+    """k=None - в рейтинге все направления, отсечения нет"""
+    prioritizer = TopKPrioritizer(k=None)
+    for i in range(5):
+        prioritizer.push(_direction(str(i), i, triage_score=i))
+    assert len(prioritizer) == 5 and not prioritizer.full
+    assert prioritizer.prune([_direction("x", 0, triage_score=-100)]) != []
+
+def test_prune_uses_triage_margin():
+    """Кандидат отсекается, только когда куча полна и ошибка отбора оценена"""
+    prioritizer = TopKPrioritizer(k=2, min_samples=4)
+    # Итоговая оценка всегда на 1 выше оценки отбора - ошибка отбора +1
+    for score in (2, 3, 8, 9):
+        prioritizer.push(_direction(str(score), score, triage_score=score - 1))
+    assert prioritizer.confident and prioritizer.minimum == 8.0
+    assert abs(prioritizer.margin() - 1.0) < 1e-9
+
+    candidates = [
+        _direction("low", 0, triage_score=6.5),
+        _direction("borderline", 0, triage_score=7.5),
+        _direction("unscored", 0),
+        _direction("calibration", 0, triage_score=0.0, triage_calibration=True),
+    ]
+    kept = prioritizer.prune(candidates)
+    assert [d['title'] for d in kept] == ["borderline", "unscored", "calibration"]
+    assert prioritizer.skipped == 1
+
+    # can_beat не учитывает кандидата как пропущенного
+    assert not prioritizer.can_beat(candidates[0])
+    assert prioritizer.skipped == 1
+
+def test_no_pruning_before_margin_is_known():
+    """Пока пар (отбор, итог) мало, к критику идут все кандидаты"""
+    prioritizer = TopKPrioritizer(k=1, min_samples=20)
+    prioritizer.push(_direction("best", 9, triage_score=9))
+    assert prioritizer.full and prioritizer.margin() is None
+    assert len(prioritizer.prune([_direction("weak", 0, triage_score=0)])) == 1
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Тест ограничителя скорости: token bucket, AIMD-регулятор и повторы по retryDelay
+Часы подменяются фейком, ответ 429 - фейковым исключением; вызовов API и реальных пауз нет
+"""
+
+import pytest
+
+from core import rate_limiter
+from core.rate_limiter import AIMDController, RateLimiter, TokenBucket, _suggested_delay, is_rate_limit_error
+
+class FakeClock:
+    """Часы модуля rate_limiter: sleep не ждет, а сдвигает monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class FakeResourceExhausted(Exception):
+    """Ответ Gemini 429 с подсказкой retryDelay в деталях"""
+
+    code = 429
+
+    def __init__(self, retry_delay: str = "7s"):
+        super().__init__(f"429 RESOURCE_EXHAUSTED. {{'details': [{{'@type': 'RetryInfo', 'retryDelay': '{retry_delay}'}}]}}")
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+def test_token_bucket_waits_for_refill(clock):
+    """60 единиц в минуту: запас расходуется сразу, дальше - ожидание пополнения 1 ед./сек"""
+    bucket = TokenBucket(60)
+    bucket.acquire(60)
+    assert clock.slept == []
+    bucket.acquire(1)
+    assert clock.slept == [pytest.approx(1.0)]
+    bucket.acquire(3)
+    assert clock.slept[-1] == pytest.approx(3.0)
+
+def test_token_bucket_caps_refill_at_capacity(clock):
+    """Долгий простой не копит запас сверх capacity; запрос больше capacity урезается до нее"""
+    bucket = TokenBucket(60, capacity=10)
+    bucket.acquire(10)
+    clock.now += 3600
+    bucket.acquire(10)
+    assert clock.slept == []
+    bucket.acquire(500)
+    assert clock.slept == [pytest.approx(10.0)]
+
+def test_aimd_backoff_and_recovery(clock):
+    """429 уменьшает лимит вдвое не чаще раза в cooldown, успехи возвращают его на +1 за окно"""
+    aimd = AIMDController(initial=8, min_limit=1, max_limit=8, cooldown=2.0)
+    aimd.acquire()
+    aimd.release(throttled=True)
+    assert aimd.limit == 4.0 and aimd.in_flight == 0
+
+    # Пачка одновременных отказов в пределах cooldown снижает лимит один раз
+    clock.now += 1.0
+    aimd.acquire()
+    aimd.release(throttled=True)
+    assert aimd.limit == 4.0
+
+    clock.now += 1.0
+    aimd.acquire()
+    aimd.release(throttled=True)
+    assert aimd.limit == 2.0
+
+    # Окно из limit успешных вызовов дает около +1: 2 -> 2.5 -> 2.9
+    for _ in range(2):
+        aimd.acquire()
+        aimd.release()
+    assert aimd.limit == pytest.approx(2.9)
+
+    for _ in range(100):
+        aimd.acquire()
+        aimd.release()
+    assert aimd.limit == 8.0
+
+def test_aimd_never_drops_below_min_limit(clock):
+    aimd = AIMDController(initial=2, min_limit=1, cooldown=0.0)
+    for _ in range(5):
+        aimd.acquire()
+        aimd.release(throttled=True)
+    assert aimd.limit == 1.0
+
+def test_suggested_delay_parsing():
+    """retryDelay из деталей ошибки Gemini в разных записях; без подсказки - None"""
+    assert _suggested_delay(FakeResourceExhausted("37s")) == 37.0
+    assert _suggested_delay(Exception('"retryDelay": "1.5s"')) == 1.5
+    assert _suggested_delay(Exception("retry_delay=12s")) == 12.0
+    assert _suggested_delay(Exception("429 RESOURCE_EXHAUSTED")) is None
+
+def test_is_rate_limit_error_unwraps_cause():
+    """429, обернутая instructor в другое исключение, распознается по цепочке причин"""
+    try:
+        try:
+            raise FakeResourceExhausted()
+        except FakeResourceExhausted as e:
+            raise RuntimeError("instructor retry failed") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limit_error(wrapped)
+    assert not is_rate_limit_error(ValueError("bad schema"))
+
+def test_call_retries_after_429_with_server_delay(clock):
+    """После 429 вызов повторяется не раньше retryDelay, лимит параллелизма снижается"""
+    limiter = RateLimiter("fake-model", initial_concurrency=8, max_delay=1.0)
+    responses = [FakeResourceExhausted("7s"), "ok"]
+
+    def call_api():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert limiter.call(call_api) == "ok"
+    assert clock.slept == [7.0]
+    assert (limiter.meter.throttled, limiter.meter.succeeded) == (1, 1)
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit == pytest.approx(4.0 + 1 / 4)
+
+def test_call_does_not_retry_other_errors(clock):
+    """Ошибка не из-за лимитов пробрасывается сразу, слот освобождается"""
+    limiter = RateLimiter("fake-model")
+
+    def call_api():
+        raise ValueError("bad schema")
+
+    with pytest.raises(ValueError):
+        limiter.call(call_api)
+    assert clock.slept == []
+    assert (limiter.meter.failed, limiter.concurrency.in_flight) == (1, 0)
+
+def test_call_gives_up_after_max_retries(clock):
+    limiter = RateLimiter("fake-model", max_retries=2)
+
+    def call_api():
+        raise FakeResourceExhausted("1s")
+
+    with pytest.raises(FakeResourceExhausted):
+        limiter.call(call_api)
+    assert len(clock.slept) == 2 and limiter.meter.throttled == 3
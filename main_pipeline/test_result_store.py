@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Тест переноса старых JSON-кэшей (pdf_texts.json, extracted_knowledge.json) в SQLite-хранилище
+"""
+
+import json
+
+from core.models import ExtractedKnowledge, ScientificConcept
+from processing.pdf_processing import CacheManager
+from processing.result_store import ResultStore, migrate_json_cache
+
+def test_migrate_read_back_and_rerun(tmp_path):
+    """Записи переносятся и читаются, файл переименовывается в *.migrated, повторный запуск ничего не делает"""
+    json_file = tmp_path / "pdf_texts.json"
+    json_file.write_text(json.dumps({"a.pdf_1.0": "text A", "b.pdf_2.0": "текст B"}, ensure_ascii=False),
+                         encoding='utf-8')
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+
+    assert migrate_json_cache(store, json_file, "pdf_texts") == 2
+    assert not json_file.exists() and (tmp_path / "pdf_texts.json.migrated").exists()
+    assert store.get("pdf_texts", "b.pdf_2.0") == "текст B"
+
+    store.put("pdf_texts", "a.pdf_1.0", "updated")
+    assert migrate_json_cache(store, json_file, "pdf_texts") == 0
+    assert store.count("pdf_texts") == 2
+    assert store.get("pdf_texts", "a.pdf_1.0") == "updated"
+
+def test_cache_manager_migrates_extracted_knowledge(tmp_path):
+    """Словари знаний сериализуются при переносе и читаются как ExtractedKnowledge"""
+    knowledge = ExtractedKnowledge(paper_id="P0", concepts=[ScientificConcept(concept_type="Result", statement="S")])
+    (tmp_path / "extracted_knowledge.json").write_text(
+        json.dumps({"hash0": knowledge.model_dump(mode='json')}), encoding='utf-8')
+
+    assert CacheManager(str(tmp_path)).get_extracted_knowledge("hash0") == knowledge
+    assert (tmp_path / "extracted_knowledge.json.migrated").exists()
+    # Второй менеджер на той же папке читает то же самое без повторного переноса
+    assert CacheManager(str(tmp_path)).get_extracted_knowledge("hash0") == knowledge
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Тест локального расчета итоговой оценки и рекомендации критика - без вызовов API
+"""
+
+import numpy as np
+
+from analysis.scoring import final_scores, recommendations, score_critiques, score_matrix
+from core.models import Critique, CritiqueScores
+
+def _scores(impact, novelty, feasibility) -> CritiqueScores:
+    return CritiqueScores(is_interesting=True, impact_score=impact, novelty_score=novelty,
+                          feasibility_score=feasibility, strengths=["s"], weaknesses=["w"])
+
+def test_score_matrix_and_final_scores():
+    """Столбцы матрицы - влияние, новизна, выполнимость; веса по умолчанию 0.5/0.3/0.2"""
+    matrix = score_matrix([_scores(8, 6, 4), _scores(10, 10, 10)])
+    assert matrix.tolist() == [[8, 6, 4], [10, 10, 10]]
+    assert np.allclose(final_scores(matrix), [6.6, 10.0])
+    assert np.allclose(final_scores(matrix, {'impact': 1.0, 'novelty': 0.0, 'feasibility': 0.0}), [8.0, 10.0])
+    assert score_matrix([]).shape == (0, 3)
+
+def test_recommendation_thresholds():
+    """Пороги строгие: ровно 7.5 - Consider, ровно 5.0 - Reject"""
+    verdicts = recommendations(np.array([9.0, 7.5, 7.51, 5.0, 5.01, 0.0]))
+    assert verdicts.tolist() == ["Strongly Recommend", "Consider", "Strongly Recommend",
+                                 "Reject", "Consider", "Reject"]
+
+def test_score_critiques_rescoring():
+    """Полные Critique по сырым оценкам; повторный расчет с другими весами меняет только итог"""
+    critique = score_critiques([_scores(8, 8, 8)])[0]
+    assert isinstance(critique, Critique)
+    assert critique.final_score == 8.0 and critique.recommendation == "Strongly Recommend"
+    assert critique.strengths == ["s"]
+
+    rescored = score_critiques([critique], {'impact': 0.0, 'novelty': 0.0, 'feasibility': 0.5})[0]
+    assert rescored.final_score == 4.0 and rescored.recommendation == "Reject"
+    assert rescored.impact_score == 8
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Тест исходных точек входа этапа 2 (generate_research_directions + analyze_and_synthesize_report)
+поверх потокового конвейера - конвейер и синтез отчета подменяются, вызовов API нет
+"""
+
+from types import SimpleNamespace
+
+from analysis.research_analyst import ResearchAnalyst
+
+def _analyst(monkeypatch, calls: list, **kwargs) -> ResearchAnalyst:
+    analyst = ResearchAnalyst(SimpleNamespace(graph=None), **kwargs)
+    monkeypatch.setattr(analyst, 'generate_and_critique',
+                        lambda: calls.append('stream') or (["raw"], ["critiqued"]))
+    monkeypatch.setattr(analyst, 'critique_and_prioritize',
+                        lambda directions, max_workers: calls.append('critique') or ["recritiqued"])
+    monkeypatch.setattr(analyst, 'synthesize_report', lambda critiqued: critiqued)
+    return analyst
+
+def test_streamed_critique_is_reused(tmp_path, monkeypatch):
+    """Список направлений из потокового запуска не критикуется второй раз"""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    analyst = _analyst(monkeypatch, calls)
+    directions = analyst.generate_research_directions()
+    assert analyst.analyze_and_synthesize_report(directions) == ["critiqued"]
+    # Другой список (например, отфильтрованный вызывающим кодом) критикуется заново
+    assert analyst.analyze_and_synthesize_report(list(directions)) == ["recritiqued"]
+    assert calls == ['stream', 'critique']
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Тест калибровки порога предварительного отбора (TriageGate) - без вызовов API
+"""
+
+import math
+
+from analysis.triage import DEFAULT_TRIAGE_MIN_SCORE, TriageGate
+
+def _calibrate(gate: TriageGate, scores: list, interesting: list) -> list:
+    directions = [{'triage_score': score} for score in scores]
+    assert all(gate.admit(direction) for direction in directions)
+    assert gate.awaiting_verdicts and gate.threshold() == -math.inf
+    for direction, verdict in zip(directions, interesting):
+        gate.observe(direction, verdict)
+    return directions
+
+def test_calibration_sets_recall_threshold():
+    """Порог - такой квантиль оценок интересных направлений, что проходит не меньше recall_target из них"""
+    gate = TriageGate(recall_target=0.9, calibration_size=20)
+    scores = [float(score) for score in range(20)]
+    directions = _calibrate(gate, scores, [score >= 10 for score in scores])
+
+    assert all(direction['triage_calibration'] for direction in directions)
+    assert gate.calibrated and not gate.awaiting_verdicts
+    assert gate.threshold() == 10.0
+    assert gate.estimated_recall() >= 0.9
+
+    assert gate.admit({'triage_score': 10.0})
+    assert not gate.admit({'triage_score': 9.9})
+    # Сбой отбора (нет оценки) - направление все равно идет к критику
+    assert gate.admit({'triage_score': None})
+    assert (gate.screened, gate.passed, gate.skipped, gate.calibration) == (23, 22, 1, 20)
+
+def test_no_interesting_directions_uses_default_threshold():
+    """Если критик не нашел интересных направлений, действует порог по умолчанию"""
+    gate = TriageGate(calibration_size=3)
+    _calibrate(gate, [9.0, 8.0, 7.0], [False, False, False])
+    assert gate.threshold() == DEFAULT_TRIAGE_MIN_SCORE
+
+def test_observe_ignores_non_calibration_and_close_calibration():
+    """Вердикты по обычным направлениям не меняют калибровку; close_calibration завершает ее досрочно"""
+    gate = TriageGate(calibration_size=10)
+    calibration_direction = {'triage_score': 6.0}
+    gate.admit(calibration_direction)
+    gate.observe({'triage_score': 1.0}, True)
+    gate.observe(calibration_direction, True)
+    assert gate.observed == 1 and not gate.calibrated
+
+    gate.close_calibration()
+    assert gate.calibrated and gate.threshold() == 6.0
+    assert not gate.admit({'triage_score': 5.0})
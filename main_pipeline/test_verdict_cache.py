@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Тест кэша вердиктов критики и отбора по направлениям: повторный запуск с другим составом пачек
+не делает запросов к модели - без вызовов API
+"""
+
+import asyncio
+import re
+from types import SimpleNamespace
+
+from analysis import research_analyst
+from analysis.research_analyst import ResearchAnalyst
+from core.llm_cache import LLMResponseCache
+from core.models import CritiqueBatch, CritiqueScores, DirectionCritique, TriageBatch, TriageScore
+
+SCORES = dict(novelty_score=7.0, impact_score=8.0, feasibility_score=6.0, strengths=["s"], weaknesses=["w"])
+
+class FakeCriticClient:
+    """Критик, который отвечает на любую пачку и записывает число направлений в каждом запросе"""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, messages, response_model):
+        prompt = messages[0]['content']
+        if response_model is CritiqueBatch:
+            ids = re.findall(r"DIRECTION ID: (D\d+)", prompt)
+            self.requests.append(len(ids))
+            return CritiqueBatch(critiques=[DirectionCritique(direction_id=direction_id, is_interesting=True, **SCORES)
+                                            for direction_id in ids])
+        self.requests.append(1)
+        return CritiqueScores(is_interesting=True, **SCORES)
+
+class FakeTriageClient:
+    """Дешевая модель отбора: оценка 6.0 каждому направлению, промпты запросов сохраняются"""
+
+    def __init__(self):
+        self.prompts = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, messages, response_model):
+        prompt = messages[0]['content']
+        self.prompts.append(prompt)
+        ids = re.findall(r"- (D\d+): ", prompt)
+        return TriageBatch(scores=[TriageScore(direction_id=direction_id, promise_score=6.0) for direction_id in ids])
+
+def _analyst(tmp_path, **kwargs) -> ResearchAnalyst:
+    analyst = ResearchAnalyst(SimpleNamespace(graph=None), **kwargs)
+    analyst.verdict_cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    return analyst
+
+def _directions(*names) -> list:
+    return [{'title': name, 'description': f"Direction {name}", 'supporting_papers': []} for name in names]
+
+def test_batch_verdicts_are_cached_per_direction(tmp_path, monkeypatch):
+    """Вердикт не зависит от соседей по пачке: перестановка и новый состав пачки берут его из кэша"""
+    monkeypatch.chdir(tmp_path)
+    critic = FakeCriticClient()
+    monkeypatch.setattr(research_analyst, 'llm_critic_aclient', critic)
+    analyst = _analyst(tmp_path, triage=False)
+
+    first = asyncio.run(analyst._critique_batch(_directions("A", "B", "C")))
+    assert len(first) == 3 and critic.requests == [3]
+
+    # Другой порядок завершения воркеров - другой состав пачки; запрашивается только новое направление
+    second = asyncio.run(analyst._critique_batch(_directions("C", "D", "A")))
+    assert [d['title'] for d in second] == ["C", "D", "A"]
+    assert critic.requests == [3, 1]
+
+    rerun = asyncio.run(analyst._critique_batch(_directions("D", "B", "A", "C")))
+    assert len(rerun) == 4 and critic.requests == [3, 1]
+    assert all(d['critique'] == CritiqueScores(is_interesting=True, **SCORES) for d in rerun)
+    assert analyst.critique_stats['cached'] == 2 + 4
+
+def test_triage_prompt_uses_score_weights(tmp_path, monkeypatch):
+    """Формула в промпте отбора совпадает с весами итоговой оценки аналитика"""
+    monkeypatch.chdir(tmp_path)
+    assert "0.5*impact + 0.3*novelty + 0.2*feasibility" in _analyst(tmp_path)._triage_prompt("")
+    analyst = _analyst(tmp_path, score_weights={'feasibility': 0.6, 'impact': 0.25})
+    assert "0.25*impact + 0.3*novelty + 0.6*feasibility" in analyst._triage_prompt("")
+
+def test_triage_scores_are_cached_per_direction(tmp_path, monkeypatch):
+    """Оценки отбора берутся из кэша независимо от пачки; смена весов дает новый ключ"""
+    monkeypatch.chdir(tmp_path)
+    triage = FakeTriageClient()
+    monkeypatch.setattr(research_analyst, 'llm_extractor_aclient', triage)
+    analyst = _analyst(tmp_path)
+
+    asyncio.run(analyst._triage_batch(_directions("A", "B")))
+    directions = _directions("B", "C", "A")
+    asyncio.run(analyst._triage_batch(directions))
+    assert [d['triage_score'] for d in directions] == [6.0, 6.0, 6.0]
+    assert len(triage.prompts) == 2 and '"Direction C"' in triage.prompts[1]
+    assert '"Direction A"' not in triage.prompts[1]
+
+    reweighted = _analyst(tmp_path, score_weights={'feasibility': 0.6})
+    asyncio.run(reweighted._triage_batch(_directions("A")))
+    assert len(triage.prompts) == 3
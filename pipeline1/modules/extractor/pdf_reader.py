@@ -23,6 +23,14 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from config.config import ExtractorConfig
 
+# Реестр загрузок Gemini File API из main_pipeline: PDF загружается один раз для всех этапов
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'main_pipeline'))
+try:
+    from processing.file_registry import get_file_registry
+    FILE_REGISTRY_AVAILABLE = True
+except ImportError:
+    FILE_REGISTRY_AVAILABLE = False
+
 
 class PDFReader:
     """
@@ -46,6 +54,7 @@ class PDFReader:
         self.api_key = api_key or ExtractorConfig().get_api_key()
         self.model = model
         self.client = genai.Client(api_key=self.api_key)
+        self.files = get_file_registry(self.client) if FILE_REGISTRY_AVAILABLE else None
         
     def read_pdf_from_url(self, pdf_url: str, use_file_api: bool = True) -> str:
         """
@@ -104,6 +113,26 @@ class PDFReader:
         except Exception as e:
             raise Exception(f"Ошибка при чтении PDF файла {file_path}: {e}")
     
+    def _upload_pdf(self, pdf_source: Union[bytes, pathlib.Path]):
+        """Загружает PDF в File API напрямую (без реестра)"""
+        if isinstance(pdf_source, bytes):
+            return self.client.files.upload(file=io.BytesIO(pdf_source), config=dict(mime_type='application/pdf'))
+        return self.client.files.upload(file=pdf_source)
+    
+    def _generate_with_pdfs(self, pdf_sources: List[Union[bytes, pathlib.Path]], prompt: str) -> str:
+        """
+        Запрос к модели с PDF файлами и промптом.
+        
+        Через общий реестр файлы повторно не загружаются; если ссылка на файл
+        устарела (Gemini удалил его), файлы загружаются заново и запрос повторяется.
+        """
+        def generate(parts):
+            return self.client.models.generate_content(model=self.model, contents=list(parts) + [prompt]).text
+        
+        if self.files:
+            return self.files.with_files(pdf_sources, generate)
+        return generate([self._upload_pdf(source) for source in pdf_sources])
+    
     def _process_small_pdf(self, pdf_data: bytes) -> str:
         """Обрабатывает маленькие PDF файлы (< 20MB) инлайн."""
         prompt = """
@@ -128,14 +157,6 @@ class PDFReader:
     
     def _process_large_pdf(self, pdf_data: bytes, source_type: str, source: str) -> str:
         """Обрабатывает большие PDF файлы через File API."""
-        # Загружаем PDF через File API
-        doc_io = io.BytesIO(pdf_data)
-        
-        uploaded_file = self.client.files.upload(
-            file=doc_io,
-            config=dict(mime_type='application/pdf')
-        )
-        
         prompt = """
         Извлеки весь текстовый контент из этого PDF документа.
         Сохрани структуру документа, включая заголовки, абзацы и разделы.
@@ -143,17 +164,11 @@ class PDFReader:
         Если есть изображения с текстом, извлеки текст из них.
         """
         
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=[uploaded_file, prompt]
-        )
-        
-        return response.text
+        # Загружаем PDF через File API
+        return self._generate_with_pdfs([pdf_data], prompt)
     
     def _process_large_pdf_from_file(self, file_path: pathlib.Path) -> str:
         """Обрабатывает большие PDF файлы из локального хранилища через File API."""
-        uploaded_file = self.client.files.upload(file=file_path)
-        
         prompt = """
         Извлеки весь текстовый контент из этого PDF документа.
         Сохрани структуру документа, включая заголовки, абзацы и разделы.
@@ -161,12 +176,7 @@ class PDFReader:
         Если есть изображения с текстом, извлеки текст из них.
         """
         
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=[uploaded_file, prompt]
-        )
-        
-        return response.text
+        return self._generate_with_pdfs([file_path], prompt)
     
     def extract_scientific_narrative_from_pdf_url(self, pdf_url: str, source_id: Optional[str] = None) -> ProcessedDocument:
         """
@@ -336,31 +346,17 @@ class PDFReader:
         if len(pdf_sources) != len(is_urls):
             raise ValueError("Количество источников должно совпадать с количеством флагов is_url")
         
-        # Загружаем все PDF файлы
-        uploaded_files = []
+        # Скачиваем PDF по URL, локальные файлы передаем путями
+        sources = []
         
         for pdf_source, is_url in zip(pdf_sources, is_urls):
             if is_url:
                 response = httpx.get(str(pdf_source))
-                pdf_data = io.BytesIO(response.content)
-                uploaded_file = self.client.files.upload(
-                    file=pdf_data,
-                    config=dict(mime_type='application/pdf')
-                )
+                sources.append(response.content)
             else:
-                uploaded_file = self.client.files.upload(file=pathlib.Path(pdf_source))
-            
-            uploaded_files.append(uploaded_file)
-        
-        # Создаем контент для сравнения
-        contents = uploaded_files + [comparison_prompt]
-        
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=contents
-        )
+                sources.append(pathlib.Path(pdf_source))
         
-        return response.text
+        return self._generate_with_pdfs(sources, comparison_prompt)
 
 
 def main():
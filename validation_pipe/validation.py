@@ -6,6 +6,7 @@
 """
 
 import os
+import sys
 import json
 import pathlib
 from datetime import datetime
@@ -20,6 +21,14 @@ except ImportError:
     print("❌ google-genai не установлен. Установите: pip install google-genai")
     GENAI_AVAILABLE = False
 
+# Реестр загрузок Gemini File API из main_pipeline: PDF загружается один раз для всех этапов
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'main_pipeline'))
+try:
+    from processing.file_registry import get_file_registry
+    FILE_REGISTRY_AVAILABLE = True
+except ImportError:
+    FILE_REGISTRY_AVAILABLE = False
+
 # Загрузка переменных окружения
 from dotenv import load_dotenv
 load_dotenv()
@@ -53,6 +62,7 @@ class ReportValidator:
         # Инициализируем клиент Gemini
         if GENAI_AVAILABLE:
             self.client = genai.Client(api_key=self.api_key)
+            self.files = get_file_registry(self.client) if FILE_REGISTRY_AVAILABLE else None
         else:
             raise ImportError("google-genai пакет не установлен")
         
@@ -207,13 +217,17 @@ class ReportValidator:
             print(f"🚀 Отправляю запрос к Gemini 2.0 Flash...")
             
             # Отправляем запрос к Gemini 2.0 Flash
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[
-                    types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'),
-                    prompt
-                ]
-            )
+            def generate(pdf_part):
+                return self.client.models.generate_content(
+                    model="gemini-2.0-flash",
+                    contents=[pdf_part, prompt]
+                )
+            
+            if self.files:
+                # Файл уже мог быть загружен при построении графа - ссылка переиспользуется
+                response = self.files.with_file(pdf_data, generate)
+            else:
+                response = generate(types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'))
             
             print(f"📥 Получен ответ от API")
             print(f"📊 Размер ответа: {len(response.text)} символов")